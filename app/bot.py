@@ -1,31 +1,80 @@
 import os
+import signal
 import asyncio
+import secrets
+from urllib.parse import urlparse
+
+from aiohttp import web
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.types import FSInputFile
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from app.middlewares import ConcurrencyLimitMiddleware, MetricsMiddleware
+
+from app.services.container import services
+from app.services.executor_service import ExecutorService, AsyncProxy
+from app.services.outbound_service import HIGH, LOW, NORMAL, OutboundLimiter, send_priority
+from app.services.scheduler_service import GenerationScheduler
+from app.utils.helpers import prompt_key, split_message
+from app.utils.metrics import ERRORS, REGISTRY
+from app.utils.singleflight import SingleFlight
+from app.utils.streaming import StreamingReply
+
 
-from app.services.db_service import DBService
-from app.services.gemini_service import GeminiService
-from app.services.limiter_service import LimiterService
-from app.services.logger_service import LoggerService
-from app.services.storage_service import StorageService
+# Services are built on first use (see app/services/container.py), so
+# importing this module stays cheap and SDKs load only when needed.
+db = services.lazy("db")
+gemini = services.lazy("gemini")
+limiter = services.lazy("limiter")
+logger = services.lazy("logger")
+storage = services.lazy("storage")
 
+# Blocking services run on a bounded thread pool so one slow call does not
+# freeze every other chat served by the event loop.
+executor = ExecutorService()
+async_db = AsyncProxy(db, executor)
+async_gemini = AsyncProxy(gemini, executor)
+async_limiter = AsyncProxy(limiter, executor)
 
-db = DBService()
-gemini = GeminiService()
-limiter = LimiterService(db)
-logger = LoggerService(db)
-storage = StorageService(db)
+# Identical prompts arriving together share one generation (and one upload)
+inflight = SingleFlight()
+# Bounded worker pool ordered by plan priority, with per-user in-flight caps
+scheduler = GenerationScheduler()
+
+# Edit the "Gerando texto..." placeholder as chunks arrive
+STREAM_TEXT = os.getenv("STREAM_TEXT", "true").lower() in ("1", "true", "yes")
 
 bot_token = os.getenv("TELEGRAM_TOKEN")
 bot = Bot(token=bot_token) if bot_token else None
+# Paces outgoing API calls (global/per-chat buckets, 429 handling)
+outbound = OutboundLimiter()
+if bot:
+    bot.session.middleware(outbound)
 dp = Dispatcher()
+# Caps concurrently handled updates (UPDATE_CONCURRENCY)
+update_limiter = ConcurrencyLimitMiddleware()
+_handlers_registered = False
+# Uploads/log writes that run after the reply was sent
+_background_tasks = set()
+
+# Point-in-time values read when /metrics is scraped
+REGISTRY.gauge("executor_running", "Blocking calls running on the service pool",
+               lambda: executor.stats()["running"])
+REGISTRY.gauge("executor_queued", "Blocking calls waiting for a pool thread",
+               lambda: executor.stats()["queued"])
+REGISTRY.gauge("scheduler_queue_depth", "Generations waiting for a scheduler worker",
+               lambda: scheduler.stats()["queue_depth"])
+REGISTRY.gauge("updates_waiting", "Updates waiting for a handler slot",
+               lambda: update_limiter.waiting)
+REGISTRY.gauge("log_queue_depth", "Log entries not yet written",
+               lambda: logger.stats()["queued"] if services.built("logger") else None)
 
 
 async def cmd_start(message: types.Message):
     tg_id = message.from_user.id
     nome = message.from_user.full_name
-    user = db.get_user_by_telegram(tg_id)
+    user = await async_db.get_user_by_telegram(tg_id)
     if not user:
         # create with free plan default
         user_obj = {
@@ -36,7 +85,7 @@ async def cmd_start(message: types.Message):
             "geracoes_hoje": 0,
             "ultima_geracao": None,
         }
-        db.create_user(user_obj)
+        await async_db.create_user(user_obj)
         await message.reply(f"Bem-vindo, {nome}! Você foi cadastrado com o plano Free.")
     else:
         await message.reply(f"Olá {nome}, bem-vindo de volta! Seu plano: {user.plano}")
@@ -44,7 +93,7 @@ async def cmd_start(message: types.Message):
 
 async def cmd_meu_plano(message: types.Message):
     tg_id = message.from_user.id
-    user = db.get_user_by_telegram(tg_id)
+    user = await async_db.get_user_by_telegram(tg_id)
     if not user:
         await message.reply("Usuário não encontrado. Use /start para se registrar.")
         return
@@ -65,78 +114,175 @@ async def cmd_ajuda(message: types.Message):
 
 
 async def cmd_comprar(message: types.Message):
-    planos = db.list_planos()
+    planos = await async_db.list_planos()
     lines = []
     for p in planos:
         lines.append(f"{p['id']}: {p['nome']} - limite {p['limite']} - ${p['preco']}")
     await message.reply("\n".join(lines))
 
 
-async def cmd_gerar_texto(message: types.Message):
+async def _settle(reservation, cached: bool):
+    # answers served from the result cache do not count on some plans
+    if cached and limiter.cached_hit_is_free(reservation):
+        await async_limiter.refund(reservation)
+    else:
+        limiter.commit(reservation)
+
+
+def _queue_feedback(placeholder: types.Message, label: str):
+    async def on_queued(position: int):
+        with send_priority(LOW):
+            await placeholder.edit_text(f"{label} (posição na fila: {position})")
+    return on_queued
+
+
+async def _generate_text(prompt: str, placeholder: types.Message):
+    """Return ``(text, cached, streamed)``; when streamed, the text is already
+    shown in ``placeholder`` (and follow-up messages if it was long)."""
+    if not STREAM_TEXT:
+        text, cached = await async_gemini.generate_text_cached(prompt)
+        return text, cached, False
+    cached = await async_gemini.cached_text(prompt)
+    if cached is not None:
+        return cached, True, False
+    reply = StreamingReply(placeholder)
+    try:
+        # same deadline as a non-streamed generate_text call
+        async for chunk in executor.iterate(gemini.stream_text, prompt, timeout=gemini.resilience.deadline):
+            await reply.feed(chunk)
+    except TimeoutError:
+        gemini.stream_timed_out()
+        raise
+    text = await reply.finish()
+    gemini.store_text(prompt, text)
+    return text, False, True
+
+
+async def cmd_gerar_texto(message: types.Message, command: CommandObject):
     tg_id = message.from_user.id
-    prompt = message.get_args()
-    ok, msg = limiter.can_generate(tg_id)
-    if not ok:
-        await message.reply(msg)
+    prompt = command.args or ""
+    if not scheduler.can_submit(tg_id):
+        await message.reply(f"Você já tem {scheduler.max_per_user} gerações em andamento. Aguarde terminarem.")
+        return
+    reservation = await async_limiter.reserve(tg_id)
+    if not reservation.ok:
+        await message.reply(reservation.message)
         return
-    await message.reply("Gerando texto...")
     try:
-        result = gemini.generate_text(prompt)
-        logger.log(tg_id, "text", prompt, resultado=result)
-        limiter.increment(tg_id)
-        await message.reply(result)
+        # inside the try: a failed send must hand the reserved slot back;
+        # NORMAL, not LOW: the generation waits for this message
+        with send_priority(NORMAL):
+            placeholder = await message.reply("Gerando texto...")
+        key = prompt_key("text", prompt, gemini.text_model)
+        (result, cached, streamed), shared = await inflight.do(key, lambda: scheduler.submit(
+            tg_id, reservation.plano,
+            lambda: _generate_text(prompt, placeholder),
+            on_queued=_queue_feedback(placeholder, "Gerando texto..."),
+        ))
+        await _settle(reservation, cached)
+        logger.log(tg_id, "text", prompt, resultado=result, plano=reservation.plano)
+        # the leader of a streamed generation already sees the answer
+        if not streamed or shared:
+            with send_priority(HIGH):
+                for part in split_message(result):
+                    await message.reply(part)
     except Exception as e:
-        logger.log(tg_id, "text", prompt, resultado=str(e))
+        ERRORS.inc(where="gerar_texto")
+        await async_limiter.refund(reservation)
+        logger.log(tg_id, "text_error", prompt, resultado=str(e), plano=reservation.plano)
         await message.reply(f"Erro ao gerar texto: {e}")
 
 
-async def cmd_gerar_imagem(message: types.Message):
-    tg_id = message.from_user.id
-    prompt = message.get_args()
-    ok, msg = limiter.can_generate(tg_id)
-    if not ok:
-        await message.reply(msg)
-        return
-    await message.reply("Gerando imagem... (mock)")
+def _in_background(coro):
+    # keep a reference so the task is not garbage collected mid-flight
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def drain_background(timeout: float = 10.0):
+    """Wait for pending uploads/logs started by handlers (used on shutdown)."""
+    if _background_tasks:
+        await asyncio.wait(set(_background_tasks), timeout=timeout)
+
+
+async def _store_image(tg_id: int, prompt: str, img_bytes: bytes, plano: str = None):
+    """Upload to storage (supabase) or save locally, then log; runs after the
+    user already has the photo."""
     try:
-        img_bytes = gemini.generate_image(prompt)
-        # ensure bytes
-        if not img_bytes:
-            img_bytes = gemini.generate_image(prompt)
+        # content-addressed: identical images are stored (and uploaded) once
+        url_or_path = await storage.upload_content('generated', img_bytes)
+    except Exception as e:
+        ERRORS.inc(where="storage")
+        print(f"[bot] background upload error: {e}")
+        url_or_path = f"upload error: {e}"
+    logger.log(tg_id, "image", prompt, resultado=url_or_path, plano=plano)
 
-        # Upload to storage (supabase) or save locally
-        filename = f"images/{tg_id}_{int(__import__('time').time())}.png"
-        url_or_path = storage.upload_bytes('generated', filename, img_bytes)
 
-        limiter.increment(tg_id)
-        logger.log(tg_id, "image", prompt, resultado=url_or_path)
+async def cmd_gerar_imagem(message: types.Message, command: CommandObject):
+    tg_id = message.from_user.id
+    prompt = command.args or ""
+    if not scheduler.can_submit(tg_id):
+        await message.reply(f"Você já tem {scheduler.max_per_user} gerações em andamento. Aguarde terminarem.")
+        return
+    reservation = await async_limiter.reserve(tg_id)
+    if not reservation.ok:
+        await message.reply(reservation.message)
+        return
+    try:
+        with send_priority(NORMAL):
+            placeholder = await message.reply("Gerando imagem... (mock)")
+        key = prompt_key("image", prompt, gemini.image_model)
+        (img_bytes, cached), _ = await inflight.do(key, lambda: scheduler.submit(
+            tg_id, reservation.plano,
+            lambda: async_gemini.generate_image_cached(prompt),
+            on_queued=_queue_feedback(placeholder, "Gerando imagem... (mock)"),
+        ))
 
-        # If storage returned local path, send as file; if url, send photo by url
-        if url_or_path and url_or_path.startswith('http'):
-            await message.reply_photo(photo=url_or_path)
-        else:
-            # local path
-            await message.reply_photo(photo=FSInputFile(url_or_path))
+        # Send straight from memory; storage is off the hot path
+        with send_priority(HIGH):
+            await message.reply_photo(photo=BufferedInputFile(img_bytes, filename="imagem.png"))
+        await _settle(reservation, cached)
+        _in_background(_store_image(tg_id, prompt, img_bytes, reservation.plano))
     except Exception as e:
-        logger.log(tg_id, "image", prompt, resultado=str(e))
+        ERRORS.inc(where="gerar_imagem")
+        await async_limiter.refund(reservation)
+        logger.log(tg_id, "image_error", prompt, resultado=str(e), plano=reservation.plano)
         await message.reply(f"Erro ao gerar imagem: {e}")
 
 
-async def cmd_gerar_video(message: types.Message):
+async def cmd_gerar_video(message: types.Message, command: CommandObject):
     tg_id = message.from_user.id
-    prompt = message.get_args()
-    ok, msg = limiter.can_generate(tg_id)
-    if not ok:
-        await message.reply(msg)
+    prompt = command.args or ""
+    reservation = await async_limiter.reserve(tg_id)
+    if not reservation.ok:
+        await message.reply(reservation.message)
         return
-    await message.reply("Gerando vídeo... (stub)")
+    try:
+        await message.reply("Gerando vídeo... (stub)")
+    except Exception:
+        await async_limiter.refund(reservation)
+        raise
     # stub: respond with message and log
-    logger.log(tg_id, "video", prompt, resultado="stub")
-    limiter.increment(tg_id)
+    logger.log(tg_id, "video", prompt, resultado="stub", plano=reservation.plano)
+    limiter.commit(reservation)
     await message.reply("Geração de vídeo é uma função stub por enquanto.")
 
 
+def open_database():
+    """Build the database service now, so a DB_BACKEND that cannot be opened
+    stops startup instead of failing every update."""
+    return services.db
+
+
 def register_handlers():
+    global _handlers_registered
+    if _handlers_registered:
+        return
+    _handlers_registered = True
+    dp.update.outer_middleware(update_limiter)
+    dp.message.middleware(MetricsMiddleware())
     dp.message.register(cmd_start, Command(commands=["start"]))
     dp.message.register(cmd_meu_plano, Command(commands=["meu_plano"]))
     dp.message.register(cmd_ajuda, Command(commands=["ajuda"]))
@@ -144,35 +290,108 @@ def register_handlers():
     dp.message.register(cmd_gerar_texto, Command(commands=["gerar_texto"]))
     dp.message.register(cmd_gerar_imagem, Command(commands=["gerar_imagem"]))
     dp.message.register(cmd_gerar_video, Command(commands=["gerar_video"]))
+    # imported here: app.commands imports this module
+    from app.commands.admin import cmd_admin, cmd_stats, is_admin
+    dp.message.register(cmd_admin, Command(commands=["admin"]), is_admin)
+    dp.message.register(cmd_stats, Command(commands=["stats"]), is_admin)
+
+
+def setup_webhook(app: web.Application, webhook_url: str):
+    """Receive updates on ``app`` at the path of ``webhook_url`` and register
+    that URL (with a secret token) with Telegram when the app starts."""
+    path = urlparse(webhook_url).path
+    if not path or path == "/":
+        path = "/webhook"
+        webhook_url = webhook_url.rstrip("/") + path
+    # Telegram echoes the secret in a header; generate one if not configured
+    secret = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=path)
+
+    async def _set_webhook(bot: Bot):
+        await bot.set_webhook(
+            url=webhook_url,
+            secret_token=secret,
+            max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40)),
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    dp.startup.register(_set_webhook)
+    setup_application(app, dp, bot=bot)
+
+
+def shutdown_services():
+    # only what was actually built; never construct a service to close it
+    if services.built("logger"):
+        logger.close()
+    if services.built("db"):
+        db.close()
+    executor.shutdown(wait=False)
+    if services.built("gemini"):
+        gemini.downloader.close()
+
+
+async def run(app: web.Application, host: str, port: int):
+    """Serve ``app`` (health/status and, in webhook mode, Telegram updates)
+    and run the bot, all in the current event loop."""
+    BOT_MODE = os.getenv('BOT_MODE', 'polling')
+    webhook_url = os.getenv('WEBHOOK_URL')
+    use_webhook = bool(bot) and BOT_MODE == 'webhook'
+    if use_webhook and not webhook_url:
+        print('WEBHOOK_URL não configurado. Usando polling.')
+        use_webhook = False
+
+    open_database()
+    if bot:
+        register_handlers()
+        if use_webhook:
+            setup_webhook(app, webhook_url)
+    else:
+        print("TELEGRAM_TOKEN não configurado. Bot não iniciado.")
+
+    if gemini.warmup_enabled:
+        _in_background(async_gemini.warmup())
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    try:
+        if bot and not use_webhook:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+        else:
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, stop.set)
+                except (NotImplementedError, RuntimeError):
+                    pass
+            await stop.wait()
+    finally:
+        await runner.cleanup()
+        await drain_background()
+        await outbound.close()
+        if services.built("storage"):
+            await storage.close()
+        shutdown_services()
 
 
 def start_polling():
+    """Polling only, without the HTTP server (see server.py for the full app)."""
     if not bot:
         print("TELEGRAM_TOKEN não configurado. Bot não iniciado.")
         return
+    open_database()
     register_handlers()
-    # Support both polling and webhook modes via BOT_MODE env var
-    import asyncio
-    import os
-
-    BOT_MODE = os.getenv('BOT_MODE', 'polling')
 
     async def _run_polling():
         try:
             await dp.start_polling(bot)
         finally:
-            await bot.session.close()
-
-    async def _run_webhook():
-        # Minimal webhook runner; aiogram webhook requires an ASGI/HTTPS endpoint in production.
-        webhook_url = os.getenv('WEBHOOK_URL')
-        if not webhook_url:
-            print('WEBHOOK_URL não configurado. Saindo do modo webhook.')
-            return
-        # For deploy, prefer using an ASGI server and aiogram webhook integration.
-        await _run_polling()
-
-    if BOT_MODE == 'webhook':
-        asyncio.run(_run_webhook())
-    else:
-        asyncio.run(_run_polling())
+            await drain_background()
+            await outbound.close()
+            if services.built("storage"):
+                await storage.close()
+            shutdown_services()
+
+    asyncio.run(_run_polling())
@@ -1,22 +1,70 @@
+import os
+from collections import Counter
+from datetime import date, timedelta
+
 from aiogram import types
-from aiogram.filters import Command
-from app.services.db_service import DBService
+from app.bot import async_db
+from app.services.container import services
+from app.utils.helpers import today_date_str
+
+# the bot's DBService (and its Supabase client), not a second one
+db = services.lazy("db")
+
+STATS_DAYS = 7
 
-db = DBService()
+
+def is_admin(message: types.Message) -> bool:
+    """Filter for admin commands: sender listed in ADMIN_TELEGRAM_IDS."""
+    ids = {i.strip() for i in os.getenv("ADMIN_TELEGRAM_IDS", "").split(",") if i.strip()}
+    return bool(message.from_user) and str(message.from_user.id) in ids
 
 
 async def cmd_admin(message: types.Message):
-    # Simple admin info: number of users in memory fallback
-    if not db.client:
-        users = getattr(db, '_mem_users', {})
-        await message.reply(f"Modo fallback (sem Supabase). Usuários em memória: {len(users)}")
+    # Simple admin info: which database is in use and how many users it has
+    users = await async_db.count_users()
+    if not db.client and hasattr(db.backend, "dsn"):
+        await message.reply(f"Postgres direto (DATABASE_URL). Usuários: {users}")
+    elif not db.client and hasattr(db.backend, "path"):
+        await message.reply(f"SQLite local ({db.backend.path}). Usuários: {users}")
+    elif not db.client:
+        await message.reply(f"Modo fallback (sem Supabase). Usuários em memória: {users}")
     else:
-        res = db.client.table('users').select('count').execute()
-        await message.reply(f"Supabase conectado. Status: {res.status_code}")
+        await message.reply(f"Supabase conectado. Usuários (estimativa): {users}")
+
+
+def format_stats(rows, today: str, users=None) -> str:
+    """Text for /stats from ``usage_daily`` rows of the last days up to ``today``."""
+    today_rows = [r for r in rows if str(r["dia"]) == today]
+    by_tipo = Counter()
+    by_plano = Counter()
+    for r in today_rows:
+        by_tipo[r["tipo"] or "?"] += r["total"]
+        by_plano[r["plano"] or "?"] += r["total"]
+    week_tipo = Counter()
+    for r in rows:
+        week_tipo[r["tipo"] or "?"] += r["total"]
+
+    def parts(counter):
+        return " · ".join(f"{k}: {v}" for k, v in counter.most_common()) or "-"
+
+    lines = [
+        f"Hoje ({today}): {sum(by_tipo.values())} gerações",
+        f"  por tipo: {parts(by_tipo)}",
+        f"  por plano: {parts(by_plano)}",
+        f"Últimos {STATS_DAYS} dias: {sum(week_tipo.values())} gerações",
+        f"  por tipo: {parts(week_tipo)}",
+    ]
+    if users is not None:
+        lines.append(f"Usuários: {users}")
+    return "\n".join(lines)
+
 
+async def cmd_stats(message: types.Message):
+    # reads the precomputed daily rollup: a few rows, never the logs table
+    today = today_date_str()
+    first = (date.fromisoformat(today) - timedelta(days=STATS_DAYS - 1)).isoformat()
+    rows = await async_db.usage_between(first, today)
+    await message.reply(format_stats(rows, today, await async_db.count_users()))
 
-__all__ = ["cmd_admin"]
-# Admin command placeholders (ban, stats, setplan)
 
-def cmd_admin_stub(message):
-    return
+__all__ = ["cmd_admin", "cmd_stats", "is_admin"]
@@ -0,0 +1,85 @@
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.utils.metrics import HANDLER_ERRORS, HANDLER_SECONDS
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Cap how many updates are handled at the same time.
+
+    Webhook updates are processed as background tasks, so without a cap a
+    burst would start every handler at once. Excess updates wait here.
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit or int(os.getenv("UPDATE_CONCURRENCY", 64))
+        self._sem = None
+        self._loop = None
+        self.active = 0
+        self.waiting = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.limit)
+        return self._sem
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        sem = self._semaphore()
+        self.waiting += 1
+        try:
+            await sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.active -= 1
+            sem.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting}
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Record handler latency and failures per command.
+
+    Registered as an inner message middleware, so it only sees updates a
+    handler matched and the ``command`` label stays bounded.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        command = _command_name(event)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(command=command)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, command=command)
+
+
+def _command_name(event: TelegramObject) -> str:
+    text = getattr(event, "text", None) or ""
+    if not text.startswith("/"):
+        return "other"
+    # "/gerar_texto@MeuBot prompt" -> "gerar_texto"
+    return text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower() or "other"
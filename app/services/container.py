@@ -0,0 +1,129 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+_clients: Dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def supabase_client(url: Optional[str] = None, key: Optional[str] = None):
+    """The Supabase client for ``url``/``key``, created once per process.
+
+    The SDK is imported on first use, so mock-only runs and tests never pay
+    for it. Returns None when it is not installed or not configured.
+    """
+    url = url or os.getenv("SUPABASE_URL")
+    key = key or os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        return None
+    with _clients_lock:
+        if (url, key) in _clients:
+            return _clients[(url, key)]
+        try:
+            from supabase import create_client
+            client = create_client(url, key)
+        except Exception as e:
+            print(f"[ServiceContainer] Error creating Supabase client: {e}")
+            client = None
+        _clients[(url, key)] = client
+        return client
+
+
+class LazyService:
+    """Stand-in that builds the real service on first attribute access."""
+
+    def __init__(self, container: "ServiceContainer", name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str):
+        return getattr(self._container.get(self._name), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(self._container.get(self._name), attr, value)
+
+    def __repr__(self):
+        state = "built" if self._container.built(self._name) else "not built"
+        return f"<LazyService {self._name} ({state})>"
+
+
+class ServiceContainer:
+    """Registry of service factories; each service is built once, on demand."""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[["ServiceContainer"], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[["ServiceContainer"], Any]):
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = self._factories[name](self)
+            return self._instances[name]
+
+    def set(self, name: str, instance: Any):
+        """Use ``instance`` instead of building one (tests, benchmarks)."""
+        with self._lock:
+            self._instances[name] = instance
+
+    def reset(self, *names: str):
+        """Forget built (or ``set``) instances so they are rebuilt on next use;
+        all of them when no name is given (tests, benchmarks)."""
+        with self._lock:
+            for name in names or list(self._instances):
+                self._instances.pop(name, None)
+
+    def built(self, name: str) -> bool:
+        return name in self._instances
+
+    def lazy(self, name: str) -> LazyService:
+        return LazyService(self, name)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self.get(name)
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def _db(c):
+    from app.services.db_service import DBService
+    return DBService()
+
+
+def _gemini(c):
+    from app.services.gemini_service import GeminiService
+    return GeminiService()
+
+
+def _limiter(c):
+    from app.services.limiter_service import LimiterService
+    return LimiterService(c.db)
+
+
+def _logger(c):
+    from app.services.logger_service import LoggerService
+    return LoggerService(c.db)
+
+
+def _storage(c):
+    from app.services.storage_service import StorageService
+    return StorageService(c.db)
+
+
+services = ServiceContainer()
+services.register("db", _db)
+services.register("gemini", _gemini)
+services.register("limiter", _limiter)
+services.register("logger", _logger)
+services.register("storage", _storage)
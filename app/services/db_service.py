@@ -1,13 +1,18 @@
 import os
+from dataclasses import asdict
 from typing import Optional, List
 
-try:
-    from supabase import create_client
-except Exception:
-    create_client = None
-
 from app.models.user_model import User
 from app.models.log_model import LogEntry
+from app.utils.cache import TTLCache
+from app.utils.metrics import DB_SECONDS, ERRORS, timed
+from app.services.container import supabase_client
+from app.services.memory_backend import MemoryBackend
+from app.services.shared_backend import connect_backend
+
+
+class BackendUnavailableError(RuntimeError):
+    """Raised when the backend chosen with DB_BACKEND cannot be opened."""
 
 
 class DBService:
@@ -16,24 +21,77 @@ class DBService:
         self.key = key or os.getenv("SUPABASE_KEY")
         # Allow forcing fallback (no remote connection) via env var USE_FALLBACK_DB
         use_fallback = os.getenv("USE_FALLBACK_DB", "false").lower() in ("1", "true", "yes")
-        if not use_fallback and create_client and self.url and self.key:
-            try:
-                self.client = create_client(self.url, self.key)
-            except Exception as e:
-                print(f"[DBService] Error creating Supabase client: {e}")
-                self.client = None
-        else:
+        # one client per process (see container.supabase_client)
+        self.client = supabase_client(self.url, self.key) if not use_fallback else None
+
+        # Write-through cache of user rows keyed by telegram_id
+        self._user_cache = TTLCache(
+            maxsize=int(os.getenv("USER_CACHE_SIZE", 1024)),
+            ttl=float(os.getenv("USER_CACHE_TTL", 60)),
+        )
+
+        # DB_BACKEND=postgres talks to DATABASE_URL directly instead of the REST
+        # API; sqlite keeps everything in a local file (SQLITE_PATH)
+        self.backend_name = os.getenv("DB_BACKEND", "supabase").lower()
+        if self.backend_name in ("memory", "sqlite"):
             self.client = None
+        self.backend = self._make_backend()
 
+    def _make_backend(self):
+        if self.backend_name == "postgres":
+            try:
+                from app.services.postgres_backend import PostgresBackend
+                backend = PostgresBackend()
+                self.client = None
+                return backend
+            except Exception as e:
+                # asked for explicitly: a process-local memory store would lose
+                # quotas on restart and count them per worker
+                ERRORS.inc(where="db")
+                raise BackendUnavailableError(f"DB_BACKEND=postgres: cannot connect to DATABASE_URL: {e}") from e
+        if self.backend_name == "sqlite":
+            try:
+                from app.services.sqlite_backend import SqliteBackend
+                return SqliteBackend()
+            except Exception as e:
+                ERRORS.inc(where="db")
+                raise BackendUnavailableError(f"DB_BACKEND=sqlite: cannot open SQLITE_PATH: {e}") from e
         # In-memory fallback for local testing when Supabase is not configured
-        self._mem_users = {}
-        self._mem_logs = []
-        from app.utils.constants import DEFAULT_PLANS
-        self._mem_planos = DEFAULT_PLANS
-        self._next_user_id = 1
+        # (default backend only);
+        # multi-worker mode shares one through SHARED_BACKEND_ADDRESS
+        shared = os.getenv("SHARED_BACKEND_ADDRESS")
+        if shared and not self.client:
+            return connect_backend(shared, os.getenv("SHARED_BACKEND_AUTHKEY", "").encode())
+        return MemoryBackend()
+
+    def close(self):
+        if hasattr(self.backend, "close"):
+            self.backend.close()
+
+    def cache_stats(self) -> dict:
+        return self._user_cache.stats()
+
+    def _cache_user_row(self, telegram_id: int, row) -> None:
+        # update results are lists, insert results a single row
+        if isinstance(row, list):
+            row = row[0] if len(row) == 1 else None
+        if isinstance(row, dict) and row.get("telegram_id") == telegram_id:
+            self._user_cache.set(telegram_id, dict(row))
+        else:
+            self._user_cache.invalidate(telegram_id)
 
     # Users
     def get_user_by_telegram(self, telegram_id: int) -> Optional[User]:
+        cached = self._user_cache.get(telegram_id)
+        if cached is not None:
+            return User(**cached)
+        user = self._fetch_user_by_telegram(telegram_id)
+        if user is not None:
+            self._user_cache.set(telegram_id, asdict(user))
+        return user
+
+    @timed(DB_SECONDS, table="users", op="select")
+    def _fetch_user_by_telegram(self, telegram_id: int) -> Optional[User]:
         if self.client:
             try:
                 res = self.client.table("users").select("*").eq("telegram_id", telegram_id).execute()
@@ -46,54 +104,124 @@ class DBService:
                 return User(**data)
             except Exception as e:
                 print(f"[DBService] get_user_by_telegram error: {e}")
+                ERRORS.inc(where="db")
                 return None
 
-        # fallback to memory
-        for u in self._mem_users.values():
-            if u.get("telegram_id") == telegram_id:
-                return User(**u)
-        return None
+        # local or direct-Postgres backend
+        try:
+            row = self.backend.get_user(telegram_id)
+        except Exception as e:
+            print(f"[DBService] get_user_by_telegram error: {e}")
+            ERRORS.inc(where="db")
+            return None
+        return User(**row) if row else None
 
+    @timed(DB_SECONDS, table="users", op="insert")
     def create_user(self, user: dict) -> dict:
+        self._user_cache.invalidate(user.get("telegram_id"))
         if self.client:
             try:
                 res = self.client.table("users").insert(user).execute()
                 if hasattr(res, 'data'):
-                    return res.data[0] if isinstance(res.data, list) and res.data else res.data
+                    row = res.data[0] if isinstance(res.data, list) and res.data else res.data
+                    self._cache_user_row(user.get("telegram_id"), row)
+                    return row
                 return {}
             except Exception as e:
                 print(f"[DBService] create_user error: {e}")
+                ERRORS.inc(where="db")
                 return {}
 
-        # memory fallback
-        user = dict(user)
-        user_id = self._next_user_id
-        self._next_user_id += 1
-        user["id"] = user_id
-        self._mem_users[user_id] = user
-        return user
+        # local or direct-Postgres backend
+        try:
+            row = self.backend.insert_user(user)
+        except Exception as e:
+            print(f"[DBService] create_user error: {e}")
+            ERRORS.inc(where="db")
+            return {}
+        self._cache_user_row(user.get("telegram_id"), row)
+        return row
 
-    def update_user(self, telegram_id: int, changes: dict) -> dict:
+    @timed(DB_SECONDS, table="users", op="update")
+    def update_user(self, telegram_id: int, changes: dict) -> List[dict]:
+        # drop first so a failed write never leaves a stale row behind
+        self._user_cache.invalidate(telegram_id)
         if self.client:
             try:
                 res = self.client.table("users").update(changes).eq("telegram_id", telegram_id).execute()
                 if hasattr(res, 'data'):
+                    self._cache_user_row(telegram_id, res.data)
                     return res.data
                 return {}
             except Exception as e:
                 print(f"[DBService] update_user error: {e}")
+                ERRORS.inc(where="db")
                 return {}
 
-        # memory fallback: find user and update
-        for uid, u in self._mem_users.items():
-            if u.get("telegram_id") == telegram_id:
-                u.update(changes)
-                self._mem_users[uid] = u
-                return u
-        return {}
+        # local or direct-Postgres backend
+        try:
+            rows = self.backend.update_user(telegram_id, changes)
+        except Exception as e:
+            print(f"[DBService] update_user error: {e}")
+            ERRORS.inc(where="db")
+            return {}
+        self._cache_user_row(telegram_id, rows)
+        return rows
+
+    # Quota
+    @timed(DB_SECONDS, table="users", op="reserve")
+    def reserve_generation(self, telegram_id: int, today: str) -> dict:
+        """Atomically roll the daily counter over and take one slot.
+
+        Returns a dict with ``status`` ('ok', 'limit', 'not_found' or 'error'),
+        ``geracoes_hoje``, ``limite_diario`` and ``plano``.
+        """
+        self._user_cache.invalidate(telegram_id)
+        if self.client:
+            try:
+                res = self.client.rpc("reserve_generation", {"p_telegram_id": telegram_id, "p_today": today}).execute()
+                data = getattr(res, 'data', None)
+                row = data[0] if isinstance(data, list) and data else data
+                if not row:
+                    return {"status": "error"}
+                return {
+                    "status": row.get("status"),
+                    "geracoes_hoje": row.get("usados"),
+                    "limite_diario": row.get("limite"),
+                    "plano": row.get("plano_usuario"),
+                }
+            except Exception as e:
+                print(f"[DBService] reserve_generation error: {e}")
+                ERRORS.inc(where="db")
+                return {"status": "error"}
+
+        try:
+            return self.backend.reserve_generation(telegram_id, today)
+        except Exception as e:
+            print(f"[DBService] reserve_generation error: {e}")
+            ERRORS.inc(where="db")
+            return {"status": "error"}
+
+    @timed(DB_SECONDS, table="users", op="release")
+    def release_generation(self, telegram_id: int, today: str) -> None:
+        self._user_cache.invalidate(telegram_id)
+        if self.client:
+            try:
+                self.client.rpc("release_generation", {"p_telegram_id": telegram_id, "p_today": today}).execute()
+            except Exception as e:
+                print(f"[DBService] release_generation error: {e}")
+                ERRORS.inc(where="db")
+            return
+
+        try:
+            self.backend.release_generation(telegram_id, today)
+        except Exception as e:
+            print(f"[DBService] release_generation error: {e}")
+            ERRORS.inc(where="db")
 
     # Logs
-    def insert_log(self, log: dict) -> dict:
+    @timed(DB_SECONDS, table="logs", op="insert")
+    def insert_log(self, log: dict) -> List[dict]:
         if self.client:
             try:
                 res = self.client.table("logs").insert(log).execute()
@@ -102,12 +230,94 @@ class DBService:
                 return {}
             except Exception as e:
                 print(f"[DBService] insert_log error: {e}")
+                ERRORS.inc(where="db")
                 return {}
 
-        self._mem_logs.append(log)
-        return log
+        try:
+            return self.backend.insert_logs([log])
+        except Exception as e:
+            print(f"[DBService] insert_log error: {e}")
+            ERRORS.inc(where="db")
+            return []
+
+    @timed(DB_SECONDS, table="logs", op="insert")
+    def insert_logs(self, logs: List[dict]) -> List[dict]:
+        """Insert several log rows with a single multi-row insert.
+
+        Errors are raised, not swallowed: the caller (LoggerService) must
+        know the batch was not stored.
+        """
+        if not logs:
+            return []
+        try:
+            if self.client:
+                res = self.client.table("logs").insert(logs).execute()
+                return res.data if hasattr(res, 'data') else []
+            return self.backend.insert_logs(logs)
+        except Exception:
+            ERRORS.inc(where="db")
+            raise
+
+    # Usage rollup
+    @timed(DB_SECONDS, table="usage_daily", op="upsert")
+    def add_usage(self, rows: List[dict]) -> None:
+        """Add ``{dia, tipo, plano, total}`` counts to the daily rollup."""
+        if not rows:
+            return
+        if self.client:
+            try:
+                self.client.rpc("add_usage", {"p_rows": rows}).execute()
+            except Exception as e:
+                print(f"[DBService] add_usage error: {e}")
+                ERRORS.inc(where="db")
+            return
+
+        try:
+            self.backend.add_usage(rows)
+        except Exception as e:
+            print(f"[DBService] add_usage error: {e}")
+            ERRORS.inc(where="db")
+
+    @timed(DB_SECONDS, table="usage_daily", op="select")
+    def usage_between(self, day_from: str, day_to: str) -> List[dict]:
+        if self.client:
+            try:
+                res = (self.client.table("usage_daily").select("*")
+                       .gte("dia", day_from).lte("dia", day_to).execute())
+                return res.data if hasattr(res, 'data') else []
+            except Exception as e:
+                print(f"[DBService] usage_between error: {e}")
+                ERRORS.inc(where="db")
+                return []
+
+        try:
+            return self.backend.usage_between(day_from, day_to)
+        except Exception as e:
+            print(f"[DBService] usage_between error: {e}")
+            ERRORS.inc(where="db")
+            return []
+
+    @timed(DB_SECONDS, table="users", op="count")
+    def count_users(self) -> Optional[int]:
+        if self.client:
+            try:
+                # the planner's estimate for big tables: no full scan
+                res = self.client.table("users").select("id", count="estimated", head=True).execute()
+                return getattr(res, 'count', None)
+            except Exception as e:
+                print(f"[DBService] count_users error: {e}")
+                ERRORS.inc(where="db")
+                return None
+
+        try:
+            return self.backend.count_users()
+        except Exception as e:
+            print(f"[DBService] count_users error: {e}")
+            ERRORS.inc(where="db")
+            return None
 
     # Planos
+    @timed(DB_SECONDS, table="planos", op="select")
     def list_planos(self) -> List[dict]:
         if self.client:
             try:
@@ -115,6 +325,13 @@ class DBService:
                 return res.data if hasattr(res, 'data') else []
             except Exception as e:
                 print(f"[DBService] list_planos error: {e}")
+                ERRORS.inc(where="db")
                 from app.utils.constants import DEFAULT_PLANS
                 return DEFAULT_PLANS
-        return self._mem_planos
+        try:
+            return self.backend.list_planos()
+        except Exception as e:
+            print(f"[DBService] list_planos error: {e}")
+            ERRORS.inc(where="db")
+            from app.utils.constants import DEFAULT_PLANS
+            return DEFAULT_PLANS
@@ -0,0 +1,90 @@
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class DownloadError(ValueError):
+    """Raised when a download is refused (too large, not an image, bad status)."""
+
+
+class ImageDownloader:
+    """Fetch images returned by URL through one pooled keep-alive session.
+
+    Bodies are read in chunks and abandoned as soon as they pass
+    ``DOWNLOAD_MAX_BYTES``; responses that are not ``image/*`` are refused and
+    at most ``DOWNLOAD_CONCURRENCY`` downloads run at once.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, max_bytes: Optional[int] = None,
+                 concurrency: Optional[int] = None, pool_size: Optional[int] = None):
+        self.timeout = timeout if timeout is not None else float(os.getenv("DOWNLOAD_TIMEOUT", 15))
+        self.max_bytes = max_bytes or int(os.getenv("DOWNLOAD_MAX_BYTES", 10 * 1024 * 1024))
+        self.concurrency = concurrency or int(os.getenv("DOWNLOAD_CONCURRENCY", 8))
+        pool_size = pool_size or int(os.getenv("DOWNLOAD_POOL_SIZE", 16))
+        self.chunk_size = 64 * 1024
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self.downloads = 0
+        self.refused = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def fetch(self, url: str) -> bytes:
+        """Download ``url`` and return its bytes or raise DownloadError."""
+        with self._slots:
+            try:
+                data = self._fetch(url)
+            except DownloadError:
+                self._count("refused")
+                raise
+            except Exception:
+                self._count("failed")
+                raise
+        with self._lock:
+            self.downloads += 1
+            self.bytes += len(data)
+        return data
+
+    def _fetch(self, url: str) -> bytes:
+        with self._session.get(url, stream=True, timeout=self.timeout) as r:
+            if r.status_code != 200:
+                raise DownloadError(f"HTTP {r.status_code} for {url}")
+            content_type = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if not content_type.startswith("image/"):
+                raise DownloadError(f"not an image: {content_type or 'unknown type'}")
+            declared = r.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise DownloadError(f"image too large: {declared} bytes")
+
+            buf = bytearray()
+            for chunk in r.iter_content(chunk_size=self.chunk_size):
+                buf += chunk
+                if len(buf) > self.max_bytes:
+                    # stop reading; closing the response drops the connection
+                    raise DownloadError(f"image larger than {self.max_bytes} bytes")
+            return bytes(buf)
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def close(self):
+        self._session.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "downloads": self.downloads,
+                "refused": self.refused,
+                "failed": self.failed,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "concurrency": self.concurrency,
+            }
@@ -0,0 +1,139 @@
+import os
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the pool and its wait queue are both full."""
+
+
+class ExecutorService:
+    """Bounded thread pool used to run the blocking services (Supabase, Gemini,
+    Storage) without freezing the aiogram event loop."""
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv("SERVICE_POOL_SIZE", 16))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("SERVICE_QUEUE_SIZE", 256))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="svc")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _wrap(self, func: Callable, *args, **kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self._completed += 1
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise ExecutorBusyError("Servidor ocupado, tente novamente em instantes.")
+            self._pending += 1
+        loop = asyncio.get_running_loop()
+        try:
+            fut = loop.run_in_executor(self._pool, functools.partial(self._wrap, func, *args, **kwargs))
+        except Exception:
+            # submission failed (pool shut down): the wrapper will never run
+            with self._lock:
+                self._pending -= 1
+            raise
+        return await fut
+
+    async def iterate(self, func: Callable[..., Iterable], *args, timeout: Optional[float] = None,
+                      **kwargs) -> AsyncIterator:
+        """Consume a blocking iterator (e.g. a streaming SDK response) on the
+        pool and yield its items in the event loop as they are produced.
+
+        With ``timeout``, raises TimeoutError once the whole iteration has
+        taken longer than that many seconds; the producer stops at its next
+        item (a call hung inside the SDK keeps its thread until it returns).
+        """
+        loop = asyncio.get_running_loop()
+        ends = loop.time() + timeout if timeout else None
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for item in func(*args, **kwargs):
+                    if stop.is_set():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (done, e))
+                return
+            loop.call_soon_threadsafe(queue.put_nowait, (done, None))
+
+        task = asyncio.ensure_future(self.run(produce))
+        try:
+            while True:
+                remaining = ends - loop.time() if ends is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"stream exceeded {timeout:.0f}s deadline")
+                if queue.empty():
+                    if task.done():
+                        # producer never ran (pool rejected it) or left early
+                        await task
+                        return
+                    get = asyncio.ensure_future(queue.get())
+                    await asyncio.wait({get, task}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                    if not get.done():
+                        get.cancel()
+                        continue
+                    item, err = get.result()
+                else:
+                    item, err = queue.get_nowait()
+                if item is done:
+                    if err is not None:
+                        raise err
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pool_size": self.max_workers,
+                "queue_limit": self.max_queue,
+                "running": self._running,
+                "queued": max(0, self._pending - self._running),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+class AsyncProxy:
+    """Expose the methods of a synchronous service as coroutines that run on an
+    ExecutorService, e.g. ``await AsyncProxy(db, executor).get_user_by_telegram(1)``."""
+
+    def __init__(self, service, executor: ExecutorService):
+        self._service = service
+        self._executor = executor
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._service, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def _call(*args, **kwargs):
+            return await self._executor.run(attr, *args, **kwargs)
+
+        return _call
@@ -1,13 +1,98 @@
 import os
+import time
 import base64
-from typing import Optional, Tuple
+from typing import Iterator, Optional, Tuple
 
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
+from app.services.download_service import DownloadError, ImageDownloader
+from app.services.result_cache import ResultCache
+from app.utils.metrics import ERRORS, GEMINI_SECONDS, timed
+from app.utils.resilience import CircuitOpenError, ResilientCaller
 
-import requests
+UNAVAILABLE = "Gemini indisponível no momento, tente novamente em instantes."
+
+
+def _load_sdk():
+    # google.generativeai takes about a second to import; only load it when
+    # an API key is configured
+    try:
+        import google.generativeai as genai
+    except Exception:
+        return None
+    return genai
+
+
+class GeminiAdapter:
+    """The SDK call path, resolved once when the service starts.
+
+    google-generativeai releases expose different entry points; the first
+    one found is bound here (with its model object) so requests make a
+    single direct call instead of probing the module every time.
+    """
+
+    # used when GEMINI_TEXT_MODEL is unset: GenerativeModel only serves
+    # Gemini models, the legacy PaLM calls only text-bison
+    DEFAULT_TEXT_MODEL = "gemini-1.5-flash"
+    LEGACY_TEXT_MODEL = "text-bison-001"
+
+    def __init__(self, sdk, text_model: Optional[str] = None):
+        if not text_model:
+            text_model = self.DEFAULT_TEXT_MODEL if hasattr(sdk, 'GenerativeModel') else self.LEGACY_TEXT_MODEL
+        self.text_model = text_model
+        self.model = None
+        self.text_path = None
+        self.image_path = None
+        self._text = None
+        self._stream = None
+        self._image = None
+
+        if hasattr(sdk, 'GenerativeModel'):
+            self.model = sdk.GenerativeModel(text_model)
+            self.text_path = "GenerativeModel.generate_content"
+            self._text = lambda prompt: self.model.generate_content(prompt)
+            self._stream = lambda prompt: self.model.generate_content(prompt, stream=True)
+        elif hasattr(sdk, 'text') and hasattr(sdk.text, 'generate'):
+            self.text_path = "text.generate"
+            self._text = lambda prompt: sdk.text.generate(model=f"models/{text_model}", prompt=prompt)
+        elif hasattr(sdk, 'generate_text'):
+            self.text_path = "generate_text"
+            self._text = lambda prompt: sdk.generate_text(model=text_model, prompt=prompt)
+        elif hasattr(sdk, 'generate'):
+            self.text_path = "generate"
+            self._text = lambda prompt: sdk.generate(model=text_model, prompt=prompt)
+
+        if hasattr(sdk, 'images') and hasattr(sdk.images, 'generate'):
+            self.image_path = "images.generate"
+            self._image = lambda prompt: sdk.images.generate(prompt=prompt)
+        elif hasattr(sdk, 'image') and hasattr(sdk.image, 'generate'):
+            self.image_path = "image.generate"
+            self._image = lambda prompt: sdk.image.generate(prompt=prompt)
+        elif hasattr(sdk, 'generate_image'):
+            self.image_path = "generate_image"
+            self._image = lambda prompt: sdk.generate_image(prompt=prompt)
+
+    @property
+    def supports_text(self) -> bool:
+        return self._text is not None
+
+    @property
+    def supports_stream(self) -> bool:
+        return self._stream is not None
+
+    @property
+    def supports_image(self) -> bool:
+        return self._image is not None
+
+    def text(self, prompt: str):
+        return self._text(prompt)
+
+    def stream(self, prompt: str):
+        return self._stream(prompt)
+
+    def image(self, prompt: str):
+        return self._image(prompt)
+
+    def describe(self) -> dict:
+        return {"text": self.text_path, "image": self.image_path}
 
 
 class GeminiService:
@@ -15,13 +100,42 @@ class GeminiService:
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         # Optional flag to force mocks even if SDK present
         self.enable_mock = os.getenv("ENABLE_GEMINI_MOCK", "true").lower() in ("1", "true", "yes")
-        if genai and self.api_key:
+        # unset: the adapter picks the default of the SDK path it resolves
+        self.text_model = os.getenv("GEMINI_TEXT_MODEL") or GeminiAdapter.DEFAULT_TEXT_MODEL
+        self.image_model = os.getenv("GEMINI_IMAGE_MODEL", "default")
+        # Opt-in cache of generation results (see generate_*_cached)
+        use_cache = os.getenv("GEN_CACHE", "false").lower() in ("1", "true", "yes")
+        self.cache = ResultCache() if use_cache else None
+        # Deadlines, retries, hedging and circuit breaker for SDK calls
+        self.resilience = ResilientCaller("GEMINI")
+        # DOWNLOAD_* settings (timeout, size cap, concurrency)
+        self.downloader = ImageDownloader()
+        self.adapter = None
+        self.warmed = False
+        genai = _load_sdk() if self.api_key else None
+        if genai:
             try:
                 # Some SDK versions use configure
                 if hasattr(genai, 'configure'):
                     genai.configure(api_key=self.api_key)
-            except Exception:
-                pass
+                self.adapter = GeminiAdapter(genai, os.getenv("GEMINI_TEXT_MODEL"))
+                self.text_model = self.adapter.text_model
+            except Exception as e:
+                print(f"[GeminiService] SDK setup error: {e}")
+        self.warmup_enabled = os.getenv("GEMINI_WARMUP", "false").lower() in ("1", "true", "yes")
+
+    def warmup(self) -> bool:
+        """Send one tiny request so the first user does not pay for the
+        connection setup. Only runs when GEMINI_WARMUP is on."""
+        if not self.warmup_enabled or self.adapter is None or not self.adapter.supports_text:
+            return False
+        try:
+            # bounded by GEMINI_DEADLINE like any other call
+            self.resilience.call(lambda: self.adapter.text("ping"))
+            self.warmed = True
+        except Exception as e:
+            print(f"[GeminiService] warmup error: {e}")
+        return self.warmed
 
     def _extract_text(self, resp) -> str:
         # Try several common shapes of response
@@ -43,32 +157,105 @@ class GeminiService:
         except Exception as e:
             return f"[ERROR extracting text] {e}"
 
+    @timed(GEMINI_SECONDS, op="text")
     def generate_text(self, prompt: str) -> str:
-        if not genai or not self.api_key:
+        if self.adapter is None:
             if self.enable_mock:
                 return f"[MOCK TEXT] {prompt}"
             return "[Gemini not configured]"
 
-        # Try multiple SDK call styles for robustness
         try:
-            # genai.text.generate
-            if hasattr(genai, 'text') and hasattr(genai.text, 'generate'):
-                resp = genai.text.generate(model="models/text-bison-001", prompt=prompt)
-                return self._extract_text(resp)
+            return self.resilience.call(lambda: self._sdk_generate_text(prompt))
+        except CircuitOpenError:
+            # fail fast while the upstream is unhealthy
+            ERRORS.inc(where="gemini_circuit_open")
+            return self._fallback_text(prompt)
+        except Exception:
+            # raised, not returned: the handler refunds the generation
+            ERRORS.inc(where="gemini")
+            raise
 
-            # genai.generate_text
-            if hasattr(genai, 'generate_text'):
-                resp = genai.generate_text(model="text-bison-001", prompt=prompt)
-                return self._extract_text(resp)
+    def _sdk_generate_text(self, prompt: str) -> str:
+        if not self.adapter.supports_text:
+            return "[Gemini SDK present but no known text method]"
+        return self._extract_text(self.adapter.text(prompt))
 
-            # genai.generate
-            if hasattr(genai, 'generate'):
-                resp = genai.generate(model="text-bison-001", prompt=prompt)
-                return self._extract_text(resp)
+    def _fallback_text(self, prompt: str) -> str:
+        # only a real earlier answer; a mock or placeholder text would be
+        # charged to the user as a generation
+        cached = self.cached_text(prompt)
+        if cached is not None:
+            return cached
+        raise CircuitOpenError(UNAVAILABLE)
 
-            return "[Gemini SDK present but no known text method]"
-        except Exception as e:
-            return f"[ERROR in Gemini] {e}"
+    def stream_text(self, prompt: str) -> Iterator[str]:
+        """Yield the answer in chunks as the model produces them.
+
+        SDKs without streaming support yield the whole answer at once.
+        """
+        if self.adapter is None:
+            text = self.generate_text(prompt)
+            # mimic a streamed answer so the progressive path is exercised
+            words = text.split(" ")
+            for i in range(0, len(words), 8):
+                yield " ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "")
+            return
+
+        if self.adapter.supports_stream:
+            breaker = self.resilience.breaker
+            if not breaker.allow():
+                ERRORS.inc(where="gemini_circuit_open")
+                yield self._fallback_text(prompt)
+                return
+            started = time.perf_counter()
+            try:
+                for chunk in self.adapter.stream(prompt):
+                    text = getattr(chunk, 'text', None)
+                    if text:
+                        yield text
+            except GeneratorExit:
+                # consumer stopped reading; within the deadline the upstream
+                # was answering, past it the consumer already reported a timeout
+                if time.perf_counter() - started < self.resilience.deadline:
+                    breaker.record(True)
+                raise
+            except Exception:
+                ERRORS.inc(where="gemini")
+                breaker.record(False)
+                raise
+            breaker.record(True)
+            GEMINI_SECONDS.observe(time.perf_counter() - started, op="stream")
+            return
+
+        yield self.generate_text(prompt)
+
+    def stream_timed_out(self):
+        """Count a stream that missed the deadline as a failed upstream call."""
+        ERRORS.inc(where="gemini_timeout")
+        self.resilience.timeouts += 1
+        self.resilience.breaker.record(False)
+
+    def cached_text(self, prompt: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.get("text", prompt, self.text_model)
+
+    def store_text(self, prompt: str, text: str):
+        # never cache error placeholders
+        if self.cache is not None and text and not text.startswith(("[ERROR", "[Gemini")):
+            self.cache.set("text", prompt, text, self.text_model)
+
+    def generate_text_cached(self, prompt: str) -> Tuple[str, bool]:
+        """Like generate_text but served from the result cache when enabled.
+
+        Returns ``(text, cache_hit)``.
+        """
+        cached = self.cached_text(prompt)
+        if cached is not None:
+            return cached, True
+        text = self.generate_text(prompt)
+        self.store_text(prompt, text)
+        return text, False
 
     def _extract_image_bytes(self, resp) -> Optional[bytes]:
         # resp may contain bytes, base64 string, or URL
@@ -95,50 +282,66 @@ class GeminiService:
                 for key in ('url', 'image_url', 'result'):
                     url = resp.get(key)
                     if isinstance(url, str) and url.startswith('http'):
-                        r = requests.get(url)
-                        if r.status_code == 200:
-                            return r.content
+                        return self.downloader.fetch(url)
 
             # object with url attribute
             url = getattr(resp, 'url', None) or getattr(resp, 'image_url', None)
             if isinstance(url, str) and url.startswith('http'):
-                r = requests.get(url)
-                if r.status_code == 200:
-                    return r.content
-        except Exception:
-            pass
+                return self.downloader.fetch(url)
+        except DownloadError as e:
+            # refused downloads are final; network errors reach the retry logic
+            print(f"[GeminiService] image download refused: {e}")
         return None
 
+    @timed(GEMINI_SECONDS, op="image")
     def generate_image(self, prompt: str) -> bytes:
         # If Gemini SDK present and configured, try to generate image
-        if genai and self.api_key and not self.enable_mock:
+        if self.adapter is not None and self.adapter.supports_image and not self.enable_mock:
             try:
-                # try common method names
-                candidates = []
-                if hasattr(genai, 'images') and hasattr(genai.images, 'generate'):
-                    candidates.append(lambda: genai.images.generate(prompt=prompt))
-                if hasattr(genai, 'image') and hasattr(genai.image, 'generate'):
-                    candidates.append(lambda: genai.image.generate(prompt=prompt))
-                if hasattr(genai, 'generate_image'):
-                    candidates.append(lambda: genai.generate_image(prompt=prompt))
-
-                for call in candidates:
-                    try:
-                        resp = call()
-                        img = self._extract_image_bytes(resp)
-                        if img:
-                            return img
-                    except Exception:
-                        continue
+                return self.resilience.call(lambda: self._sdk_generate_image(prompt))
+            except CircuitOpenError:
+                # fail fast while the upstream is unhealthy
+                ERRORS.inc(where="gemini_circuit_open")
+                return self._fallback_image(prompt)
             except Exception:
-                pass
+                # raised, not returned: the handler refunds the generation
+                ERRORS.inc(where="gemini")
+                raise
 
         # If we reach here, either SDK not present/usable or mocking enabled
         if self.enable_mock:
             # return a 1x1 PNG
             return b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9c\x63\x60\x00\x00\x00\x02\x00\x01\xe2!\xbc\x33\x00\x00\x00\x00IEND\xaeB`\x82"
 
-        return b""
+        raise RuntimeError("Geração de imagem não configurada.")
+
+    def _sdk_generate_image(self, prompt: str) -> bytes:
+        img = self._extract_image_bytes(self.adapter.image(prompt))
+        if not img:
+            # a failed call for the breaker, not an empty photo for the user
+            raise RuntimeError("Gemini não retornou imagem.")
+        return img
+
+    def _fallback_image(self, prompt: str) -> bytes:
+        if self.cache is not None:
+            cached = self.cache.get("image", prompt, self.image_model)
+            if cached is not None:
+                return cached
+        raise CircuitOpenError(UNAVAILABLE)
+
+    def generate_image_cached(self, prompt: str) -> Tuple[bytes, bool]:
+        """Like generate_image but served from the result cache when enabled.
+
+        Returns ``(image_bytes, cache_hit)``.
+        """
+        if self.cache is None:
+            return self.generate_image(prompt), False
+        cached = self.cache.get("image", prompt, self.image_model)
+        if cached is not None:
+            return cached, True
+        img = self.generate_image(prompt)
+        self.cache.set("image", prompt, img, self.image_model)
+        return img, False
 
     def generate_video(self, prompt: str) -> bytes:
         # Placeholder stub for future integration
@@ -1,15 +1,69 @@
-from typing import Tuple
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
 from app.utils.helpers import today_date_str
+from app.utils.metrics import QUOTA_REJECTIONS
+
+
+LIMIT_REACHED_MSG = "Você atingiu o limite diário do seu plano. Aguarde até amanhã ou atualize seu plano."
+NOT_REGISTERED_MSG = "Usuário não cadastrado. Use /start"
+
+
+@dataclass
+class Reservation:
+    telegram_id: int
+    day: str
+    ok: bool
+    message: str
+    plano: Optional[str] = None
+    # reserved -> committed | refunded
+    state: str = "reserved"
 
 
 class LimiterService:
     def __init__(self, db_service):
         self.db = db_service
+        # Plans for which an answer served from the result cache is free
+        free = os.getenv("GEN_CACHE_FREE_PLANS", "Pro")
+        self.cache_free_plans = {p.strip() for p in free.split(",") if p.strip()}
+
+    def reserve(self, telegram_id: int) -> Reservation:
+        """Take one generation slot with a single atomic DB call.
+
+        The slot is already counted when ``ok`` is True; call ``commit`` once the
+        generation succeeded or ``refund`` to hand it back.
+        """
+        today = today_date_str()
+        row = self.db.reserve_generation(telegram_id, today)
+        status = row.get("status")
+        if status == "ok":
+            return Reservation(telegram_id, today, True, "OK", plano=row.get("plano"))
+        QUOTA_REJECTIONS.inc(reason=status or "error")
+        if status == "not_found":
+            return Reservation(telegram_id, today, False, NOT_REGISTERED_MSG, state="refunded")
+        if status == "limit":
+            return Reservation(telegram_id, today, False, LIMIT_REACHED_MSG, plano=row.get("plano"), state="refunded")
+        return Reservation(telegram_id, today, False, "Não foi possível verificar seu limite agora. Tente novamente.", state="refunded")
+
+    def commit(self, reservation: Reservation):
+        # The counter was incremented by reserve(); committing only closes the slot.
+        if reservation.ok and reservation.state == "reserved":
+            reservation.state = "committed"
+
+    def cached_hit_is_free(self, reservation: Reservation) -> bool:
+        return reservation.plano in self.cache_free_plans
+
+    def refund(self, reservation: Reservation) -> bool:
+        if not reservation.ok or reservation.state != "reserved":
+            return False
+        self.db.release_generation(reservation.telegram_id, reservation.day)
+        reservation.state = "refunded"
+        return True
 
     def can_generate(self, telegram_id: int) -> Tuple[bool, str]:
         user = self.db.get_user_by_telegram(telegram_id)
         if not user:
-            return False, "Usuário não cadastrado. Use /start"
+            return False, NOT_REGISTERED_MSG
 
         # reset if last generation is not today
         today = today_date_str()
@@ -20,7 +74,7 @@ class LimiterService:
             user.ultima_geracao = today
 
         if user.geracoes_hoje >= user.limite_diario:
-            return False, "Você atingiu o limite diário do seu plano. Aguarde até amanhã ou atualize seu plano."
+            return False, LIMIT_REACHED_MSG
 
         return True, "OK"
 
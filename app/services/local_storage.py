@@ -0,0 +1,174 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class LocalStorage:
+    """Size-capped local object store used when Supabase Storage is missing.
+
+    Files live in hash-sharded subdirectories (``root/ab/cd/<name>``) so no
+    directory grows huge, are written atomically (temp file + rename) and are
+    evicted least-recently-used first once ``STORAGE_LOCAL_MAX_BYTES`` is
+    exceeded, or when older than ``STORAGE_LOCAL_MAX_AGE`` seconds. Eviction
+    runs in small batches on a background thread so writers never stall.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None, evict_batch: int = 64, background: bool = True):
+        self.root = root or os.getenv("STORAGE_LOCAL_DIR", ".temp_storage")
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("STORAGE_LOCAL_MAX_BYTES", 512 * 1024 * 1024))
+        self.max_age = max_age if max_age is not None else float(os.getenv("STORAGE_LOCAL_MAX_AGE", 0))
+        self.evict_batch = evict_batch
+        # without the background sweeper, callers run evict() themselves
+        self.background = background
+        self._lock = threading.Lock()
+        # relative path -> (size, last access), oldest access first
+        self._files = OrderedDict()
+        self.bytes_used = 0
+        self.writes = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, os.path.relpath(full, self.root), st.st_size))
+        for mtime, rel, size in sorted(found):
+            self._files[rel] = (size, mtime)
+            self.bytes_used += size
+
+    def relpath(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(digest[:2], digest[2:4], key.replace("/", "_"))
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, self.relpath(key))
+
+    def put(self, key: str, data: bytes) -> str:
+        rel = self.relpath(key)
+        path = os.path.join(self.root, rel)
+        with self._lock:
+            existing = self._files.get(rel)
+        if existing is not None and existing[0] == len(data) and os.path.exists(path):
+            self._touch(rel, path)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            old = self._files.pop(rel, None)
+            if old is not None:
+                self.bytes_used -= old[0]
+            self._files[rel] = (len(data), time.time())
+            self.bytes_used += len(data)
+            self.writes += 1
+            over = self.bytes_used > self.max_bytes
+        if self.background and (over or self.max_age > 0):
+            self._ensure_thread()
+            if over:
+                self._wake.set()
+        return path
+
+    def get(self, key: str) -> Optional[bytes]:
+        rel = self.relpath(key)
+        path = os.path.join(self.root, rel)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self._touch(rel, path)
+        return data
+
+    def delete(self, key: str):
+        rel = self.relpath(key)
+        with self._lock:
+            old = self._files.pop(rel, None)
+            if old is not None:
+                self.bytes_used -= old[0]
+        try:
+            os.remove(os.path.join(self.root, rel))
+        except OSError:
+            pass
+
+    def _touch(self, rel: str, path: str):
+        now = time.time()
+        with self._lock:
+            if rel in self._files:
+                self._files[rel] = (self._files[rel][0], now)
+                self._files.move_to_end(rel)
+        try:
+            # persist recency for the scan after a restart
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def evict(self, max_files: Optional[int] = None) -> int:
+        """Remove up to ``max_files`` files that are over the size cap or too
+        old. Returns how many were removed."""
+        limit = max_files or self.evict_batch
+        cutoff = time.time() - self.max_age if self.max_age > 0 else None
+        removed = 0
+        while removed < limit:
+            with self._lock:
+                if not self._files:
+                    break
+                rel, (size, accessed) = next(iter(self._files.items()))
+                if self.bytes_used <= self.max_bytes and (cutoff is None or accessed >= cutoff):
+                    break
+                del self._files[rel]
+                self.bytes_used -= size
+            try:
+                os.remove(os.path.join(self.root, rel))
+            except OSError:
+                pass
+            with self._lock:
+                self.evicted_files += 1
+                self.evicted_bytes += size
+            removed += 1
+        return removed
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="local-storage-evict", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = float(os.getenv("STORAGE_LOCAL_SWEEP_INTERVAL", 60))
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            # a batch at a time, yielding between batches
+            while self.evict() == self.evict_batch:
+                time.sleep(0.01)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "bytes_used": self.bytes_used,
+                "max_bytes": self.max_bytes,
+                "writes": self.writes,
+                "evicted_files": self.evicted_files,
+                "evicted_bytes": self.evicted_bytes,
+            }
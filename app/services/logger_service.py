@@ -1,16 +1,181 @@
+import os
+import time
+import asyncio
+import atexit
+import threading
+from collections import Counter, deque
 from datetime import datetime
 
+from app.utils.metrics import ERRORS, LOG_FLUSH_SECONDS
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+# Suffix of the tipo of failed generations ("text_error"); they are logged
+# but are not usage, so the rollup skips them
+FAILED_SUFFIX = "_error"
+
+
+def usage_rows(entries: list) -> list:
+    """Count log entries per (day, tipo, plano) for ``usage_daily``,
+    failed generations left out."""
+    counts = Counter((e["data"][:10], e.get("tipo") or "", e.get("plano") or "") for e in entries
+                     if not (e.get("tipo") or "").endswith(FAILED_SUFFIX))
+    return [{"dia": dia, "tipo": tipo, "plano": plano, "total": total}
+            for (dia, tipo, plano), total in sorted(counts.items())]
+
 
 class LoggerService:
-    def __init__(self, db_service):
+    """Queue log entries in memory and write them to ``logs`` in bulk.
+
+    A background thread flushes a batch when ``LOG_BATCH_SIZE`` entries are
+    waiting or every ``LOG_FLUSH_INTERVAL`` seconds, so ``log()`` never does
+    network I/O on the request path. When the queue is full the
+    ``LOG_DROP_POLICY`` decides what happens: ``oldest`` (default) or
+    ``newest`` drop an entry, ``block`` waits up to ``LOG_BLOCK_TIMEOUT``
+    seconds for room before dropping the new one (worker threads only; on
+    the event loop thread it drops the new entry right away).
+
+    Each written batch is also added to the daily usage rollup
+    (``usage_daily``, per day/type/plan) unless ``USAGE_ROLLUP=false``.
+    """
+
+    def __init__(self, db_service, batch_size: int = None, flush_interval: float = None,
+                 max_queue: int = None, drop_policy: str = None):
         self.db = db_service
+        self.batch_size = batch_size or int(os.getenv("LOG_BATCH_SIZE", 50))
+        self.flush_interval = flush_interval or float(os.getenv("LOG_FLUSH_INTERVAL", 2.0))
+        self.max_queue = max_queue or int(os.getenv("LOG_QUEUE_SIZE", 10000))
+        self.drop_policy = (drop_policy or os.getenv("LOG_DROP_POLICY", "oldest")).lower()
+        self.block_timeout = float(os.getenv("LOG_BLOCK_TIMEOUT", 0.05))
+        self.rollup = os.getenv("USAGE_ROLLUP", "true").lower() in ("1", "true", "yes")
 
-    def log(self, telegram_id: int, tipo: str, prompt: str, resultado: str = None):
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.enqueued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def log(self, telegram_id: int, tipo: str, prompt: str, resultado: str = None, plano: str = None):
         entry = {
             "telegram_id": telegram_id,
             "tipo": tipo,
             "prompt": prompt,
             "resultado": resultado,
             "data": datetime.utcnow().isoformat(),
+            # only for the rollup; logs has no plan column
+            "plano": plano,
         }
-        self.db.insert_log(entry)
+        self._enqueue(entry)
+
+    def _enqueue(self, entry: dict):
+        with self._cond:
+            closed = self._closed
+        if closed:
+            # after shutdown there is no flusher left; write directly
+            self._write([entry])
+            return
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                # never stall the event loop: there "block" drops like "newest"
+                if self.drop_policy == "block" and not _in_event_loop():
+                    self._cond.wait_for(lambda: len(self._queue) < self.max_queue, self.block_timeout)
+                if len(self._queue) >= self.max_queue:
+                    self.dropped += 1
+                    if self.drop_policy != "oldest":
+                        return
+                    self._queue.popleft()
+            self._queue.append(entry)
+            self.enqueued += 1
+            self._ensure_thread()
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _take_batch(self) -> list:
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        if batch:
+            # wake producers blocked on a full queue
+            self._cond.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+                done = self._closed and not self._queue
+            if batch:
+                self._write(batch)
+            if done:
+                return
+
+    def _write(self, batch: list):
+        rows = [{k: v for k, v in entry.items() if k != "plano"} for entry in batch]
+        try:
+            with LOG_FLUSH_SECONDS.time():
+                self.db.insert_logs(rows)
+        except Exception as e:
+            ERRORS.inc(where="logs")
+            print(f"[LoggerService] flush error ({len(batch)} entries lost): {e}")
+            return
+        with self._cond:
+            self.flushed += len(batch)
+            self.batches += 1
+        if self.rollup:
+            try:
+                self.db.add_usage(usage_rows(batch))
+            except Exception as e:
+                ERRORS.inc(where="logs")
+                print(f"[LoggerService] usage rollup error: {e}")
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "queue_limit": self.max_queue,
+                "enqueued": self.enqueued,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,149 @@
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from app.utils.constants import DEFAULT_PLANS
+
+
+USER_COLUMNS = ("id", "telegram_id", "nome", "plano", "limite_diario", "geracoes_hoje", "ultima_geracao")
+LOG_COLUMNS = ("id", "telegram_id", "tipo", "prompt", "resultado", "data")
+
+
+class MemoryBackend:
+    """In-process stand-in for the ``users``/``logs``/``planos`` tables.
+
+    Mirrors what the Supabase path returns (row dicts, lists for updates,
+    column defaults, unique ``telegram_id``) with O(1) lookups by
+    ``telegram_id``. Logs are kept in a ring buffer of ``MEM_LOG_LIMIT`` rows.
+    All methods are thread safe and return copies.
+    """
+
+    def __init__(self, max_logs: Optional[int] = None, planos: Optional[List[dict]] = None):
+        self._lock = threading.RLock()
+        self._users = {}
+        self._by_telegram = {}
+        self._next_user_id = 1
+        self._logs = deque(maxlen=max_logs or int(os.getenv("MEM_LOG_LIMIT", 10000)))
+        self._next_log_id = 1
+        self._planos = [dict(p) for p in (planos or DEFAULT_PLANS)]
+        # (dia, tipo, plano) -> generations, like the usage_daily table
+        self._usage = {}
+
+    # Users
+    def get_user(self, telegram_id: int) -> Optional[dict]:
+        with self._lock:
+            uid = self._by_telegram.get(telegram_id)
+            return dict(self._users[uid]) if uid is not None else None
+
+    def insert_user(self, user: dict) -> dict:
+        unknown = set(user) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"column(s) {sorted(unknown)} of relation \"users\" do not exist")
+        row = {c: None for c in USER_COLUMNS}
+        row["geracoes_hoje"] = 0
+        row.update(user)
+        if row["telegram_id"] is None:
+            raise ValueError("null value in column \"telegram_id\" violates not-null constraint")
+        with self._lock:
+            if row["telegram_id"] in self._by_telegram:
+                raise ValueError("duplicate key value violates unique constraint \"users_telegram_id_key\"")
+            row["id"] = self._next_user_id
+            self._next_user_id += 1
+            self._users[row["id"]] = row
+            self._by_telegram[row["telegram_id"]] = row["id"]
+            return dict(row)
+
+    def update_user(self, telegram_id: int, changes: dict) -> List[dict]:
+        unknown = set(changes) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"column(s) {sorted(unknown)} of relation \"users\" do not exist")
+        with self._lock:
+            uid = self._by_telegram.get(telegram_id)
+            if uid is None:
+                return []
+            row = self._users[uid]
+            new_tg = changes.get("telegram_id", telegram_id)
+            if new_tg != telegram_id:
+                if new_tg in self._by_telegram:
+                    raise ValueError("duplicate key value violates unique constraint \"users_telegram_id_key\"")
+                del self._by_telegram[telegram_id]
+                self._by_telegram[new_tg] = uid
+            row.update(changes)
+            return [dict(row)]
+
+    def count_users(self) -> int:
+        with self._lock:
+            return len(self._users)
+
+    # Quota
+    def reserve_generation(self, telegram_id: int, today: str) -> dict:
+        with self._lock:
+            uid = self._by_telegram.get(telegram_id)
+            if uid is None:
+                return {"status": "not_found", "geracoes_hoje": None, "limite_diario": None, "plano": None}
+            u = self._users[uid]
+            used = (u.get("geracoes_hoje") or 0) if u.get("ultima_geracao") == today else 0
+            result = {"limite_diario": u.get("limite_diario"), "plano": u.get("plano")}
+            if used >= (u.get("limite_diario") or 0):
+                result.update(status="limit", geracoes_hoje=u.get("geracoes_hoje"))
+                return result
+            u["geracoes_hoje"] = used + 1
+            u["ultima_geracao"] = today
+            result.update(status="ok", geracoes_hoje=used + 1)
+            return result
+
+    def release_generation(self, telegram_id: int, today: str) -> None:
+        with self._lock:
+            uid = self._by_telegram.get(telegram_id)
+            if uid is None:
+                return
+            u = self._users[uid]
+            if u.get("ultima_geracao") == today and (u.get("geracoes_hoje") or 0) > 0:
+                u["geracoes_hoje"] -= 1
+
+    # Logs
+    def insert_logs(self, logs: List[dict]) -> List[dict]:
+        rows = []
+        with self._lock:
+            for log in logs:
+                row = {c: None for c in LOG_COLUMNS}
+                row["data"] = datetime.utcnow().isoformat()
+                row.update(log)
+                row["id"] = self._next_log_id
+                self._next_log_id += 1
+                self._logs.append(row)
+                rows.append(dict(row))
+        return rows
+
+    def list_logs(self, telegram_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+        """Most recent logs first, optionally for one user."""
+        out = []
+        with self._lock:
+            for row in reversed(self._logs):
+                if telegram_id is None or row["telegram_id"] == telegram_id:
+                    out.append(dict(row))
+                    if len(out) >= limit:
+                        break
+        return out
+
+    # Usage rollup
+    def add_usage(self, rows: List[dict]) -> None:
+        with self._lock:
+            for r in rows:
+                key = (r["dia"], r.get("tipo") or "", r.get("plano") or "")
+                self._usage[key] = self._usage.get(key, 0) + r["total"]
+
+    def usage_between(self, day_from: str, day_to: str) -> List[dict]:
+        with self._lock:
+            return [
+                {"dia": dia, "tipo": tipo, "plano": plano, "total": total}
+                for (dia, tipo, plano), total in sorted(self._usage.items())
+                if day_from <= dia <= day_to
+            ]
+
+    # Planos
+    def list_planos(self) -> List[dict]:
+        with self._lock:
+            return [dict(p) for p in self._planos]
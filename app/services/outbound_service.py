@@ -0,0 +1,213 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.utils.metrics import REGISTRY
+
+# Send priorities: lower goes first
+HIGH = 0     # final results (answers, photos)
+NORMAL = 10  # everything else, "Gerando..." placeholders included
+LOW = 20     # progress edits (queue position, streamed text)
+
+_PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+_priority = contextvars.ContextVar("send_priority", default=NORMAL)
+
+SEND_QUEUE_SECONDS = REGISTRY.histogram(
+    "telegram_send_queue_seconds", "Time an outgoing API call waited for rate-limit tokens", ("priority",))
+RETRY_AFTER = REGISTRY.counter(
+    "telegram_retry_after_total", "429 responses (flood wait) returned by Telegram")
+
+
+@contextmanager
+def send_priority(level: int):
+    """Run the Telegram calls made inside the block with ``level`` priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 when one is)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        return self.tokens >= self.capacity
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Request middleware that paces every call the Bot makes to a chat.
+
+    Calls wait in a priority queue until the global bucket
+    (``TG_GLOBAL_RATE`` per second) and the chat's bucket (``TG_CHAT_RATE``
+    per second for private chats, ``TG_GROUP_RATE`` per minute for groups)
+    have a token, so bursts are smoothed before Telegram answers 429. When it
+    still does, sending pauses for ``retry_after`` and the call is retried.
+    Calls without a chat (getUpdates, setWebhook, ...) pass straight through.
+    """
+
+    def __init__(self, global_rate: Optional[float] = None, chat_rate: Optional[float] = None,
+                 group_per_minute: Optional[float] = None, max_retries: Optional[int] = None):
+        self.global_rate = global_rate or float(os.getenv("TG_GLOBAL_RATE", 30))
+        self.chat_rate = chat_rate or float(os.getenv("TG_CHAT_RATE", 1))
+        self.chat_burst = float(os.getenv("TG_CHAT_BURST", 3))
+        self.group_per_minute = group_per_minute or float(os.getenv("TG_GROUP_RATE", 20))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("TG_SEND_RETRIES", 3))
+        self.max_buckets = int(os.getenv("TG_CHAT_BUCKETS_MAX", 10000))
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._loop = None
+        self._wakeup = None
+        self._pump_task = None
+        self.sent = 0
+        self.retried = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_buckets:
+                # forget idle chats; a full bucket carries no state
+                for cid in [c for c, b in self._chats.items() if b.full]:
+                    del self._chats[cid]
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_per_minute / 60.0, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _ensure_pump(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # first use, or a new event loop (tests, restarts)
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._heap = []
+            self._pump_task = None
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = loop.create_task(self._pump())
+
+    async def _wait_turn(self, chat_id, priority: int):
+        self._ensure_pump()
+        fut = self._loop.create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), chat_id, fut))
+        self._wakeup.set()
+        started = time.monotonic()
+        await fut
+        SEND_QUEUE_SECONDS.observe(time.monotonic() - started, priority=_PRIORITY_NAMES.get(priority, str(priority)))
+
+    async def _pump(self):
+        while True:
+            delay = self._grant()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _grant(self) -> Optional[float]:
+        """Release every queued call that may go now, best priority first.
+        Returns how long to sleep (None: until something is queued)."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        wait = None
+        keep = []
+        ordered = sorted(self._heap)
+        for i, item in enumerate(ordered):
+            _, _, chat_id, fut = item
+            if fut.done():
+                continue  # caller went away
+            delay = self._global.delay(now)
+            if delay > 0:
+                keep.extend(ordered[i:])
+                wait = delay if wait is None else min(wait, delay)
+                break
+            bucket = self._chat_bucket(chat_id)
+            delay = bucket.delay(now)
+            if delay > 0:
+                # this chat must wait; later calls for other chats may go
+                keep.append(item)
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            self._global.take()
+            bucket.take()
+            fut.set_result(None)
+        self._heap = [item for item in keep if not item[3].done()]
+        heapq.heapify(self._heap)
+        return wait
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        priority = _priority.get()
+        attempt = 0
+        while True:
+            await self._wait_turn(chat_id, priority)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                RETRY_AFTER.inc()
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retried += 1
+                continue
+            self.sent += 1
+            return response
+
+    async def close(self):
+        """Stop the pump task; calls still waiting for a turn are cancelled."""
+        task, self._pump_task = self._pump_task, None
+        for _, _, _, fut in self._heap:
+            fut.cancel()
+        self._heap = []
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._heap),
+            "sent": self.sent,
+            "retried": self.retried,
+            "paused_for": max(0.0, round(self._paused_until - time.monotonic(), 3)),
+            "chats_tracked": len(self._chats),
+            "global_rate": self.global_rate,
+        }
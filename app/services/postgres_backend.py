@@ -0,0 +1,232 @@
+import os
+import re
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import List, Optional
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import connection as _PgConnection
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from app.services.memory_backend import LOG_COLUMNS, USER_COLUMNS
+
+# Hot queries: (parameter types, statement). Prepared on first use on each
+# connection and run with EXECUTE; each $n appears once, in order.
+PREPARED = {
+    "bot_get_user": (
+        ("bigint",),
+        "select id, telegram_id, nome, plano, limite_diario, geracoes_hoje, ultima_geracao"
+        " from users where telegram_id = $1",
+    ),
+    "bot_reserve": (
+        ("bigint", "text"),
+        "select status, usados, limite, plano_usuario from reserve_generation($1, $2)",
+    ),
+    "bot_release": (("bigint", "text"), "select release_generation($1, $2)"),
+    # one round trip for a whole batch of log rows
+    "bot_insert_logs": (
+        ("bigint[]", "text[]", "text[]", "text[]", "timestamptz[]"),
+        "insert into logs (telegram_id, tipo, prompt, resultado, data)"
+        " select t, ti, p, r, coalesce(d, now()) from unnest($1, $2, $3, $4, $5) as x(t, ti, p, r, d)"
+        " returning id, telegram_id, tipo, prompt, resultado, data",
+    ),
+    "bot_list_planos": ((), "select id, nome, limite, preco from planos order by id"),
+    "bot_add_usage": (
+        ("date[]", "text[]", "text[]", "bigint[]"),
+        "insert into usage_daily (dia, tipo, plano, total)"
+        " select d, t, p, sum(n) from unnest($1, $2, $3, $4) as x(d, t, p, n) group by 1, 2, 3"
+        " on conflict (dia, tipo, plano) do update set total = usage_daily.total + excluded.total",
+    ),
+    "bot_usage_between": (
+        ("date", "date"),
+        "select dia, tipo, plano, total from usage_daily where dia between $1 and $2 order by dia, tipo, plano",
+    ),
+}
+
+
+class _Connection(_PgConnection):
+    """psycopg2 connection that remembers which PREPARED statements it has."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def _plain(row) -> dict:
+    # match what the REST API returns: numbers as floats, times as ISO strings
+    out = {}
+    for key, value in dict(row).items():
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+class PostgresBackend:
+    """Talk to Postgres directly through a thread-safe connection pool.
+
+    Same interface as MemoryBackend. The services run on the executor's
+    threads, so a ``ThreadedConnectionPool`` of ``PG_POOL_MIN``..``PG_POOL_MAX``
+    connections is shared by them; the hot queries are server-side prepared
+    statements. Requires the schema and functions from sql/create_tables.sql.
+    """
+
+    def __init__(self, dsn: Optional[str] = None, minconn: Optional[int] = None, maxconn: Optional[int] = None,
+                 **connect_kwargs):
+        self.dsn = dsn or os.getenv("DATABASE_URL")
+        if not self.dsn:
+            raise ValueError("DATABASE_URL not set")
+        self.minconn = minconn or int(os.getenv("PG_POOL_MIN", 1))
+        self.maxconn = maxconn or int(os.getenv("PG_POOL_MAX", 16))
+        # transaction-mode poolers (PgBouncer, Supabase port 6543) do not keep
+        # prepared statements between transactions; PG_PREPARE=false for those
+        self.use_prepared = os.getenv("PG_PREPARE", "true").lower() in ("1", "true", "yes")
+        self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn,
+                                            connection_factory=_Connection, **connect_kwargs)
+        # getconn raises when all connections are out; wait for one instead
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+
+    @contextmanager
+    def _conn(self):
+        with self._slots:
+            conn = self._pool.getconn()
+            broken = False
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                broken = conn.closed != 0
+                if not broken:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
+                raise
+            finally:
+                self._pool.putconn(conn, close=broken)
+
+    @staticmethod
+    def _prepare(conn: _Connection, name: str):
+        types, query = PREPARED[name]
+        args = f"({', '.join(types)})" if types else ""
+        with conn.cursor() as cur:
+            cur.execute(f"prepare {name} {args} as {query}")
+        # one statement at a time: a table that is not migrated yet only
+        # breaks the queries that use it
+        conn.commit()
+        conn.prepared.add(name)
+
+    def _execute(self, name: str, params: tuple = ()) -> List[dict]:
+        types, query = PREPARED[name]
+        # explicit casts: psycopg2 sends literals, arrays of NULLs included
+        casts = [f"%s::{t}" for t in types]
+        if self.use_prepared:
+            statement = f"execute {name}({', '.join(casts)})" if casts else f"execute {name}"
+        else:
+            statement = re.sub(r"\$(\d+)", lambda m: casts[int(m.group(1)) - 1], query)
+        with self._conn() as conn:
+            if self.use_prepared and name not in conn.prepared:
+                self._prepare(conn, name)
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(statement, params)
+                return [_plain(r) for r in cur.fetchall()] if cur.description else []
+
+    # Users
+    def get_user(self, telegram_id: int) -> Optional[dict]:
+        rows = self._execute("bot_get_user", (telegram_id,))
+        return rows[0] if rows else None
+
+    def insert_user(self, user: dict) -> dict:
+        unknown = set(user) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"column(s) {sorted(unknown)} of relation \"users\" do not exist")
+        cols = list(user)
+        query = sql.SQL("insert into users ({}) values ({}) returning *").format(
+            sql.SQL(", ").join(map(sql.Identifier, cols)),
+            sql.SQL(", ").join(sql.Placeholder() * len(cols)),
+        )
+        with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, [user[c] for c in cols])
+            return _plain(cur.fetchone())
+
+    def update_user(self, telegram_id: int, changes: dict) -> List[dict]:
+        unknown = set(changes) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"column(s) {sorted(unknown)} of relation \"users\" do not exist")
+        if not changes:
+            row = self.get_user(telegram_id)
+            return [row] if row else []
+        query = sql.SQL("update users set {} where telegram_id = %s returning *").format(
+            sql.SQL(", ").join(sql.SQL("{} = %s").format(sql.Identifier(c)) for c in changes),
+        )
+        with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, [*changes.values(), telegram_id])
+            return [_plain(r) for r in cur.fetchall()]
+
+    def count_users(self) -> int:
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute("select count(*) from users")
+            return cur.fetchone()[0]
+
+    # Quota
+    def reserve_generation(self, telegram_id: int, today: str) -> dict:
+        rows = self._execute("bot_reserve", (telegram_id, today))
+        row = rows[0] if rows else {}
+        return {
+            "status": row.get("status", "error"),
+            "geracoes_hoje": row.get("usados"),
+            "limite_diario": row.get("limite"),
+            "plano": row.get("plano_usuario"),
+        }
+
+    def release_generation(self, telegram_id: int, today: str) -> None:
+        self._execute("bot_release", (telegram_id, today))
+
+    # Logs
+    def insert_logs(self, logs: List[dict]) -> List[dict]:
+        if not logs:
+            return []
+        for log in logs:
+            unknown = set(log) - set(LOG_COLUMNS)
+            if unknown:
+                raise ValueError(f"column(s) {sorted(unknown)} of relation \"logs\" do not exist")
+        columns = ("telegram_id", "tipo", "prompt", "resultado", "data")
+        arrays = tuple([log.get(c) for log in logs] for c in columns)
+        return self._execute("bot_insert_logs", arrays)
+
+    def list_logs(self, telegram_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+        """Most recent logs first, optionally for one user."""
+        query = "select * from logs"
+        params = []
+        if telegram_id is not None:
+            query += " where telegram_id = %s"
+            params.append(telegram_id)
+        # served by logs_telegram_id_data_idx (sql/migrations/0002)
+        query += " order by data desc, id desc limit %s"
+        params.append(limit)
+        with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, params)
+            return [_plain(r) for r in cur.fetchall()]
+
+    # Usage rollup
+    def add_usage(self, rows: List[dict]) -> None:
+        if rows:
+            self._execute("bot_add_usage", (
+                [r["dia"] for r in rows], [r.get("tipo") or "" for r in rows],
+                [r.get("plano") or "" for r in rows], [r["total"] for r in rows],
+            ))
+
+    def usage_between(self, day_from: str, day_to: str) -> List[dict]:
+        return self._execute("bot_usage_between", (day_from, day_to))
+
+    # Planos
+    def list_planos(self) -> List[dict]:
+        return self._execute("bot_list_planos")
+
+    def close(self):
+        self._pool.closeall()
@@ -0,0 +1,109 @@
+import os
+import time
+import struct
+import threading
+from typing import Optional
+
+from app.services.local_storage import LocalStorage
+from app.utils.cache import TTLCache
+from app.utils.helpers import prompt_key
+
+# disk entries start with their write time, so the TTL counts from the write
+_STAMP = struct.Struct("<d")
+
+
+class ResultCache:
+    """Cache of generation results keyed by normalized prompt + model.
+
+    Each kind ('text', 'image') has its own LRU tier in memory with its own
+    size and TTL (``GEN_CACHE_<KIND>_SIZE`` / ``GEN_CACHE_<KIND>_TTL``).
+    Results can also be kept on disk under ``GEN_CACHE_DIR`` so they survive
+    restarts and memory evictions, and are shared by every process using
+    the same directory (the bot workers do). That tier is a LocalStorage
+    capped at ``GEN_CACHE_DISK_MAX_BYTES`` per process (least recently used
+    first) whose files are also swept once unused for longer than the TTL.
+    """
+
+    KINDS = ("text", "image")
+
+    def __init__(self, disk_dir: Optional[str] = None):
+        self._tiers = {}
+        self.ttls = {}
+        for kind in self.KINDS:
+            upper = kind.upper()
+            # images are costlier to regenerate and the same prompt keeps its picture
+            default_ttl = 3600 if kind == "text" else 86400
+            self.ttls[kind] = float(os.getenv(f"GEN_CACHE_{upper}_TTL", default_ttl))
+            default_size = 1024 if kind == "text" else 64
+            self._tiers[kind] = TTLCache(
+                maxsize=int(os.getenv(f"GEN_CACHE_{upper}_SIZE", default_size)),
+                ttl=self.ttls[kind],
+            )
+        self.disk_dir = disk_dir if disk_dir is not None else os.getenv("GEN_CACHE_DIR") or None
+        self.disk = LocalStorage(
+            root=self.disk_dir,
+            max_bytes=int(os.getenv("GEN_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024)),
+            max_age=max(self.ttls.values()),
+        ) if self.disk_dir else None
+        self._lock = threading.Lock()
+        self.hits = {k: 0 for k in self.KINDS}
+        self.misses = {k: 0 for k in self.KINDS}
+        self.disk_hits = 0
+
+    def _count(self, kind: str, hit: bool):
+        with self._lock:
+            (self.hits if hit else self.misses)[kind] += 1
+
+    def get(self, kind: str, prompt: str, model: str = ""):
+        key = prompt_key(kind, prompt, model)
+        value = self._tiers[kind].get(key)
+        if value is None and self.disk:
+            value = self._disk_get(key, self.ttls[kind])
+            if value is not None and kind == "text":
+                value = value.decode("utf-8")
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._tiers[kind].set(key, value)
+        self._count(kind, value is not None)
+        return value
+
+    def set(self, kind: str, prompt: str, value, model: str = ""):
+        if not value:
+            return
+        key = prompt_key(kind, prompt, model)
+        self._tiers[kind].set(key, value)
+        if self.disk:
+            self._disk_set(key, value.encode("utf-8") if kind == "text" else value)
+
+    def _disk_get(self, key: str, ttl: float) -> Optional[bytes]:
+        data = self.disk.get(key)
+        if data is None or len(data) < _STAMP.size:
+            return None
+        (written,) = _STAMP.unpack_from(data)
+        if time.time() - written > ttl:
+            self.disk.delete(key)
+            return None
+        return data[_STAMP.size:]
+
+    def _disk_set(self, key: str, data: bytes):
+        try:
+            self.disk.put(key, _STAMP.pack(time.time()) + data)
+        except OSError as e:
+            print(f"[ResultCache] disk write error: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for kind in self.KINDS:
+                total = self.hits[kind] + self.misses[kind]
+                out[kind] = {
+                    "hits": self.hits[kind],
+                    "misses": self.misses[kind],
+                    "hit_rate": (self.hits[kind] / total) if total else 0.0,
+                    "size": len(self._tiers[kind]),
+                }
+            out["disk_hits"] = self.disk_hits
+        if self.disk is not None:
+            out["disk"] = self.disk.stats()
+        return out
@@ -0,0 +1,152 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Optional
+
+from app.utils.constants import PLAN_PRIORITIES, DEFAULT_PLAN_PRIORITY
+
+
+class SchedulerBusyError(RuntimeError):
+    """Raised when a user already has too many generations in flight."""
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "telegram_id", "plano", "func", "future", "enqueued_at")
+
+    def __init__(self, priority, seq, telegram_id, plano, func, future):
+        self.priority = priority
+        self.seq = seq
+        self.telegram_id = telegram_id
+        self.plano = plano
+        self.func = func
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class GenerationScheduler:
+    """Run generation jobs on a bounded pool of worker tasks.
+
+    Jobs are ordered by the priority of the user's plan (``PLAN_PRIORITIES``)
+    and then by arrival, so a flood of Free requests cannot starve Pro users.
+    Each user may have at most ``SCHEDULER_MAX_PER_USER`` jobs queued or
+    running at once.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_per_user: Optional[int] = None):
+        self.workers = workers or int(os.getenv("SCHEDULER_WORKERS", 8))
+        self.max_per_user = max_per_user or int(os.getenv("SCHEDULER_MAX_PER_USER", 2))
+        self._seq = itertools.count()
+        self._loop = None
+        self._reset()
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self._waits = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+
+    def _reset(self):
+        self._heap = []
+        self._cond = None
+        self._tasks = []
+        self._busy = 0
+        self._per_user = defaultdict(int)
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # first use, or a new event loop (tests, restarts): start over
+            self._loop = loop
+            self._reset()
+            self._cond = asyncio.Condition()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def priority_for(self, plano: Optional[str]) -> int:
+        return PLAN_PRIORITIES.get(plano, DEFAULT_PLAN_PRIORITY)
+
+    def can_submit(self, telegram_id: int) -> bool:
+        return self._per_user.get(telegram_id, 0) < self.max_per_user
+
+    def position(self, job: _Job) -> int:
+        """1-based position among the queued jobs."""
+        return 1 + sum(1 for other in self._heap if other < job)
+
+    async def submit(self, telegram_id: int, plano: Optional[str], func: Callable[[], Awaitable[Any]],
+                     on_queued: Optional[Callable[[int], Awaitable[None]]] = None) -> Any:
+        """Run ``func()`` when a worker is free and return its result.
+
+        ``on_queued(position)`` is awaited when the job has to wait for a worker.
+        """
+        self._ensure_workers()
+        if not self.can_submit(telegram_id):
+            self.rejected += 1
+            raise SchedulerBusyError(
+                f"Você já tem {self.max_per_user} gerações em andamento. Aguarde terminarem."
+            )
+        self._per_user[telegram_id] += 1
+        self.submitted += 1
+        job = _Job(self.priority_for(plano), next(self._seq), telegram_id, plano, func,
+                   self._loop.create_future())
+        try:
+            async with self._cond:
+                heapq.heappush(self._heap, job)
+                self._cond.notify()
+            if on_queued is not None and self._busy >= self.workers and not job.future.done():
+                try:
+                    await on_queued(self.position(job))
+                except Exception as e:
+                    print(f"[GenerationScheduler] queue feedback error: {e}")
+            return await job.future
+        finally:
+            self._per_user[telegram_id] -= 1
+            if self._per_user[telegram_id] <= 0:
+                self._per_user.pop(telegram_id, None)
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._heap)
+                job = heapq.heappop(self._heap)
+                self._busy += 1
+            self._record_wait(job)
+            try:
+                if not job.future.done():
+                    result = await job.func()
+                    if not job.future.done():
+                        job.future.set_result(result)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._busy -= 1
+                self.completed += 1
+
+    def _record_wait(self, job: _Job):
+        wait = time.monotonic() - job.enqueued_at
+        for key in ("all", job.plano or "?"):
+            w = self._waits[key]
+            w["count"] += 1
+            w["total"] += wait
+            w["max"] = max(w["max"], wait)
+
+    def stats(self) -> dict:
+        depth = defaultdict(int)
+        for job in self._heap:
+            depth[job.plano or "?"] += 1
+        return {
+            "workers": self.workers,
+            "busy": self._busy,
+            "queue_depth": len(self._heap),
+            "queue_depth_by_plan": dict(depth),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds": {
+                k: {"avg": w["total"] / w["count"], "max": w["max"], "count": w["count"]}
+                for k, w in self._waits.items()
+            },
+        }
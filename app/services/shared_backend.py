@@ -0,0 +1,51 @@
+from multiprocessing.managers import BaseManager
+from typing import Tuple
+
+from app.services.memory_backend import MemoryBackend
+
+_EXPOSED = (
+    "get_user", "insert_user", "update_user", "count_users",
+    "reserve_generation", "release_generation",
+    "insert_logs", "list_logs", "list_planos", "add_usage", "usage_between",
+)
+
+_backend = None
+
+
+def _get_backend() -> MemoryBackend:
+    # one backend per manager process, shared by every connected worker
+    global _backend
+    if _backend is None:
+        _backend = MemoryBackend()
+    return _backend
+
+
+class BackendManager(BaseManager):
+    """Serves one MemoryBackend to several processes.
+
+    Local stand-in for the Postgres schema when running multiple bot workers
+    without Supabase: quota reservations stay atomic across workers because
+    every call runs under the backend's lock in the manager process.
+    """
+
+
+BackendManager.register("backend", callable=_get_backend, exposed=_EXPOSED)
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def serve_backend(address: str = "127.0.0.1:0", authkey: bytes = b"", ctx=None) -> BackendManager:
+    """Start the manager process; ``manager.address`` is the bound address."""
+    manager = BackendManager(address=parse_address(address), authkey=authkey, ctx=ctx)
+    manager.start()
+    return manager
+
+
+def connect_backend(address: str, authkey: bytes = b""):
+    """Return a proxy with the MemoryBackend methods, usable from any thread."""
+    manager = BackendManager(address=parse_address(address), authkey=authkey)
+    manager.connect()
+    return manager.backend()
@@ -0,0 +1,241 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import List, Optional
+
+from app.services.memory_backend import LOG_COLUMNS, USER_COLUMNS
+from app.utils.constants import DEFAULT_PLANS
+
+# Same tables as sql/create_tables.sql, in SQLite types
+SCHEMA = """
+create table if not exists users (
+  id integer primary key autoincrement,
+  telegram_id integer unique not null,
+  nome text,
+  plano text,
+  limite_diario integer,
+  geracoes_hoje integer default 0,
+  ultima_geracao text
+);
+
+create table if not exists logs (
+  id integer primary key autoincrement,
+  telegram_id integer,
+  tipo text,
+  prompt text,
+  resultado text,
+  data text default (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+create index if not exists logs_telegram_id_idx on logs (telegram_id, id);
+create index if not exists logs_data_idx on logs (data);
+
+create table if not exists planos (
+  id integer primary key autoincrement,
+  nome text,
+  limite integer,
+  preco real
+);
+create unique index if not exists planos_nome_key on planos (nome);
+
+create table if not exists usage_daily (
+  dia text not null,
+  tipo text not null,
+  plano text not null default '',
+  total integer not null default 0,
+  primary key (dia, tipo, plano)
+) without rowid;
+"""
+
+# Fixed statement texts, so sqlite3's per-connection statement cache keeps
+# them compiled
+GET_USER = "select * from users where telegram_id = ?"
+INSERT_LOG = (
+    "insert into logs (telegram_id, tipo, prompt, resultado, data)"
+    " values (?, ?, ?, ?, coalesce(?, strftime('%Y-%m-%dT%H:%M:%f', 'now'))) returning *"
+)
+RESERVE = (
+    "update users set"
+    " geracoes_hoje = case when ultima_geracao is not ? then 1 else coalesce(geracoes_hoje, 0) + 1 end,"
+    " ultima_geracao = ?"
+    " where telegram_id = ?"
+    " and (case when ultima_geracao is not ? then 0 else coalesce(geracoes_hoje, 0) end) < limite_diario"
+    " returning geracoes_hoje, limite_diario, plano"
+)
+ADD_USAGE = (
+    "insert into usage_daily (dia, tipo, plano, total) values (?, ?, ?, ?)"
+    " on conflict (dia, tipo, plano) do update set total = total + excluded.total"
+)
+ROLLUP_USAGE = (
+    "insert into usage_daily (dia, tipo, plano, total)"
+    " select substr(l.data, 1, 10), coalesce(l.tipo, ''), coalesce(u.plano, ''), count(*)"
+    " from logs l left join users u on u.telegram_id = l.telegram_id"
+    " where l.data >= ? and l.data < ?"
+    # failed generations (tipo "text_error", ...) are not usage
+    " and coalesce(l.tipo, '') not like '%!_error' escape '!'"
+    " group by 1, 2, 3"
+)
+RELEASE = (
+    "update users set geracoes_hoje = geracoes_hoje - 1"
+    " where telegram_id = ? and ultima_geracao = ? and geracoes_hoje > 0"
+)
+
+
+class SqliteBackend:
+    """Persistent single-node backend on an SQLite file in WAL mode.
+
+    Same interface as MemoryBackend, but quota counters and logs survive
+    restarts and stay on disk. Each thread gets its own connection; WAL lets
+    readers run while one writer commits, and quota reservations take the
+    write lock up front (``BEGIN IMMEDIATE``), so they are atomic across
+    threads and processes sharing the file.
+    """
+
+    def __init__(self, path: Optional[str] = None, timeout: Optional[float] = None):
+        self.path = path or os.getenv("SQLITE_PATH", "bot.sqlite3")
+        self.timeout = timeout if timeout is not None else float(os.getenv("SQLITE_BUSY_TIMEOUT", 5))
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit; transactions are opened explicitly in _write
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            conn.execute("pragma journal_mode = wal")
+            # durable at checkpoints; a crash can only lose the last commits
+            conn.execute("pragma synchronous = normal")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._connect()
+        conn.execute("begin immediate")
+        try:
+            yield conn
+            conn.execute("commit")
+        except BaseException:
+            conn.execute("rollback")
+            raise
+
+    def _init_schema(self):
+        self._connect().executescript(SCHEMA)
+        with self._write() as conn:
+            if conn.execute("select count(*) from planos").fetchone()[0] == 0:
+                conn.executemany(
+                    "insert into planos (id, nome, limite, preco) values (:id, :nome, :limite, :preco)",
+                    DEFAULT_PLANS,
+                )
+
+    # Users
+    def get_user(self, telegram_id: int) -> Optional[dict]:
+        row = self._connect().execute(GET_USER, (telegram_id,)).fetchone()
+        return dict(row) if row else None
+
+    def insert_user(self, user: dict) -> dict:
+        unknown = set(user) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"column(s) {sorted(unknown)} of relation \"users\" do not exist")
+        cols = list(user)
+        query = f"insert into users ({', '.join(cols)}) values ({', '.join('?' * len(cols))}) returning *"
+        try:
+            with self._write() as conn:
+                return dict(conn.execute(query, [user[c] for c in cols]).fetchone())
+        except sqlite3.IntegrityError as e:
+            raise ValueError(str(e)) from None
+
+    def update_user(self, telegram_id: int, changes: dict) -> List[dict]:
+        unknown = set(changes) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"column(s) {sorted(unknown)} of relation \"users\" do not exist")
+        if not changes:
+            row = self.get_user(telegram_id)
+            return [row] if row else []
+        query = f"update users set {', '.join(f'{c} = ?' for c in changes)} where telegram_id = ? returning *"
+        try:
+            with self._write() as conn:
+                return [dict(r) for r in conn.execute(query, [*changes.values(), telegram_id]).fetchall()]
+        except sqlite3.IntegrityError as e:
+            raise ValueError(str(e)) from None
+
+    def count_users(self) -> int:
+        return self._connect().execute("select count(*) from users").fetchone()[0]
+
+    # Quota
+    def reserve_generation(self, telegram_id: int, today: str) -> dict:
+        with self._write() as conn:
+            row = conn.execute(RESERVE, (today, today, telegram_id, today)).fetchone()
+            if row:
+                return {"status": "ok", "geracoes_hoje": row["geracoes_hoje"],
+                        "limite_diario": row["limite_diario"], "plano": row["plano"]}
+            user = conn.execute(GET_USER, (telegram_id,)).fetchone()
+        if user is None:
+            return {"status": "not_found", "geracoes_hoje": None, "limite_diario": None, "plano": None}
+        return {"status": "limit", "geracoes_hoje": user["geracoes_hoje"],
+                "limite_diario": user["limite_diario"], "plano": user["plano"]}
+
+    def release_generation(self, telegram_id: int, today: str) -> None:
+        with self._write() as conn:
+            conn.execute(RELEASE, (telegram_id, today))
+
+    # Logs
+    def insert_logs(self, logs: List[dict]) -> List[dict]:
+        for log in logs:
+            unknown = set(log) - set(LOG_COLUMNS)
+            if unknown:
+                raise ValueError(f"column(s) {sorted(unknown)} of relation \"logs\" do not exist")
+        # the whole batch in one transaction: one fsync instead of one per row
+        with self._write() as conn:
+            return [
+                dict(conn.execute(INSERT_LOG, (log.get("telegram_id"), log.get("tipo"), log.get("prompt"),
+                                               log.get("resultado"), log.get("data"))).fetchone())
+                for log in logs
+            ]
+
+    def list_logs(self, telegram_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+        """Most recent logs first, optionally for one user."""
+        conn = self._connect()
+        if telegram_id is None:
+            rows = conn.execute("select * from logs order by id desc limit ?", (limit,))
+        else:
+            rows = conn.execute("select * from logs where telegram_id = ? order by id desc limit ?",
+                                (telegram_id, limit))
+        return [dict(r) for r in rows.fetchall()]
+
+    # Usage rollup
+    def add_usage(self, rows: List[dict]) -> None:
+        with self._write() as conn:
+            conn.executemany(ADD_USAGE, [(r["dia"], r.get("tipo") or "", r.get("plano") or "", r["total"])
+                                         for r in rows])
+
+    def usage_between(self, day_from: str, day_to: str) -> List[dict]:
+        rows = self._connect().execute(
+            "select * from usage_daily where dia between ? and ? order by dia, tipo, plano", (day_from, day_to))
+        return [dict(r) for r in rows.fetchall()]
+
+    def rollup_usage(self, day_from: str, day_to: str) -> int:
+        """Recompute the rollup of ``day_from``..``day_to`` from the logs."""
+        # log times are ISO strings, so the day after day_to bounds the range
+        day_after = (date.fromisoformat(day_to) + timedelta(days=1)).isoformat()
+        with self._write() as conn:
+            conn.execute("delete from usage_daily where dia between ? and ?", (day_from, day_to))
+            return conn.execute(ROLLUP_USAGE, (day_from, day_after)).rowcount
+
+    # Planos
+    def list_planos(self) -> List[dict]:
+        return [dict(r) for r in self._connect().execute("select * from planos order by id").fetchall()]
+
+    def close(self):
+        with self._conns_lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
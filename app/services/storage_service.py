@@ -1,75 +1,164 @@
 import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
 from typing import Optional
-import io
 
-try:
-    from supabase import create_client
-except Exception:
-    create_client = None
+import httpx
+
+from app.services.local_storage import LocalStorage
+from app.utils.metrics import ERRORS, STORAGE_SECONDS
+from app.utils.singleflight import SingleFlight
 
 
 class StorageService:
-    def __init__(self, db_service):
+    def __init__(self, db_service, transport: Optional[httpx.AsyncBaseTransport] = None):
         # db_service is expected to be DBService instance
         self.db = db_service
+        self.url = (os.getenv('SUPABASE_URL') or '').rstrip('/')
+        self.key = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_KEY')
+        self.concurrency = int(os.getenv('STORAGE_UPLOAD_CONCURRENCY', 8))
+        self.timeout = float(os.getenv('STORAGE_UPLOAD_TIMEOUT', 30))
+        self._transport = transport
+        self._http = None
+        self._sem = None
+        self._loop = None
+        self._inflight = SingleFlight()
+        # Bounded, sharded fallback when Supabase Storage is unavailable
+        self.local = LocalStorage()
+
+        # Local index of already-uploaded objects: "bucket/path" -> public URL
+        self.index_path = os.getenv('STORAGE_INDEX_PATH', '.storage_index.jsonl')
+        self._index = {}
+        self._index_lock = threading.Lock()
+        self._load_index()
+        self.uploads = 0
+        self.dedup_hits = 0
+        self.bytes_uploaded = 0
+        self.bytes_skipped = 0
+
+    # Content-addressed uploads
+    @staticmethod
+    def content_path(data: bytes, prefix: str = 'images', ext: str = 'png') -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{prefix}/{digest[:2]}/{digest}.{ext}"
 
-    def _ensure_client(self):
-        # ensure db.client exists, otherwise try to create one from env
-        client = getattr(self.db, 'client', None)
-        if client:
-            return client
-        # attempt to create client if supabase.create_client available
+    def _load_index(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
         try:
-            from supabase import create_client as _create
-            url = os.getenv('SUPABASE_URL')
-            key = os.getenv('SUPABASE_KEY')
-            if url and key:
-                client = _create(url, key)
-                self.db.client = client
-                return client
-        except Exception:
-            pass
-        return None
-
-    def upload_bytes(self, bucket: str, path: str, data: bytes) -> Optional[str]:
-        """Upload bytes to Supabase Storage and return public URL if possible; otherwise save locally and return file path."""
-        # If Supabase client is available, try to upload
-        client = self._ensure_client()
-        if client:
-            try:
-                storage = client.storage
-                # Try uploading bytes directly using a file-like object
-                try:
-                    file_obj = io.BytesIO(data)
-                    # supabase-py upload may accept file-like objects
-                    res = storage.from_(bucket).upload(path, file_obj)
-                except Exception:
-                    # Fallback: write to temp file then upload
-                    os.makedirs('.temp_storage', exist_ok=True)
-                    tmp_path = os.path.join('.temp_storage', os.path.basename(path))
-                    with open(tmp_path, 'wb') as f:
-                        f.write(data)
-                    res = storage.from_(bucket).upload(path, tmp_path)
-
-                # Attempt to create public URL
-                try:
-                    url = storage.from_(bucket).get_public_url(path)
-                    return url
-                except Exception:
-                    # Some supabase clients return object with 'public_url' or direct link
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
                     try:
-                        if isinstance(res, dict):
-                            return res.get('publicURL') or res.get('public_url') or res.get('public')
-                    except Exception:
-                        return None
+                        entry = json.loads(line)
+                        self._index[entry['key']] = entry['url']
+                    except (ValueError, KeyError):
+                        continue
+        except OSError as e:
+            print(f"[StorageService] index load error: {e}")
+
+    def _remember(self, key: str, url: str):
+        with self._index_lock:
+            if self._index.get(key) == url:
+                return
+            self._index[key] = url
+            if self.index_path:
+                try:
+                    with open(self.index_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps({'key': key, 'url': url}) + '\n')
+                except OSError as e:
+                    print(f"[StorageService] index write error: {e}")
+
+    def _client_for_loop(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # pooled keep-alive client, one per event loop
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.concurrency)
+            self._http = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            )
+        return self._http
+
+    def public_url(self, bucket: str, path: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{bucket}/{path}"
+
+    async def upload_content(self, bucket: str, data: bytes, prefix: str = 'images', ext: str = 'png',
+                             content_type: str = 'image/png') -> Optional[str]:
+        """Upload ``data`` under a key derived from its hash and return its
+        public URL (or a local path when Supabase is not configured).
+
+        Content already uploaded is not sent again; concurrent uploads of the
+        same bytes share one request.
+        """
+        path = self.content_path(data, prefix, ext)
+        key = f"{bucket}/{path}"
+        known = self._index.get(key)
+        if known:
+            self.dedup_hits += 1
+            self.bytes_skipped += len(data)
+            return known
+        result, _ = await self._inflight.do(key, lambda: self._upload_once(bucket, path, data, content_type))
+        return result
+
+    async def _upload_once(self, bucket: str, path: str, data: bytes, content_type: str) -> Optional[str]:
+        key = f"{bucket}/{path}"
+        started = time.perf_counter()
+        if self.url and self.key:
+            client = self._client_for_loop()
+            headers = {
+                'Authorization': f"Bearer {self.key}",
+                'apikey': self.key,
+                'Content-Type': content_type,
+                # same key means same bytes: never overwrite, a conflict is a hit
+                'x-upsert': 'false',
+            }
+            try:
+                async with self._sem:
+                    resp = await client.post(f"{self.url}/storage/v1/object/{bucket}/{path}",
+                                             content=data, headers=headers)
+                if resp.status_code in (200, 201):
+                    self.uploads += 1
+                    self.bytes_uploaded += len(data)
+                    outcome = "uploaded"
+                elif resp.status_code == 409 or 'Duplicate' in resp.text:
+                    self.dedup_hits += 1
+                    self.bytes_skipped += len(data)
+                    outcome = "duplicate"
+                else:
+                    raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+                url = self.public_url(bucket, path)
+                self._remember(key, url)
+                STORAGE_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+                return url
             except Exception as e:
+                ERRORS.inc(where="storage")
                 print(f"[StorageService] upload error: {e}")
-                # fallback to local file
-                pass
-
-        # fallback: save locally under .temp_storage
-        os.makedirs('.temp_storage', exist_ok=True)
-        local_path = os.path.join('.temp_storage', path.replace('/', '_'))
-        with open(local_path, 'wb') as f:
-            f.write(data)
-        return local_path
+
+        # fallback: save locally under .temp_storage (content-addressed too)
+        path = await asyncio.get_running_loop().run_in_executor(None, self._save_local, path, data)
+        STORAGE_SECONDS.observe(time.perf_counter() - started, outcome="local")
+        return path
+
+    def _save_local(self, path: str, data: bytes) -> str:
+        return self.local.put(path, data)
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._loop = None
+
+    def stats(self) -> dict:
+        return {
+            "uploads": self.uploads,
+            "dedup_hits": self.dedup_hits,
+            "bytes_uploaded": self.bytes_uploaded,
+            "bytes_skipped": self.bytes_skipped,
+            "indexed_objects": len(self._index),
+            "local": self.local.stats(),
+        }
@@ -11,3 +11,7 @@ DEFAULT_PLANS = [
     {"id": 1, "nome": "Free", "limite": 5, "preco": 0},
     {"id": 2, "nome": "Pro", "limite": 50, "preco": 9.99},
 ]
+
+# Scheduler priority per plan (lower runs first); unknown plans use the default
+PLAN_PRIORITIES = {"Pro": 0, "Free": 10}
+DEFAULT_PLAN_PRIORITY = 10
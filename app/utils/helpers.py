@@ -1,3 +1,4 @@
+import hashlib
 from datetime import datetime, timedelta
 
 
@@ -9,3 +10,32 @@ def days_between_dates(a: str, b: str) -> int:
     da = datetime.fromisoformat(a).date()
     db = datetime.fromisoformat(b).date()
     return (db - da).days
+
+
+def normalize_prompt(prompt: str) -> str:
+    # collapse whitespace and case so trivially different prompts share a key
+    return " ".join((prompt or "").split()).lower()
+
+
+def prompt_key(kind: str, prompt: str, model: str = "") -> str:
+    raw = f"{kind}\0{model}\0{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """Split text into Telegram-sized parts, preferring line and word breaks."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    if text or not parts:
+        parts.append(text)
+    return parts
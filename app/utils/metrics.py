@@ -0,0 +1,224 @@
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Tuple
+
+# Seconds; covers cache hits (ms) up to slow generations (a minute)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels: ``c.inc(command="start")``."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_label_str(self.labelnames, key)} {_fmt(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return series[2] if series else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = 'le="%s"' % _fmt(bound)
+                yield f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {running}"
+            yield f"{self.name}_sum{_label_str(self.labelnames, key)} {_fmt(total)}"
+            yield f"{self.name}_count{_label_str(self.labelnames, key)} {count}"
+
+
+class Gauge:
+    """Value read from a callback at scrape time (queue depths, in-flight work)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, func: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def render(self):
+        try:
+            value = self.func()
+        except Exception:
+            return
+        if value is not None:
+            yield f"{self.name} {_fmt(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # re-registering (e.g. module reload) keeps the first instance
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, func: Callable[[], float]) -> Gauge:
+        with self._lock:
+            # callbacks are replaced so the latest service instance is read
+            gauge = self._metrics[name] = Gauge(name, help, func)
+        return gauge
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _with_label(sample: str, label: str) -> str:
+    end = min(i for i in (sample.find("{"), sample.find(" ")) if i >= 0)
+    if sample[end] == "{":
+        return f"{sample[:end + 1]}{label},{sample[end + 1:]}"
+    return f"{sample[:end]}{{{label}}}{sample[end:]}"
+
+
+def merge_expositions(texts: Dict[str, str], label: str = "worker") -> str:
+    """Join the ``render()`` output of several processes into one exposition,
+    each sample tagged with ``label="<key>"`` and grouped under a single
+    HELP/TYPE header per metric."""
+    families = {}
+    for key, text in texts.items():
+        tag = f'{label}="{_escape(key)}"'
+        current = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split(" ", 3)[2]
+                current = families.setdefault(name, {"HELP": None, "TYPE": None, "samples": []})
+                if current[line[2:6]] is None:
+                    current[line[2:6]] = line
+            elif line and not line.startswith("#") and current is not None:
+                current["samples"].append(_with_label(line, tag))
+    lines = []
+    for family in families.values():
+        lines.extend(h for h in (family["HELP"], family["TYPE"]) if h)
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds", "Time spent handling an update, by command", ("command",))
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Updates whose handler raised, by command", ("command",))
+DB_SECONDS = REGISTRY.histogram(
+    "db_operation_seconds", "Database call latency by table and operation", ("table", "op"))
+GEMINI_SECONDS = REGISTRY.histogram(
+    "gemini_call_seconds", "Gemini generation latency by operation", ("op",))
+STORAGE_SECONDS = REGISTRY.histogram(
+    "storage_upload_seconds", "Storage upload latency by outcome", ("outcome",))
+LOG_FLUSH_SECONDS = REGISTRY.histogram(
+    "log_flush_seconds", "Time to write one batch of log rows")
+QUOTA_REJECTIONS = REGISTRY.counter(
+    "quota_rejections_total", "Generation requests refused by the daily quota", ("reason",))
+ERRORS = REGISTRY.counter(
+    "errors_total", "Errors handled inside services and handlers", ("where",))
+
+
+def timed(histogram: Histogram, **labels):
+    """Decorator recording how long each call of the wrapped function takes."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
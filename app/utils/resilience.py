@@ -0,0 +1,235 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Optional
+
+import requests
+
+_RETRYABLE = None
+
+
+def retryable_errors() -> tuple:
+    """Exception types worth retrying (network trouble, 429/5xx from Google)."""
+    global _RETRYABLE
+    if _RETRYABLE is None:
+        errors = (TimeoutError, ConnectionError, requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+        try:
+            # imported on first failure only; it is only needed with the SDK
+            from google.api_core import exceptions as gexc
+            errors += (gexc.ServiceUnavailable, gexc.DeadlineExceeded, gexc.ResourceExhausted,
+                       gexc.InternalServerError, gexc.TooManyRequests)
+        except Exception:
+            pass
+        _RETRYABLE = errors
+    return _RETRYABLE
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream that is failing."""
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a rolling window of calls.
+
+    Opens when at least ``min_calls`` of the last ``window`` calls were made
+    and the failure ratio reaches ``error_rate``; after ``cooldown`` seconds one
+    trial call is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, window: int = 20, error_rate: float = 0.5, min_calls: int = 10, cooldown: float = 30.0):
+        self.window = window
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._results = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._opened_at = None
+        self._trial_running = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool):
+        with self._lock:
+            if self._opened_at is not None:
+                # outcome of the half-open trial
+                self._trial_running = False
+                if success:
+                    self._opened_at = None
+                    self._results.clear()
+                else:
+                    self._opened_at = time.monotonic()
+                return
+            self._results.append(success)
+            failures = self._results.count(False)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.error_rate:
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._state(),
+                "recent_calls": len(self._results),
+                "recent_failures": self._results.count(False),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class LatencyTracker:
+    """Rolling window of call latencies for percentile estimates."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class ResilientCaller:
+    """Run blocking upstream calls with a deadline, jittered retries for
+    retryable errors, optional hedging and a circuit breaker.
+
+    Configured from ``<PREFIX>_*`` environment variables:
+    ``DEADLINE`` (seconds per call, retries included), ``RETRIES``,
+    ``BACKOFF`` (base seconds), ``HEDGE`` (``off``, ``p95`` or a number of
+    seconds after which a second identical request is started) and
+    ``CB_WINDOW``/``CB_ERROR_RATE``/``CB_MIN_CALLS``/``CB_COOLDOWN``.
+    """
+
+    def __init__(self, prefix: str = "GEMINI", pool_size: Optional[int] = None):
+        env = lambda name, default: os.getenv(f"{prefix}_{name}", default)
+        self.deadline = float(env("DEADLINE", 60))
+        self.retries = int(env("RETRIES", 2))
+        self.backoff = float(env("BACKOFF", 0.5))
+        self.hedge = str(env("HEDGE", "off")).lower()
+        self.breaker = CircuitBreaker(
+            window=int(env("CB_WINDOW", 20)),
+            error_rate=float(env("CB_ERROR_RATE", 0.5)),
+            min_calls=int(env("CB_MIN_CALLS", 10)),
+            cooldown=float(env("CB_COOLDOWN", 30)),
+        )
+        self.latency = LatencyTracker()
+        self._pool = ThreadPoolExecutor(max_workers=pool_size or int(env("POOL_SIZE", 16)),
+                                        thread_name_prefix=prefix.lower())
+        self.calls = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    def hedge_after(self) -> Optional[float]:
+        if self.hedge in ("", "off", "0", "false", "no"):
+            return None
+        if self.hedge == "p95":
+            # wait for enough samples before trusting the estimate
+            return self.latency.percentile(95) if len(self.latency) >= 20 else None
+        try:
+            return float(self.hedge)
+        except ValueError:
+            return None
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        if not self.breaker.allow():
+            raise CircuitOpenError("circuit open")
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                result = self._attempt(fn, deadline)
+            except Exception as e:
+                remaining = deadline - time.monotonic()
+                retryable = isinstance(e, retryable_errors())
+                if not retryable or attempt >= self.retries or remaining <= 0:
+                    self.breaker.record(False)
+                    raise
+                attempt += 1
+                self.retried += 1
+                # full jitter backoff, never past the deadline
+                time.sleep(min(remaining, random.uniform(0, self.backoff * (2 ** attempt))))
+                continue
+            self.breaker.record(True)
+            return result
+
+    def _attempt(self, fn: Callable[[], Any], deadline: float) -> Any:
+        started = time.monotonic()
+        futures = {self._pool.submit(fn): "primary"}
+        hedge_after = self.hedge_after()
+        if hedge_after is not None and deadline - started > hedge_after:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                self.hedged += 1
+                futures[self._pool.submit(fn)] = "hedge"
+
+        error = None
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if futures[fut] == "hedge":
+                        self.hedge_wins += 1
+                    self.latency.add(time.monotonic() - started)
+                    return fut.result()
+                error = fut.exception()
+        if error is not None and not pending:
+            raise error
+        # the abandoned call keeps its thread until the SDK returns
+        self.timeouts += 1
+        raise TimeoutError(f"upstream call exceeded {self.deadline:.0f}s deadline")
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+            "p95_seconds": self.latency.percentile(95),
+            "breaker": self.breaker.stats(),
+        }
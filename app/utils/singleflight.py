@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Tuple
+
+
+class SingleFlight:
+    """Coalesce concurrent coroutines that share a key into one execution.
+
+    The first caller for a key starts ``func()``; callers arriving while it is
+    still running await the same result (or exception) instead of starting
+    their own. A waiter being cancelled does not cancel the shared work.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return ``(result, shared)``; ``shared`` is True for coalesced waiters."""
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            self.shared += 1
+            return await asyncio.shield(task), True
+
+        self.leaders += 1
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task), False
+
+    def _done(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "shared": self.shared}
@@ -0,0 +1,64 @@
+import os
+import time
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+from app.services.outbound_service import HIGH, LOW, send_priority
+from app.utils.helpers import TELEGRAM_MESSAGE_LIMIT, split_message
+
+
+class StreamingReply:
+    """Grow a Telegram message in place as text chunks arrive.
+
+    Edits are throttled to one every ``STREAM_EDIT_INTERVAL`` seconds (Telegram
+    rejects frequent edits of the same message). Once the text outgrows one
+    message the current part is finalized and a new message continues it.
+    """
+
+    def __init__(self, message: Message, interval: float = None):
+        self.message = message
+        self.interval = interval if interval is not None else float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))
+        self.text = ""
+        self.edits = 0
+        self._offset = 0
+        self._shown = message.text or ""
+        self._last_edit = 0.0
+
+    async def feed(self, chunk: str):
+        self.text += chunk
+        # progress edits yield to other chats' final answers
+        with send_priority(LOW):
+            await self._roll_over()
+            if time.monotonic() - self._last_edit >= self.interval:
+                await self._edit(self.text[self._offset:])
+
+    async def finish(self) -> str:
+        with send_priority(HIGH):
+            await self._roll_over()
+            await self._edit(self.text[self._offset:])
+        return self.text
+
+    async def _roll_over(self):
+        while len(self.text) - self._offset > TELEGRAM_MESSAGE_LIMIT:
+            head = split_message(self.text[self._offset:])[0]
+            await self._edit(head)
+            self._offset += len(head)
+            # skip the whitespace split_message dropped between parts
+            while self._offset < len(self.text) and self.text[self._offset] in "\n ":
+                self._offset += 1
+            self.message = await self.message.answer("…")
+            self._shown = "…"
+
+    async def _edit(self, text: str):
+        if not text.strip() or text == self._shown:
+            return
+        try:
+            await self.message.edit_text(text)
+        except TelegramBadRequest as e:
+            # "message is not modified" and friends are harmless here
+            print(f"[StreamingReply] edit skipped: {e}")
+            return
+        self._shown = text
+        self._last_edit = time.monotonic()
+        self.edits += 1
@@ -0,0 +1,368 @@
+"""Multi-process mode: one supervisor, ``BOT_WORKERS`` bot processes.
+
+The supervisor owns the HTTP server (health, status, webhook) or the
+getUpdates loop and forwards each update to worker ``user_id % N`` (the chat
+id when an update has no sender). Every user is always served by the same
+process, so the per-process user cache (USER_CACHE_TTL) only ever holds rows
+that process wrote itself; in private chats, where chat and user ids match,
+per-chat send limits hold as well. Group chats are paced per worker and
+rely on Telegram's retry_after when several workers write to the same one.
+Quota state lives in Postgres when Supabase or DB_BACKEND=postgres is
+configured, in one SQLite file with DB_BACKEND=sqlite, otherwise in a
+shared in-memory backend served by the supervisor. The generation cache
+(GEN_CACHE) is shared through its disk tier: every worker gets the same
+GEN_CACHE_DIR (``.gen_cache`` unless set), so a result cached by one worker
+is a hit in the others; only its small in-memory tiers are per process.
+Workers take an update off their queue only when they have a free handler
+slot (UPDATE_CONCURRENCY), so a busy worker's queue fills up and the
+webhook answers 503. Workers send heartbeats; dead or stuck ones are
+restarted. Each worker also reports its metrics every
+WORKER_METRICS_INTERVAL seconds; the supervisor's /metrics serves them all,
+labelled ``worker="<index>"``, next to its own.
+"""
+import os
+import time
+import queue
+import signal
+import asyncio
+import secrets
+import multiprocessing as mp
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from aiohttp import web
+from aiogram import Bot
+
+from app.utils.metrics import Registry, merge_expositions
+
+
+def partition_key(update: dict) -> int:
+    """User id an update comes from, else its chat id; the update id as a
+    last resort."""
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        for field in ("from", "user"):
+            if isinstance(value.get(field), dict):
+                return int(value[field]["id"])
+        for holder in (value, value.get("message")):
+            if isinstance(holder, dict) and isinstance(holder.get("chat"), dict):
+                return int(holder["chat"]["id"])
+    return int(update.get("update_id", 0))
+
+
+def worker_main(index: int, updates, heartbeats, env: dict, reports=None):
+    """Entry point of a worker process."""
+    os.environ.update(env)
+    # the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_loop(index, updates, heartbeats, reports))
+
+
+def _report_metrics(index: int, reports):
+    from app.utils.metrics import REGISTRY
+    try:
+        reports.put_nowait((index, REGISTRY.render()))
+    except queue.Full:
+        pass  # the supervisor is behind; the next report replaces this one
+
+
+async def _worker_loop(index: int, updates, heartbeats, reports=None):
+    from app import bot as botmod
+
+    botmod.open_database()
+    botmod.register_handlers()
+    interval = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", 2))
+    report_every = float(os.getenv("WORKER_METRICS_INTERVAL", 5))
+    reported = 0.0
+    # updates not yet taken stay in the bounded queue, where dispatch() sees them
+    slots = asyncio.Semaphore(int(os.getenv("UPDATE_CONCURRENCY", 64)))
+    loop = asyncio.get_running_loop()
+    print(f"[worker {index}] started (pid {os.getpid()})")
+    try:
+        while True:
+            # a stuck event loop stops the heartbeat too
+            heartbeats[index] = time.time()
+            if reports is not None and heartbeats[index] - reported >= report_every:
+                reported = heartbeats[index]
+                _report_metrics(index, reports)
+            try:
+                await asyncio.wait_for(slots.acquire(), interval)
+            except asyncio.TimeoutError:
+                continue
+            try:
+                update = await loop.run_in_executor(None, updates.get, True, interval)
+            except queue.Empty:
+                slots.release()
+                continue
+            if update is None:
+                slots.release()
+                break
+            task = botmod._in_background(_handle(botmod, update))
+            task.add_done_callback(lambda _: slots.release())
+    finally:
+        await botmod.drain_background()
+        await botmod.outbound.close()
+        if botmod.services.built("storage"):
+            await botmod.storage.close()
+        if botmod.bot:
+            await botmod.bot.session.close()
+        botmod.shutdown_services()
+        print(f"[worker {index}] stopped")
+
+
+async def _handle(botmod, update: dict):
+    try:
+        await botmod.dp.feed_raw_update(botmod.bot, update)
+    except Exception as e:
+        print(f"[worker] update {update.get('update_id')} failed: {e}")
+
+
+class Supervisor:
+    def __init__(self, workers: Optional[int] = None):
+        self.count = workers or int(os.getenv("BOT_WORKERS", 0)) or os.cpu_count() or 1
+        self.queue_size = int(os.getenv("WORKER_QUEUE_SIZE", 1000))
+        self.heartbeat_timeout = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", 30))
+        self.check_interval = float(os.getenv("WORKER_HEALTH_INTERVAL", 5))
+        # spawn: the supervisor has threads, forking them is unsafe
+        self.ctx = mp.get_context("spawn")
+        self.queues = [self.ctx.Queue(maxsize=self.queue_size) for _ in range(self.count)]
+        self.heartbeats = self.ctx.Array("d", self.count, lock=False)
+        self.procs: List[Optional[mp.Process]] = [None] * self.count
+        self.restarts = [0] * self.count
+        self.forwarded = [0] * self.count
+        self.rejected = 0
+        self.env = {}
+        self._backend = None
+        # latest metrics text of each worker, fed through ``reports``
+        self.reports = self.ctx.Queue(maxsize=self.count * 4)
+        self.worker_metrics = {}
+        self.registry = Registry()
+        self.registry.gauge("supervisor_workers_alive", "Worker processes alive",
+                            lambda: sum(bool(p and p.is_alive()) for p in self.procs))
+        self.registry.gauge("supervisor_worker_restarts", "Worker restarts since start",
+                            lambda: sum(self.restarts))
+        self.registry.gauge("supervisor_updates_forwarded", "Updates queued for a worker",
+                            lambda: sum(self.forwarded))
+        self.registry.gauge("supervisor_updates_rejected", "Updates refused because a worker queue was full",
+                            lambda: self.rejected)
+
+    def _worker_env(self) -> dict:
+        env = dict(self.env)
+        # the global send rate is split between the workers
+        env["TG_GLOBAL_RATE"] = str(float(os.getenv("TG_GLOBAL_RATE", 30)) / self.count)
+        # one generation cache directory for all workers
+        env["GEN_CACHE_DIR"] = os.path.abspath(os.getenv("GEN_CACHE_DIR") or ".gen_cache")
+        return env
+
+    def start_shared_backend(self):
+        """Serve the in-memory backend to the workers unless Supabase, a
+        direct Postgres connection or an SQLite file is used."""
+        backend = os.getenv("DB_BACKEND", "supabase").lower()
+        if backend in ("postgres", "sqlite"):
+            # open it once here: a bad setting stops the supervisor instead of
+            # every worker dying and being restarted in a loop
+            from app.services.db_service import DBService
+            DBService().close()
+            return
+        use_fallback = os.getenv("USE_FALLBACK_DB", "false").lower() in ("1", "true", "yes")
+        if not use_fallback and os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY"):
+            return
+        from app.services.shared_backend import serve_backend
+        authkey = secrets.token_hex(16)
+        self._backend = serve_backend("127.0.0.1:0", authkey.encode(), ctx=self.ctx)
+        host, port = self._backend.address
+        self.env["SHARED_BACKEND_ADDRESS"] = f"{host}:{port}"
+        self.env["SHARED_BACKEND_AUTHKEY"] = authkey
+
+    def start_worker(self, index: int):
+        self.heartbeats[index] = time.time()
+        proc = self.ctx.Process(
+            target=worker_main,
+            args=(index, self.queues[index], self.heartbeats, self._worker_env(), self.reports),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        proc.start()
+        self.procs[index] = proc
+
+    def start(self):
+        self.start_shared_backend()
+        for i in range(self.count):
+            self.start_worker(i)
+
+    def dispatch(self, update: dict) -> bool:
+        """Queue ``update`` for its worker; False when that worker is full."""
+        index = partition_key(update) % self.count
+        try:
+            self.queues[index].put_nowait(update)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.forwarded[index] += 1
+        return True
+
+    async def dispatch_wait(self, update: dict):
+        """Like dispatch, but waits for room instead of refusing."""
+        index = partition_key(update) % self.count
+        while True:
+            try:
+                self.queues[index].put_nowait(update)
+                break
+            except queue.Full:
+                await asyncio.sleep(0.05)
+        self.forwarded[index] += 1
+
+    def check_workers(self):
+        now = time.time()
+        for i, proc in enumerate(self.procs):
+            stale = now - self.heartbeats[i] > self.heartbeat_timeout
+            if proc is not None and proc.is_alive() and not stale:
+                continue
+            reason = "unresponsive" if proc is not None and proc.is_alive() else "exited"
+            print(f"[Supervisor] worker {i} {reason}, restarting")
+            if proc is not None and proc.is_alive():
+                proc.kill()
+                proc.join(5)
+            self.restarts[i] += 1
+            self.start_worker(i)
+
+    def collect_metrics(self):
+        """Keep the newest report of each worker."""
+        while True:
+            try:
+                index, text = self.reports.get_nowait()
+            except queue.Empty:
+                return
+            self.worker_metrics[str(index)] = text
+
+    def render_metrics(self) -> str:
+        self.collect_metrics()
+        return self.registry.render() + merge_expositions(self.worker_metrics)
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            self.check_workers()
+            self.collect_metrics()
+
+    def stop(self, timeout: float = 15.0):
+        for q in self.queues:
+            try:
+                q.put(None, timeout=1)
+            except queue.Full:
+                pass
+        deadline = time.monotonic() + timeout
+        for proc in self.procs:
+            if proc is not None:
+                proc.join(max(0.1, deadline - time.monotonic()))
+                if proc.is_alive():
+                    proc.terminate()
+        if self._backend is not None:
+            self._backend.shutdown()
+
+    def stats(self) -> dict:
+        now = time.time()
+        workers = []
+        for i, proc in enumerate(self.procs):
+            try:
+                depth = self.queues[i].qsize()
+            except NotImplementedError:
+                depth = None
+            workers.append({
+                "index": i,
+                "pid": proc.pid if proc else None,
+                "alive": bool(proc and proc.is_alive()),
+                "heartbeat_age": round(now - self.heartbeats[i], 3),
+                "queue_depth": depth,
+                "forwarded": self.forwarded[i],
+                "restarts": self.restarts[i],
+            })
+        return {"workers": workers, "rejected": self.rejected, "shared_backend": self._backend is not None}
+
+    def _setup_webhook(self, app: web.Application, bot: Bot, webhook_url: str):
+        path = urlparse(webhook_url).path
+        if not path or path == "/":
+            path = "/webhook"
+            webhook_url = webhook_url.rstrip("/") + path
+        secret = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+
+        async def receive(request: web.Request) -> web.Response:
+            if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+                return web.Response(status=401)
+            # 503 makes Telegram retry the update later
+            return web.Response(status=200 if self.dispatch(await request.json()) else 503)
+
+        async def on_startup(_app):
+            await bot.set_webhook(
+                url=webhook_url,
+                secret_token=secret,
+                max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40)),
+            )
+
+        app.router.add_post(path, receive)
+        app.on_startup.append(on_startup)
+
+    async def _poll(self, bot: Bot):
+        await bot.delete_webhook()
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=25)
+            except Exception as e:
+                print(f"[Supervisor] getUpdates error: {e}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                # a busy worker slows polling down instead of losing updates
+                await self.dispatch_wait(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+
+    async def run(self, app: web.Application, host: str, port: int):
+        """Start the workers, serve ``app`` plus ``/status`` and feed the
+        workers from the webhook or from getUpdates until interrupted."""
+        token = os.getenv("TELEGRAM_TOKEN")
+        bot = Bot(token=token) if token else None
+        use_webhook = bool(bot) and os.getenv("BOT_MODE", "polling") == "webhook"
+        webhook_url = os.getenv("WEBHOOK_URL")
+        if use_webhook and not webhook_url:
+            print('WEBHOOK_URL não configurado. Usando polling.')
+            use_webhook = False
+
+        async def status(request: web.Request) -> web.Response:
+            return web.json_response(self.stats())
+
+        async def metrics(request: web.Request) -> web.Response:
+            return web.Response(body=self.render_metrics().encode("utf-8"),
+                                headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+        app.router.add_get("/status", status)
+        app.router.add_get("/metrics", metrics)
+        if use_webhook:
+            self._setup_webhook(app, bot, webhook_url)
+        if not bot:
+            print("TELEGRAM_TOKEN não configurado. Bot não iniciado.")
+
+        self.start()
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        monitor = asyncio.ensure_future(self._monitor())
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        poller = asyncio.ensure_future(self._poll(bot)) if bot and not use_webhook else None
+        try:
+            await stop.wait()
+        finally:
+            monitor.cancel()
+            if poller:
+                poller.cancel()
+            await runner.cleanup()
+            if bot:
+                await bot.session.close()
+            await loop.run_in_executor(None, self.stop)
@@ -0,0 +1,307 @@
+"""End-to-end load test: feed synthetic updates through the real Dispatcher.
+
+Updates go through ``dp`` from ``app/bot.py`` (middlewares, handlers,
+scheduler, limiter, logger) with a fake Bot session, the in-memory database
+and a mock Gemini whose latency follows a configurable distribution. Nothing
+touches the network.
+
+For each concurrency level it reports updates/sec, p50/p95/p99 handler
+latency and event-loop lag, and writes everything to a JSON file so runs can
+be compared between commits:
+
+    python benchmarks/load_test.py --concurrency 1,16,64 --updates 500 \\
+        --text-latency lognormal:0.8,0.4 --output bench.json
+    python benchmarks/load_test.py --compare bench.json   # diff against a baseline
+"""
+import os
+import sys
+import json
+import time
+import math
+import random
+import asyncio
+import argparse
+import tempfile
+import datetime
+import platform
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, Update, User as TgUser
+
+DEFAULT_MIX = "gerar_texto=0.5,gerar_imagem=0.2,meu_plano=0.2,ajuda=0.1"
+
+
+class FakeSession(BaseSession):
+    """Bot session that answers every API call locally."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+        self._message_id = 0
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        name = type(method).__name__
+        if name in ("SendMessage", "SendPhoto", "EditMessageText"):
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", None) or 1
+            return Message(
+                message_id=self._message_id,
+                date=datetime.datetime.now(),
+                chat=Chat(id=chat_id, type="private"),
+                text=getattr(method, "text", None),
+            ).as_(bot)
+        return True
+
+
+def parse_latency(spec: str):
+    """``fixed:S``, ``uniform:A,B``, ``exp:MEAN`` or ``lognormal:MEDIAN,SIGMA``
+    (seconds) -> a function returning one sample."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def parse_mix(spec: str):
+    commands, weights = [], []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        commands.append(name.strip())
+        weights.append(float(weight or 1))
+    return commands, weights
+
+
+def make_mock_gemini(text_latency, image_latency):
+    from app.services.gemini_service import GeminiService
+
+    class LatencyGemini(GeminiService):
+        """Mock generations that take as long as a real upstream would."""
+
+        def generate_text(self, prompt: str) -> str:
+            time.sleep(text_latency())
+            return super().generate_text(prompt)
+
+        def generate_image(self, prompt: str) -> bytes:
+            time.sleep(image_latency())
+            return super().generate_image(prompt)
+
+    return LatencyGemini(api_key="")
+
+
+def _percentile(ordered, p: float):
+    if not ordered:
+        return None
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _summary_ms(samples):
+    ordered = sorted(samples)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "p50_ms": ms(_percentile(ordered, 50)),
+        "p95_ms": ms(_percentile(ordered, 95)),
+        "p99_ms": ms(_percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1] if ordered else None),
+    }
+
+
+async def _watch_loop_lag(samples, stop: asyncio.Event, interval: float = 0.01):
+    # a sleep that wakes up late means something blocked the loop
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def run_level(botmod, bot, concurrency: int, updates: int, users: int, mix, first_update_id: int):
+    commands, weights = mix
+    latencies, lag = [], []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    watcher = asyncio.ensure_future(_watch_loop_lag(lag, stop))
+    calls_before = bot.session.calls
+
+    async def one(i: int):
+        nonlocal errors
+        uid = 1 + i % users
+        command = random.choices(commands, weights)[0]
+        update = Update(update_id=first_update_id + i, message=Message(
+            message_id=i + 1,
+            date=datetime.datetime.now(),
+            chat=Chat(id=uid, type="private"),
+            from_user=TgUser(id=uid, is_bot=False, first_name="Load"),
+            text=f"/{command} prompt de carga {i % 50}",
+        ))
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await botmod.dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(updates)))
+    elapsed = time.perf_counter() - started
+    await botmod.drain_background()
+    stop.set()
+    await watcher
+
+    return {
+        "concurrency": concurrency,
+        "updates": updates,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(updates / elapsed, 2) if elapsed else None,
+        "latency": _summary_ms(latencies),
+        "loop_lag": _summary_ms(lag),
+        "telegram_calls": bot.session.calls - calls_before,
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+async def run_benchmark(concurrency_levels, updates: int = 200, users: int = 500, mix: str = DEFAULT_MIX,
+                        text_latency: str = "fixed:0.05", image_latency: str = "fixed:0.1",
+                        api_latency: float = 0.0, telegram_limits: bool = False, seed: int = 1,
+                        db: str = "memory") -> dict:
+    # local, network-free services; must be set before app.bot is imported
+    os.environ["USE_FALLBACK_DB"] = "true"
+    os.environ["DB_BACKEND"] = db
+    # database file and stored images go to a fresh directory unless set,
+    # never the working tree; a fresh database per run keeps results comparable
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    os.environ.setdefault("STORAGE_LOCAL_DIR", os.path.join(workdir, "storage"))
+    os.environ.setdefault("STORAGE_INDEX_PATH", os.path.join(workdir, "storage_index.jsonl"))
+    if db == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.join(workdir, "bench.sqlite3")
+    os.environ["ENABLE_GEMINI_MOCK"] = "true"
+    os.environ.pop("TELEGRAM_TOKEN", None)
+    os.environ.pop("SUPABASE_URL", None)
+    random.seed(seed)
+
+    import app.bot as botmod
+    from app.services.container import services
+
+    # services built before this point saw other settings
+    services.reset()
+    services.set("gemini", make_mock_gemini(parse_latency(text_latency), parse_latency(image_latency)))
+    botmod.register_handlers()
+    bot = Bot("123456:load-test", session=FakeSession(api_latency))
+    if telegram_limits:
+        # pace sends like production does (caps throughput at TG_GLOBAL_RATE)
+        bot.session.middleware(botmod.outbound)
+
+    for uid in range(1, users + 1):
+        botmod.db.create_user({
+            "telegram_id": uid, "nome": f"load-{uid}", "plano": "Free" if uid % 4 else "Pro",
+            "limite_diario": 10 ** 9, "geracoes_hoje": 0, "ultima_geracao": None,
+        })
+
+    levels = []
+    next_id = 1
+    for level in concurrency_levels:
+        levels.append(await run_level(botmod, bot, level, updates, users, parse_mix(mix), next_id))
+        next_id += updates
+    botmod.logger.flush()
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "updates_per_level": updates, "users": users, "mix": mix,
+            "text_latency": text_latency, "image_latency": image_latency,
+            "api_latency": api_latency, "telegram_limits": telegram_limits, "seed": seed,
+            "db": db,
+            "scheduler_workers": botmod.scheduler.workers,
+            "update_concurrency": botmod.update_limiter.limit,
+        },
+        "levels": levels,
+    }
+
+
+def print_report(result: dict, baseline: dict = None):
+    base = {lvl["concurrency"]: lvl for lvl in (baseline or {}).get("levels", [])}
+    print(f"commit {result.get('commit')}  ({result['config']['updates_per_level']} updates/level)")
+    print(f"{'conc':>5} {'upd/s':>9} {'p50ms':>9} {'p95ms':>9} {'p99ms':>9} {'lag99ms':>9} {'errors':>6}")
+    for lvl in result["levels"]:
+        lat = lvl["latency"]
+        line = (f"{lvl['concurrency']:>5} {lvl['updates_per_sec']:>9} {lat['p50_ms']:>9} {lat['p95_ms']:>9} "
+                f"{lat['p99_ms']:>9} {lvl['loop_lag']['p99_ms']:>9} {lvl['errors']:>6}")
+        old = base.get(lvl["concurrency"])
+        if old:
+            def delta(new, prev):
+                return f"{(new - prev) / prev * 100:+.1f}%" if prev else "n/a"
+            line += (f"   vs {baseline.get('commit')}: upd/s {delta(lvl['updates_per_sec'], old['updates_per_sec'])},"
+                     f" p95 {delta(lat['p95_ms'], old['latency']['p95_ms'])}")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,8,32,128", help="comma-separated in-flight update levels")
+    parser.add_argument("--updates", type=int, default=300, help="updates per concurrency level")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="command=weight pairs")
+    parser.add_argument("--text-latency", default="lognormal:0.05,0.5")
+    parser.add_argument("--image-latency", default="lognormal:0.2,0.5")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds per Telegram API call")
+    parser.add_argument("--telegram-limits", action="store_true", help="apply the outbound rate limiter")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", choices=("memory", "sqlite"), default="memory", help="local database backend")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="baseline result file to diff against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(
+        [int(c) for c in args.concurrency.split(",")], updates=args.updates, users=args.users,
+        mix=args.mix, text_latency=args.text_latency, image_latency=args.image_latency,
+        api_latency=args.api_latency, telegram_limits=args.telegram_limits, seed=args.seed,
+        db=args.db,
+    ))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
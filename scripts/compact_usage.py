@@ -0,0 +1,76 @@
+"""Rebuild the usage_daily rollup from logs for a range of days.
+
+The bot adds to usage_daily as it writes logs; this job recomputes whole
+days from the logs table, to backfill days from before the rollup existed or
+to repair counts after failed writes. Run it periodically (e.g. daily from
+cron) for days that are already over:
+
+    python scripts/compact_usage.py              # the last 7 days, up to yesterday
+    python scripts/compact_usage.py --from 2026-01-01 --to 2026-01-31
+
+Uses the SQLite file when DB_BACKEND=sqlite, DATABASE_URL otherwise.
+"""
+import os
+import sys
+import argparse
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from scripts.run_sql_file import connect, load_env
+
+
+def day_range(days: int, day_from: str = None, day_to: str = None):
+    """``(first, last)`` ISO days; by default the ``days`` days before today (UTC,
+    like the rollup's days)."""
+    last = date.fromisoformat(day_to) if day_to else datetime.utcnow().date() - timedelta(days=1)
+    first = date.fromisoformat(day_from) if day_from else last - timedelta(days=days - 1)
+    if first > last:
+        raise ValueError(f"empty range: {first} > {last}")
+    return first.isoformat(), last.isoformat()
+
+
+def compact(day_from: str, day_to: str) -> int:
+    """Recompute ``day_from``..``day_to``; returns the rollup rows written."""
+    if os.getenv("DB_BACKEND", "supabase").lower() == "sqlite":
+        from app.services.sqlite_backend import SqliteBackend
+        backend = SqliteBackend()
+        try:
+            return backend.rollup_usage(day_from, day_to)
+        finally:
+            backend.close()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("DATABASE_URL not set in .env. Aborting.")
+        sys.exit(2)
+    conn = connect(database_url)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("select rollup_usage(%s, %s)", (day_from, day_to))
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=7, help="days to rebuild, ending yesterday")
+    parser.add_argument("--from", dest="day_from", help="first day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="day_to", help="last day (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    load_env()
+    day_from, day_to = day_range(args.days, args.day_from, args.day_to)
+    try:
+        rows = compact(day_from, day_to)
+    except Exception as e:
+        print("Error rebuilding usage_daily:", e)
+        sys.exit(6)
+    print(f"usage_daily rebuilt for {day_from}..{day_to}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
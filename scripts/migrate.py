@@ -0,0 +1,183 @@
+"""Apply the versioned migrations in sql/migrations to DATABASE_URL.
+
+Each file is named ``NNNN_name.sql`` and runs once, in version order, inside
+its own transaction; applied versions (and a checksum of the file) are
+recorded in ``schema_migrations``. Databases created from
+sql/create_tables.sql already list the versions that file contains.
+
+    python scripts/migrate.py            # apply pending migrations
+    python scripts/migrate.py --status   # list applied / pending versions
+    python scripts/migrate.py --check    # EXPLAIN the hot queries, fail on sequential scans
+"""
+import os
+import re
+import sys
+import hashlib
+import argparse
+from collections import namedtuple
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from scripts.run_sql_file import connect, load_env
+
+MIGRATIONS_DIR = os.path.join(ROOT, "sql", "migrations")
+# pg_advisory_lock key: two deploys migrating at once wait for each other
+LOCK_KEY = 72_240_001
+
+Migration = namedtuple("Migration", "version name path checksum")
+
+# Queries the bot runs on every update or that scan logs per user/day; each
+# must be able to use an index once the migrations are applied.
+HOT_QUERIES = [
+    ("user by telegram_id", "select * from users where telegram_id = 1"),
+    ("user logs, newest first", "select * from logs where telegram_id = 1 order by data desc limit 50"),
+    ("logs of one day", "select tipo, count(*) from logs"
+                        " where data >= '2026-01-01' and data < '2026-01-02' group by tipo"),
+    ("plan by name", "select * from planos where nome = 'Free'"),
+    ("usage of a week", "select * from usage_daily where dia between '2026-01-01' and '2026-01-07'"),
+]
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".sql"):
+            continue
+        m = re.match(r"^(\d{4})_(\w+)\.sql$", filename)
+        if not m:
+            raise ValueError(f"bad migration file name: {filename} (expected NNNN_name.sql)")
+        path = os.path.join(directory, filename)
+        with open(path, "rb") as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations.append(Migration(m.group(1), m.group(2), path, checksum))
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"duplicate migration versions in {directory}")
+    return migrations
+
+
+def ensure_table(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "create table if not exists schema_migrations ("
+            " version text primary key, name text not null, checksum text,"
+            " applied_at timestamptz default now())"
+        )
+
+
+def applied_versions(conn) -> Dict[str, str]:
+    """version -> checksum (None for versions recorded by create_tables.sql)."""
+    with conn, conn.cursor() as cur:
+        cur.execute("select version, checksum from schema_migrations")
+        return dict(cur.fetchall())
+
+
+def pending(migrations: List[Migration], applied: Dict[str, str]) -> List[Migration]:
+    for m in migrations:
+        if m.version in applied and applied[m.version] not in (None, m.checksum):
+            print(f"warning: migration {m.version}_{m.name} changed after it was applied")
+    return [m for m in migrations if m.version not in applied]
+
+
+def migrate(conn, migrations: List[Migration], dry_run: bool = False) -> List[Migration]:
+    """Apply the pending ``migrations``; returns the ones applied."""
+    ensure_table(conn)
+    with conn.cursor() as cur:
+        cur.execute("select pg_advisory_lock(%s)", (LOCK_KEY,))
+    conn.commit()
+    done = []
+    try:
+        for m in pending(migrations, applied_versions(conn)):
+            if dry_run:
+                print(f"would apply {m.version}_{m.name}")
+                continue
+            with open(m.path, encoding="utf-8") as f:
+                sql_text = f.read()
+            # the file and its bookkeeping row commit together or not at all
+            with conn, conn.cursor() as cur:
+                cur.execute(sql_text)
+                cur.execute("insert into schema_migrations (version, name, checksum) values (%s, %s, %s)",
+                            (m.version, m.name, m.checksum))
+            print(f"applied {m.version}_{m.name}")
+            done.append(m)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("select pg_advisory_unlock(%s)", (LOCK_KEY,))
+        conn.commit()
+    return done
+
+
+def plan_nodes(plan: dict) -> List[str]:
+    """Node types of an ``EXPLAIN (FORMAT JSON)`` plan, depth first."""
+    nodes = [plan["Node Type"]]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def uses_index(nodes: List[str]) -> bool:
+    return any("Index" in n or "Bitmap" in n for n in nodes)
+
+
+def explain_check(conn, queries=HOT_QUERIES) -> List[tuple]:
+    """(name, ok, node types) per query.
+
+    Sequential scans are disabled for the check: small tables are always
+    scanned, so this asks whether an index *can* serve the query.
+    """
+    results = []
+    with conn.cursor() as cur:
+        cur.execute("set local enable_seqscan = off")
+        for name, query in queries:
+            cur.execute("explain (format json) " + query)
+            nodes = plan_nodes(cur.fetchone()[0][0]["Plan"])
+            results.append((name, uses_index(nodes), nodes))
+    conn.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--dry-run", action="store_true", help="show what would be applied")
+    parser.add_argument("--check", action="store_true", help="after migrating, EXPLAIN the hot queries")
+    parser.add_argument("--dir", default=MIGRATIONS_DIR)
+    args = parser.parse_args()
+
+    load_env()
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("DATABASE_URL not set in .env. Aborting.")
+        sys.exit(2)
+    migrations = discover(args.dir)
+    conn = connect(database_url)
+    try:
+        if args.status:
+            ensure_table(conn)
+            applied = applied_versions(conn)
+            for m in migrations:
+                print(f"{m.version}_{m.name}: {'applied' if m.version in applied else 'pending'}")
+            return
+        try:
+            done = migrate(conn, migrations, dry_run=args.dry_run)
+        except Exception as e:
+            print("Error applying migrations:", e)
+            sys.exit(6)
+        if not done and not args.dry_run:
+            print("database is up to date")
+        if args.check:
+            failed = 0
+            for name, ok, nodes in explain_check(conn):
+                print(f"{'ok  ' if ok else 'SEQ '} {name}: {' > '.join(nodes)}")
+                failed += not ok
+            if failed:
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
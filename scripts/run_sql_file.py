@@ -1,68 +1,64 @@
 """Execute SQL file against DATABASE_URL using psycopg2.
 
-Reads DATABASE_URL from .env (or environment) and runs the SQL statements in sql/create_tables.sql.
-Be careful: this will modify the database.
+Reads DATABASE_URL from .env (or environment) and runs the SQL statements in sql/create_tables.sql
+(or the file given as the first argument). Be careful: this will modify the database.
+For upgrading an existing database use scripts/migrate.py.
 """
 import os
 import sys
 from dotenv import load_dotenv
 
 
-def main():
-    root = os.path.dirname(os.path.dirname(__file__))
-    dotenv_path = os.path.join(root, '.env')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_env():
+    dotenv_path = os.path.join(ROOT, '.env')
     if os.path.exists(dotenv_path):
         load_dotenv(dotenv_path)
     else:
         load_dotenv()
 
-    database_url = os.getenv('DATABASE_URL')
-    if not database_url:
-        print('DATABASE_URL not set in .env. Aborting.')
-        sys.exit(2)
 
-    sql_path = os.path.join(root, 'sql', 'create_tables.sql')
-    if not os.path.exists(sql_path):
-        print('SQL file not found:', sql_path)
-        sys.exit(3)
+def sanitize_database_url(url: str) -> str:
+    # Try a robust regex-based sanitizer: split at the last '@' and encode username/password
+    try:
+        import re
+        from urllib.parse import quote
+        m = re.match(r"(?P<prefix>^[^:]+://)(?P<userinfo>.+)@(?P<host>.+)$", url)
+        if not m:
+            return url
+        prefix = m.group('prefix')
+        userinfo = m.group('userinfo')
+        host = m.group('host')
+        # userinfo may contain ':' separating user and pass
+        if ':' in userinfo:
+            user, pwd = userinfo.split(':', 1)
+        else:
+            user, pwd = userinfo, ''
+        # remove surrounding brackets and whitespace
+        user = user.strip().strip('[]')
+        pwd = pwd.strip().strip('[]')
+        # percent-encode
+        user_q = quote(user, safe='')
+        pwd_q = quote(pwd, safe='')
+        new = f"{prefix}{user_q}:{pwd_q}@{host}"
+        return new
+    except Exception:
+        return url
 
+
+def connect(database_url: str):
+    """psycopg2 connection to ``database_url``; exits the script on failure."""
     try:
         import psycopg2
-        from psycopg2 import sql
     except Exception as e:
         print('psycopg2 not installed. Install with: pip install psycopg2-binary')
         print('Exception:', e)
         sys.exit(4)
 
-    def sanitize_database_url(url: str) -> str:
-        # Try a robust regex-based sanitizer: split at the last '@' and encode username/password
-        try:
-            import re
-            from urllib.parse import quote
-            m = re.match(r"(?P<prefix>^[^:]+://)(?P<userinfo>.+)@(?P<host>.+)$", url)
-            if not m:
-                return url
-            prefix = m.group('prefix')
-            userinfo = m.group('userinfo')
-            host = m.group('host')
-            # userinfo may contain ':' separating user and pass
-            if ':' in userinfo:
-                user, pwd = userinfo.split(':', 1)
-            else:
-                user, pwd = userinfo, ''
-            # remove surrounding brackets and whitespace
-            user = user.strip().strip('[]')
-            pwd = pwd.strip().strip('[]')
-            # percent-encode
-            user_q = quote(user, safe='')
-            pwd_q = quote(pwd, safe='')
-            new = f"{prefix}{user_q}:{pwd_q}@{host}"
-            return new
-        except Exception:
-            return url
-
     try:
-        conn = psycopg2.connect(database_url)
+        return psycopg2.connect(database_url)
     except Exception as e:
         # Try to sanitize common percent-encoding errors
         msg = str(e)
@@ -72,7 +68,7 @@ def main():
             if safe_url != database_url:
                 print('Retrying with sanitized DATABASE_URL')
                 try:
-                    conn = psycopg2.connect(safe_url)
+                    return psycopg2.connect(safe_url)
                 except Exception:
                     # Try a direct simple fix: find userinfo between '://' and '@'
                     try:
@@ -90,7 +86,7 @@ def main():
                                 pwd_q = quote(pwd, safe='')
                                 new = prefix + '://' + user_q + ':' + pwd_q + '@' + hostpart
                                 print('Retrying with directly-encoded DATABASE_URL')
-                                conn = psycopg2.connect(new)
+                                return psycopg2.connect(new)
                             else:
                                 raise
                         else:
@@ -104,6 +100,22 @@ def main():
             print('Error connecting to DATABASE_URL after sanitizing:', e2)
             sys.exit(5)
 
+
+def main():
+    load_env()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print('DATABASE_URL not set in .env. Aborting.')
+        sys.exit(2)
+
+    sql_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'sql', 'create_tables.sql')
+    if not os.path.exists(sql_path):
+        print('SQL file not found:', sql_path)
+        sys.exit(3)
+
+    conn = connect(database_url)
+
     try:
         with open(sql_path, 'r', encoding='utf-8') as f:
             sql_text = f.read()
@@ -1,33 +1,66 @@
-from flask import Flask
-import threading
 import os
+import asyncio
 
-app = Flask(__name__)
+from aiohttp import web
 
 
-@app.route("/")
-def index():
-    return "Bot ativo 🚀"
+async def index(request: web.Request) -> web.Response:
+    return web.Response(text="Bot ativo 🚀")
 
 
-def run_flask():
-    host = os.getenv("FLASK_HOST", "0.0.0.0")
-    port = int(os.getenv("FLASK_PORT", 8080))
-    app.run(host=host, port=port)
+async def status(request: web.Request) -> web.Response:
+    from app.bot import executor, db, logger, gemini, inflight, scheduler, update_limiter, storage, outbound
+    return web.json_response({
+        "executor": executor.stats(),
+        "user_cache": db.cache_stats(),
+        "logs": logger.stats(),
+        "generation_cache": gemini.cache.stats() if gemini.cache else None,
+        "gemini": {**gemini.resilience.stats(),
+                   "sdk": gemini.adapter.describe() if gemini.adapter else None,
+                   "downloads": gemini.downloader.stats()},
+        "single_flight": inflight.stats(),
+        "scheduler": scheduler.stats(),
+        "updates": update_limiter.stats(),
+        "storage": storage.stats(),
+        "outbound": outbound.stats(),
+    })
 
 
-def start_bot():
-    # Import here to avoid circular import at module import time
+async def metrics(request: web.Request) -> web.Response:
+    # importing app.bot registers the service gauges
+    import app.bot  # noqa: F401
+    from app.utils.metrics import REGISTRY
+    return web.Response(body=REGISTRY.render().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/", index)
+    app.router.add_get("/status", status)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+def main():
+    # FLASK_* kept as fallbacks for existing deployments
+    host = os.getenv("HTTP_HOST") or os.getenv("FLASK_HOST", "0.0.0.0")
+    port = int(os.getenv("HTTP_PORT") or os.getenv("FLASK_PORT", 8080))
+    workers = int(os.getenv("BOT_WORKERS", 1))
     try:
-        from app.bot import start_polling
-        start_polling()
-    except Exception as e:
-        print("Erro ao iniciar o bot:", e)
+        if workers > 1:
+            # the bot runs in worker processes; this one only routes updates
+            from app.workers import Supervisor
+            app = web.Application()
+            app.router.add_get("/", index)
+            asyncio.run(Supervisor(workers).run(app, host, port))
+        else:
+            # Import here so the module can be imported without loading the bot
+            from app.bot import run
+            asyncio.run(run(create_app(), host, port))
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
-    # Start bot in a thread
-    t = threading.Thread(target=start_bot, daemon=True)
-    t.start()
-    # Run Flask (blocking)
-    run_flask()
+    main()
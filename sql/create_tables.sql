@@ -1,4 +1,7 @@
--- SQL example to create required tables in Supabase (Postgres)
+-- Current schema in one file, for new databases (Supabase SQL editor or
+-- scripts/run_sql_file.py). Existing databases are upgraded with
+-- `python scripts/migrate.py`, which applies sql/migrations in order; keep
+-- this file in sync with them.
 
 create table if not exists users (
   id serial primary key,
@@ -7,7 +10,7 @@ create table if not exists users (
   plano text,
   limite_diario int,
   geracoes_hoje int default 0,
-  ultima_geracao text
+  ultima_geracao date
 );
 
 create table if not exists logs (
@@ -18,14 +21,119 @@ create table if not exists logs (
   resultado text,
   data timestamptz default now()
 );
+create index if not exists logs_telegram_id_data_idx on logs (telegram_id, data desc);
+create index if not exists logs_data_idx on logs (data);
 
 create table if not exists planos (
   id serial primary key,
-  nome text,
+  nome text unique,
   limite int,
   preco numeric
 );
 
 -- Insert default planos
-insert into planos (nome, limite, preco) values ('Free', 5, 0) on conflict do nothing;
-insert into planos (nome, limite, preco) values ('Pro', 50, 9.99) on conflict do nothing;
+insert into planos (nome, limite, preco) values ('Free', 5, 0), ('Pro', 50, 9.99)
+  on conflict (nome) do nothing;
+
+-- Atomic quota reservation: day rollover + counter increment in one statement.
+-- status is 'ok' (slot reserved), 'limit' (daily limit reached) or 'not_found'.
+-- The bot passes the day as text.
+create or replace function reserve_generation(p_telegram_id bigint, p_today text)
+returns table (status text, usados int, limite int, plano_usuario text)
+language plpgsql as $$
+declare
+  v_today date := p_today::date;
+begin
+  return query
+    with reserved as (
+      update users u
+         set geracoes_hoje = case when u.ultima_geracao is distinct from v_today then 1
+                                  else coalesce(u.geracoes_hoje, 0) + 1 end,
+             ultima_geracao = v_today
+       where u.telegram_id = p_telegram_id
+         and (case when u.ultima_geracao is distinct from v_today then 0
+                   else coalesce(u.geracoes_hoje, 0) end) < u.limite_diario
+      returning u.geracoes_hoje, u.limite_diario, u.plano
+    )
+    select 'ok'::text, r.geracoes_hoje, r.limite_diario, r.plano from reserved r;
+  if found then
+    return;
+  end if;
+
+  return query
+    select 'limit'::text, u.geracoes_hoje, u.limite_diario, u.plano
+      from users u where u.telegram_id = p_telegram_id;
+  if found then
+    return;
+  end if;
+
+  return query select 'not_found'::text, null::int, null::int, null::text;
+end;
+$$;
+
+-- Hand a reserved slot back (failed generation). No-op after a day rollover.
+create or replace function release_generation(p_telegram_id bigint, p_today text)
+returns void
+language sql as $$
+  update users
+     set geracoes_hoje = geracoes_hoje - 1
+   where telegram_id = p_telegram_id
+     and ultima_geracao = p_today::date
+     and geracoes_hoje > 0;
+$$;
+
+-- Daily usage rollup (see sql/migrations/0003_usage_daily.sql)
+create table if not exists usage_daily (
+  dia date not null,
+  tipo text not null,
+  plano text not null default '',
+  total bigint not null default 0,
+  primary key (dia, tipo, plano)
+);
+
+-- Add the counts of one batch of logs:
+-- [{"dia": "2026-01-01", "tipo": "text", "plano": "Free", "total": 3}, ...]
+create or replace function add_usage(p_rows jsonb)
+returns void
+language sql as $$
+  insert into usage_daily (dia, tipo, plano, total)
+  select (r->>'dia')::date, coalesce(r->>'tipo', ''), coalesce(r->>'plano', ''), sum((r->>'total')::bigint)
+    from jsonb_array_elements(p_rows) r
+   group by 1, 2, 3
+  on conflict (dia, tipo, plano) do update set total = usage_daily.total + excluded.total;
+$$;
+
+-- Recompute [p_from, p_to] from logs (backfill, or repair after lost
+-- increments); plans are taken from users as they are now. Failed
+-- generations (tipo 'text_error', ...) are not usage.
+create or replace function rollup_usage(p_from date, p_to date)
+returns int
+language plpgsql as $$
+declare
+  n int;
+begin
+  delete from usage_daily where dia between p_from and p_to;
+  insert into usage_daily (dia, tipo, plano, total)
+  select (l.data at time zone 'utc')::date, coalesce(l.tipo, ''), coalesce(u.plano, ''), count(*)
+    from logs l left join users u on u.telegram_id = l.telegram_id
+   where l.data >= p_from::timestamp at time zone 'utc'
+     and l.data < (p_to + 1)::timestamp at time zone 'utc'
+     and coalesce(l.tipo, '') not like '%!_error' escape '!'
+   group by 1, 2, 3;
+  get diagnostics n = row_count;
+  return n;
+end;
+$$;
+
+-- Migrations already contained in this file
+create table if not exists schema_migrations (
+  version text primary key,
+  name text not null,
+  checksum text,
+  applied_at timestamptz default now()
+);
+insert into schema_migrations (version, name) values
+  ('0001', 'initial'),
+  ('0002', 'indexes_and_types'),
+  ('0003', 'usage_daily')
+  on conflict (version) do nothing;
@@ -0,0 +1,75 @@
+-- Initial schema: users, logs, planos and the quota functions.
+
+create table if not exists users (
+  id serial primary key,
+  telegram_id bigint unique not null,
+  nome text,
+  plano text,
+  limite_diario int,
+  geracoes_hoje int default 0,
+  ultima_geracao text
+);
+
+create table if not exists logs (
+  id serial primary key,
+  telegram_id bigint,
+  tipo text,
+  prompt text,
+  resultado text,
+  data timestamptz default now()
+);
+
+create table if not exists planos (
+  id serial primary key,
+  nome text,
+  limite int,
+  preco numeric
+);
+
+-- Insert default planos
+insert into planos (nome, limite, preco) values ('Free', 5, 0) on conflict do nothing;
+insert into planos (nome, limite, preco) values ('Pro', 50, 9.99) on conflict do nothing;
+
+-- Atomic quota reservation: day rollover + counter increment in one statement.
+-- status is 'ok' (slot reserved), 'limit' (daily limit reached) or 'not_found'.
+create or replace function reserve_generation(p_telegram_id bigint, p_today text)
+returns table (status text, usados int, limite int, plano_usuario text)
+language plpgsql as $$
+begin
+  return query
+    with reserved as (
+      update users u
+         set geracoes_hoje = case when u.ultima_geracao is distinct from p_today then 1
+                                  else coalesce(u.geracoes_hoje, 0) + 1 end,
+             ultima_geracao = p_today
+       where u.telegram_id = p_telegram_id
+         and (case when u.ultima_geracao is distinct from p_today then 0
+                   else coalesce(u.geracoes_hoje, 0) end) < u.limite_diario
+      returning u.geracoes_hoje, u.limite_diario, u.plano
+    )
+    select 'ok'::text, r.geracoes_hoje, r.limite_diario, r.plano from reserved r;
+  if found then
+    return;
+  end if;
+
+  return query
+    select 'limit'::text, u.geracoes_hoje, u.limite_diario, u.plano
+      from users u where u.telegram_id = p_telegram_id;
+  if found then
+    return;
+  end if;
+
+  return query select 'not_found'::text, null::int, null::int, null::text;
+end;
+$$;
+
+-- Hand a reserved slot back (failed generation). No-op after a day rollover.
+create or replace function release_generation(p_telegram_id bigint, p_today text)
+returns void
+language sql as $$
+  update users
+     set geracoes_hoje = geracoes_hoje - 1
+   where telegram_id = p_telegram_id
+     and ultima_geracao = p_today
+     and geracoes_hoje > 0;
+$$;
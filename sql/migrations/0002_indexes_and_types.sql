@@ -0,0 +1,74 @@
+-- Indexes for per-user and per-day log queries, a real date type for
+-- users.ultima_geracao and unique plan names.
+
+create index if not exists logs_telegram_id_data_idx on logs (telegram_id, data desc);
+create index if not exists logs_data_idx on logs (data);
+
+-- the old seed inserts had no key to conflict on and duplicated every run:
+-- keep the oldest row per name, then make names unique
+delete from planos p using planos q where p.nome = q.nome and p.id > q.id;
+do $$
+begin
+  if not exists (select 1 from pg_constraint where conname = 'planos_nome_key') then
+    alter table planos add constraint planos_nome_key unique (nome);
+  end if;
+end;
+$$;
+insert into planos (nome, limite, preco) values ('Free', 5, 0), ('Pro', 50, 9.99)
+  on conflict (nome) do nothing;
+
+-- ultima_geracao: text -> date; anything that is not YYYY-MM-DD becomes null
+do $$
+begin
+  if (select data_type from information_schema.columns
+       where table_schema = current_schema() and table_name = 'users'
+         and column_name = 'ultima_geracao') = 'text' then
+    alter table users alter column ultima_geracao type date
+      using case when ultima_geracao ~ '^\d{4}-\d{2}-\d{2}$' then ultima_geracao::date end;
+  end if;
+end;
+$$;
+
+-- Same signatures (the bot passes the day as text), date comparisons inside.
+create or replace function reserve_generation(p_telegram_id bigint, p_today text)
+returns table (status text, usados int, limite int, plano_usuario text)
+language plpgsql as $$
+declare
+  v_today date := p_today::date;
+begin
+  return query
+    with reserved as (
+      update users u
+         set geracoes_hoje = case when u.ultima_geracao is distinct from v_today then 1
+                                  else coalesce(u.geracoes_hoje, 0) + 1 end,
+             ultima_geracao = v_today
+       where u.telegram_id = p_telegram_id
+         and (case when u.ultima_geracao is distinct from v_today then 0
+                   else coalesce(u.geracoes_hoje, 0) end) < u.limite_diario
+      returning u.geracoes_hoje, u.limite_diario, u.plano
+    )
+    select 'ok'::text, r.geracoes_hoje, r.limite_diario, r.plano from reserved r;
+  if found then
+    return;
+  end if;
+
+  return query
+    select 'limit'::text, u.geracoes_hoje, u.limite_diario, u.plano
+      from users u where u.telegram_id = p_telegram_id;
+  if found then
+    return;
+  end if;
+
+  return query select 'not_found'::text, null::int, null::int, null::text;
+end;
+$$;
+
+create or replace function release_generation(p_telegram_id bigint, p_today text)
+returns void
+language sql as $$
+  update users
+     set geracoes_hoje = geracoes_hoje - 1
+   where telegram_id = p_telegram_id
+     and ultima_geracao = p_today::date
+     and geracoes_hoje > 0;
+$$;
@@ -0,0 +1,44 @@
+-- Daily usage rollup (per day, log type and plan), kept up to date by the
+-- bot as it writes logs, so stats never scan logs.
+
+create table if not exists usage_daily (
+  dia date not null,
+  tipo text not null,
+  plano text not null default '',
+  total bigint not null default 0,
+  primary key (dia, tipo, plano)
+);
+
+-- Add the counts of one batch of logs:
+-- [{"dia": "2026-01-01", "tipo": "text", "plano": "Free", "total": 3}, ...]
+create or replace function add_usage(p_rows jsonb)
+returns void
+language sql as $$
+  insert into usage_daily (dia, tipo, plano, total)
+  select (r->>'dia')::date, coalesce(r->>'tipo', ''), coalesce(r->>'plano', ''), sum((r->>'total')::bigint)
+    from jsonb_array_elements(p_rows) r
+   group by 1, 2, 3
+  on conflict (dia, tipo, plano) do update set total = usage_daily.total + excluded.total;
+$$;
+
+-- Recompute [p_from, p_to] from logs (backfill, or repair after lost
+-- increments); plans are taken from users as they are now. Failed
+-- generations (tipo 'text_error', ...) are not usage.
+create or replace function rollup_usage(p_from date, p_to date)
+returns int
+language plpgsql as $$
+declare
+  n int;
+begin
+  delete from usage_daily where dia between p_from and p_to;
+  insert into usage_daily (dia, tipo, plano, total)
+  select (l.data at time zone 'utc')::date, coalesce(l.tipo, ''), coalesce(u.plano, ''), count(*)
+    from logs l left join users u on u.telegram_id = l.telegram_id
+   where l.data >= p_from::timestamp at time zone 'utc'
+     and l.data < (p_to + 1)::timestamp at time zone 'utc'
+     and coalesce(l.tipo, '') not like '%!_error' escape '!'
+   group by 1, 2, 3;
+  get diagnostics n = row_count;
+  return n;
+end;
+$$;
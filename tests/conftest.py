@@ -0,0 +1,23 @@
+import pytest
+
+from app.services.container import services
+
+
+@pytest.fixture
+def bot_env(tmp_path, monkeypatch):
+    """Network-free settings for driving app.bot; every service is rebuilt
+    from them and dropped again afterwards, and files land in ``tmp_path``."""
+    monkeypatch.setenv("USE_FALLBACK_DB", "true")
+    monkeypatch.setenv("DB_BACKEND", "memory")
+    monkeypatch.setenv("ENABLE_GEMINI_MOCK", "true")
+    monkeypatch.setenv("GEMINI_API_KEY", "")
+    monkeypatch.setenv("STORAGE_LOCAL_DIR", str(tmp_path / "storage"))
+    monkeypatch.setenv("STORAGE_INDEX_PATH", str(tmp_path / "storage_index.jsonl"))
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "bot.sqlite3"))
+    for name in ("TELEGRAM_TOKEN", "SUPABASE_URL", "SUPABASE_KEY", "SHARED_BACKEND_ADDRESS"):
+        monkeypatch.delenv(name, raising=False)
+    services.reset()
+    yield tmp_path
+    if services.built("logger"):
+        services.logger.close()
+    services.reset()
@@ -0,0 +1,147 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from aiogram import Bot
+from aiogram.types import Chat, Message, Update, User
+
+from benchmarks.load_test import FakeSession
+
+
+class RecordingSession(FakeSession):
+    """FakeSession that records API calls and fails sends starting with ``fail_on``."""
+
+    def __init__(self, fail_on: str = None):
+        super().__init__()
+        self.fail_on = fail_on
+        self.sent = []
+
+    async def make_request(self, bot, method, timeout=None):
+        text = getattr(method, "text", None)
+        if self.fail_on and text and text.startswith(self.fail_on):
+            raise RuntimeError("send failed")
+        self.sent.append(method)
+        return await super().make_request(bot, method, timeout)
+
+
+def _update(update_id: int, uid: int, text: str) -> Update:
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=uid, type="private"),
+        from_user=User(id=uid, is_bot=False, first_name="Test"),
+        text=text,
+    ))
+
+
+def _run(botmod, session, *texts, uid=1):
+    async def main():
+        botmod.register_handlers()
+        bot = Bot("123456:test", session=session)
+        for i, text in enumerate(texts):
+            try:
+                await botmod.dp.feed_update(bot, _update(i + 1, uid, text))
+            except RuntimeError:
+                pass
+        await botmod.drain_background()
+    asyncio.run(main())
+
+
+def test_failed_placeholder_send_refunds_the_slot(bot_env):
+    import app.bot as botmod
+
+    _run(botmod, RecordingSession(), "/start")
+    for command in ("/gerar_texto oi", "/gerar_imagem gato", "/gerar_video x"):
+        _run(botmod, RecordingSession(fail_on="Gerando"), command)
+        assert botmod.db.get_user_by_telegram(1).geracoes_hoje == 0, command
+
+
+def test_photo_is_sent_before_the_background_upload(bot_env):
+    import app.bot as botmod
+    from aiogram.methods import SendPhoto
+    from aiogram.types import BufferedInputFile
+    from app.services.container import services
+
+    events = []
+
+    class SlowStorage:
+        async def upload_content(self, bucket, data):
+            events.append("upload started")
+            await asyncio.sleep(0.2)
+            events.append("upload done")
+            return "https://storage/generated/x.png"
+
+    class RecordingLogger:
+        def log(self, telegram_id, tipo, prompt, resultado=None, plano=None):
+            events.append(("log", tipo, resultado))
+
+        def close(self):
+            pass
+
+    class PhotoSession(RecordingSession):
+        async def make_request(self, bot, method, timeout=None):
+            if isinstance(method, SendPhoto):
+                events.append("photo sent")
+            return await super().make_request(bot, method, timeout)
+
+    _run(botmod, RecordingSession(), "/start")
+    services.set("storage", SlowStorage())
+    services.set("logger", RecordingLogger())
+    session = PhotoSession()
+    # _run returns only after drain_background, so the upload has finished
+    _run(botmod, session, "/gerar_imagem gato")
+
+    photo = next(m for m in session.sent if isinstance(m, SendPhoto))
+    assert isinstance(photo.photo, BufferedInputFile)
+    assert events == ["photo sent", "upload started", "upload done",
+                      ("log", "image", "https://storage/generated/x.png")]
+
+
+def test_open_circuit_refunds_the_generation(bot_env):
+    import app.bot as botmod
+    from app.services.container import services
+    from app.services.gemini_service import GeminiAdapter
+
+    class FakeModel:
+        def __init__(self, name):
+            pass
+
+        def generate_content(self, prompt, stream=False):
+            raise AssertionError("the breaker is open")
+
+    gemini = services.gemini
+    gemini.adapter = GeminiAdapter(SimpleNamespace(GenerativeModel=FakeModel), "gemini-test")
+    breaker = gemini.resilience.breaker
+    for _ in range(breaker.min_calls):
+        breaker.record(False)
+
+    session = RecordingSession()
+    _run(botmod, session, "/start", "/gerar_texto oi")
+    assert botmod.db.get_user_by_telegram(1).geracoes_hoje == 0
+    assert any((getattr(m, "text", None) or "").startswith("Erro ao gerar texto: Gemini indisponível") for m in session.sent)
+    # the failure is logged, but /stats does not count it as a generation
+    services.logger.close()
+    assert [log["tipo"] for log in botmod.db.backend.list_logs(1)] == ["text_error"]
+    assert botmod.db.backend.usage_between("2000-01-01", "2999-12-31") == []
+
+
+def test_open_circuit_refunds_an_image_without_a_second_call(bot_env, monkeypatch):
+    import app.bot as botmod
+    from app.services.container import services
+    from app.services.gemini_service import GeminiAdapter
+
+    calls = []
+    gemini = services.gemini
+    monkeypatch.setattr(gemini, "enable_mock", False)
+    gemini.adapter = GeminiAdapter(SimpleNamespace(generate_image=calls.append), "text-bison-001")
+    breaker = gemini.resilience.breaker
+    for _ in range(breaker.min_calls):
+        breaker.record(False)
+
+    session = RecordingSession()
+    _run(botmod, session, "/start", "/gerar_imagem gato")
+    assert calls == []
+    assert botmod.db.get_user_by_telegram(1).geracoes_hoje == 0
+    texts = [getattr(m, "text", None) or "" for m in session.sent]
+    assert any(t.startswith("Erro ao gerar imagem: Gemini indisponível") for t in texts)
+    assert not any(type(m).__name__ == "SendPhoto" for m in session.sent)
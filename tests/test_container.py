@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+
+from app.services.container import ServiceContainer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds for importing app.bot on top of aiogram itself (measured ~0.05s)
+IMPORT_BUDGET = float(os.getenv("IMPORT_BUDGET_SECONDS", 0.5))
+
+_PROBE = """
+import json, sys, time
+import aiogram, aiogram.types  # the framework is not ours to budget
+start = time.perf_counter()
+import app.bot
+from app.services.container import services
+elapsed = time.perf_counter() - start
+services.limiter, services.logger  # mock-only services still avoid the SDKs
+print(json.dumps({
+    "seconds": elapsed,
+    "heavy": [m for m in ("supabase", "google.generativeai") if m in sys.modules],
+    "built": [n for n in ("db", "gemini", "storage") if services.built(n)],
+}))
+"""
+
+
+def test_import_app_bot_within_budget():
+    env = dict(os.environ, USE_FALLBACK_DB="true", GEMINI_API_KEY="", TELEGRAM_TOKEN="")
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", _PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    assert result["heavy"] == []
+    assert result["built"] == ["db"]
+    assert result["seconds"] < IMPORT_BUDGET, result
+
+
+def test_services_are_built_once_and_shared():
+    built = []
+    c = ServiceContainer()
+    c.register("db", lambda c: built.append("db") or object())
+    c.register("limiter", lambda c: ("limiter", c.db))
+    lazy = c.lazy("limiter")
+    assert built == [] and not c.built("limiter")
+    assert lazy.count("limiter") == 1  # attribute access builds it
+    assert c.limiter[1] is c.db
+    assert built == ["db"]
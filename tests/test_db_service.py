@@ -0,0 +1,59 @@
+from app.services.db_service import DBService
+from app.services.limiter_service import LimiterService
+
+
+def _user(telegram_id, **extra):
+    user = {
+        "telegram_id": telegram_id,
+        "nome": "Test",
+        "plano": "Free",
+        "limite_diario": 5,
+        "geracoes_hoje": 0,
+        "ultima_geracao": None,
+    }
+    user.update(extra)
+    return user
+
+
+def test_user_cache_hits_and_write_through():
+    db = DBService()
+    db.create_user(_user(1))
+
+    assert db.get_user_by_telegram(1).plano == "Free"
+    assert db.get_user_by_telegram(1).plano == "Free"
+    assert db.cache_stats()["hits"] == 2
+
+    db.update_user(1, {"plano": "Pro"})
+    assert db.get_user_by_telegram(1).plano == "Pro"
+
+    # callers mutating the returned User must not poison the cache
+    user = db.get_user_by_telegram(1)
+    user.geracoes_hoje = 99
+    assert db.get_user_by_telegram(1).geracoes_hoje == 0
+
+    LimiterService(db).reserve(1)
+    assert db.get_user_by_telegram(1).geracoes_hoje == 1
+
+    assert db.get_user_by_telegram(2) is None
+    assert db.cache_stats()["misses"] >= 1
+
+
+def test_memory_backend_mirrors_supabase_semantics():
+    db = DBService()
+    row = db.create_user({"telegram_id": 7, "nome": "A", "plano": "Free", "limite_diario": 5})
+    assert row["id"] == 1 and row["geracoes_hoje"] == 0 and row["ultima_geracao"] is None
+
+    # telegram_id is unique, updates return the list of touched rows
+    assert db.create_user({"telegram_id": 7, "nome": "B"}) == {}
+    assert db.update_user(7, {"nome": "C"})[0]["nome"] == "C"
+    assert db.update_user(8, {"nome": "C"}) == []
+    assert db.backend.count_users() == 1
+
+
+def test_memory_logs_are_bounded():
+    from app.services.memory_backend import MemoryBackend
+
+    backend = MemoryBackend(max_logs=3)
+    backend.insert_logs([{"telegram_id": i % 2, "tipo": "text", "prompt": str(i)} for i in range(5)])
+    assert [r["prompt"] for r in backend.list_logs()] == ["4", "3", "2"]
+    assert [r["prompt"] for r in backend.list_logs(telegram_id=0)] == ["4", "2"]
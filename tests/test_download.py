@@ -0,0 +1,61 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.download_service import DownloadError, ImageDownloader
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 2048
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body, ctype, length = PNG, "image/png", True
+        if self.path == "/page":
+            body, ctype = b"<html></html>", "text/html"
+        elif self.path == "/chunked":
+            # no Content-Length: only the streaming guard can stop it
+            length = False
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        if length:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for _ in range(4):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(body), body))
+            self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_downloads_images_and_refuses_other_content(server):
+    dl = ImageDownloader(timeout=5, max_bytes=4096)
+    assert dl.fetch(f"{server}/img.png") == PNG
+    assert dl.fetch(f"{server}/again.png") == PNG
+    with pytest.raises(DownloadError):
+        dl.fetch(f"{server}/page")
+    assert dl.stats()["downloads"] == 2 and dl.stats()["refused"] == 1
+
+
+def test_streaming_guard_stops_oversized_bodies(server):
+    dl = ImageDownloader(timeout=5, max_bytes=4096)
+    with pytest.raises(DownloadError):
+        dl.fetch(f"{server}/chunked")
+    small = ImageDownloader(timeout=5, max_bytes=1024)
+    with pytest.raises(DownloadError):
+        small.fetch(f"{server}/img.png")
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import time
+
+from app.services.executor_service import ExecutorService, ExecutorBusyError, AsyncProxy
+
+
+class SlowService:
+    def work(self, x):
+        time.sleep(0.05)
+        return x, threading.current_thread().name
+
+
+def test_proxy_runs_off_loop_and_reports_stats():
+    executor = ExecutorService(max_workers=4, max_queue=4)
+    svc = AsyncProxy(SlowService(), executor)
+
+    async def main():
+        results = await asyncio.gather(*(svc.work(i) for i in range(8)))
+        return results
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+
+    assert [r[0] for r in results] == list(range(8))
+    assert all(name.startswith("svc") for _, name in results)
+    # 8 calls of 50ms on 4 threads should take ~2 rounds, not 8
+    assert elapsed < 0.3
+    stats = executor.stats()
+    assert stats["completed"] == 8
+    assert stats["running"] == 0 and stats["queued"] == 0
+    executor.shutdown()
+
+
+def test_rejects_when_queue_full():
+    executor = ExecutorService(max_workers=1, max_queue=1)
+    svc = AsyncProxy(SlowService(), executor)
+
+    async def main():
+        return await asyncio.gather(*(svc.work(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert sum(isinstance(r, ExecutorBusyError) for r in results) == 1
+    assert executor.stats()["rejected"] == 1
+    executor.shutdown()
@@ -0,0 +1,131 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.gemini_service import GeminiAdapter, GeminiService
+from app.utils.resilience import CircuitOpenError
+
+
+def test_prefers_generative_model_and_builds_it_once():
+    built = []
+
+    class FakeModel:
+        def __init__(self, name):
+            built.append(name)
+
+        def generate_content(self, prompt, stream=False):
+            return [SimpleNamespace(text=prompt)] if stream else SimpleNamespace(text=prompt.upper())
+
+    sdk = SimpleNamespace(GenerativeModel=FakeModel, generate_text=lambda **kw: "legacy")
+    adapter = GeminiAdapter(sdk, "gemini-test")
+    assert adapter.text("oi").text == "OI"
+    assert adapter.text("tudo bem").text == "TUDO BEM"
+    assert [c.text for c in adapter.stream("x")] == ["x"]
+    assert built == ["gemini-test"]
+    assert adapter.describe() == {"text": "GenerativeModel.generate_content", "image": None}
+
+
+def test_legacy_paths_resolve_to_a_single_call():
+    calls = []
+
+    def generate_image(prompt):
+        calls.append(prompt)
+        return b"png"
+
+    sdk = SimpleNamespace(generate_text=lambda model, prompt: f"{model}:{prompt}", generate_image=generate_image)
+    adapter = GeminiAdapter(sdk, "text-bison-001")
+    assert adapter.text("a") == "text-bison-001:a"
+    assert not adapter.supports_stream
+    assert adapter.image("gato") == b"png"
+    assert calls == ["gato"]
+
+
+def _open_circuit(service):
+    breaker = service.resilience.breaker
+    for _ in range(breaker.min_calls):
+        breaker.record(False)
+    assert breaker.state == "open"
+
+
+def test_open_circuit_raises_instead_of_mocking(monkeypatch):
+    monkeypatch.setenv("ENABLE_GEMINI_MOCK", "true")
+    monkeypatch.setenv("GEN_CACHE", "true")
+
+    class FakeModel:
+        def __init__(self, name):
+            pass
+
+        def generate_content(self, prompt, stream=False):
+            return SimpleNamespace(text="resposta")
+
+    service = GeminiService(api_key="")
+    service.adapter = GeminiAdapter(SimpleNamespace(GenerativeModel=FakeModel), "gemini-test")
+    assert service.generate_text("a") == "resposta"
+    service.store_text("a", "resposta")
+    _open_circuit(service)
+
+    # a real earlier answer is still served; anything else fails so the slot is refunded
+    assert service.generate_text("a") == "resposta"
+    with pytest.raises(CircuitOpenError):
+        service.generate_text("b")
+    with pytest.raises(CircuitOpenError):
+        list(service.stream_text("b"))
+
+
+def test_default_text_model_matches_the_sdk_path():
+    class FakeModel:
+        def __init__(self, name):
+            self.name = name
+
+    adapter = GeminiAdapter(SimpleNamespace(GenerativeModel=FakeModel))
+    assert adapter.model.name == adapter.text_model == "gemini-1.5-flash"
+    legacy = GeminiAdapter(SimpleNamespace(generate_text=lambda model, prompt: model))
+    assert legacy.text("a") == legacy.text_model == "text-bison-001"
+
+
+def test_warmup_is_bounded_by_the_deadline(monkeypatch):
+    monkeypatch.setenv("GEMINI_WARMUP", "true")
+    monkeypatch.setenv("GEMINI_DEADLINE", "0.2")
+    release = threading.Event()
+
+    class HungModel:
+        def __init__(self, name):
+            pass
+
+        def generate_content(self, prompt, stream=False):
+            release.wait(5)
+
+    service = GeminiService(api_key="")
+    service.adapter = GeminiAdapter(SimpleNamespace(GenerativeModel=HungModel))
+    started = time.monotonic()
+    assert service.warmup() is False
+    assert time.monotonic() - started < 2
+    assert service.resilience.timeouts == 1
+    release.set()
+
+
+def test_image_errors_are_raised_and_the_open_circuit_fails_fast(monkeypatch):
+    monkeypatch.setenv("ENABLE_GEMINI_MOCK", "false")
+    monkeypatch.setenv("GEN_CACHE", "true")
+    monkeypatch.setenv("GEMINI_RETRIES", "0")
+    calls = []
+
+    def generate_image(prompt):
+        calls.append(prompt)
+        return b"png" if prompt == "gato" else b""
+
+    service = GeminiService(api_key="")
+    service.adapter = GeminiAdapter(SimpleNamespace(generate_image=generate_image), "text-bison-001")
+    assert service.generate_image_cached("gato") == (b"png", False)
+    # an empty answer is an error, never an empty photo
+    with pytest.raises(RuntimeError):
+        service.generate_image("nada")
+
+    _open_circuit(service)
+    calls.clear()
+    assert service.generate_image("gato") == b"png"
+    with pytest.raises(CircuitOpenError):
+        service.generate_image_cached("cachorro")
+    assert calls == []
@@ -28,3 +28,52 @@ def test_limiter_resets_and_blocks():
     ok, msg = limiter.can_generate(12345)
     assert not ok
     assert "limite diário" in msg
+
+
+def _make_user(db, telegram_id, limite=2, geracoes=0, ultima=None):
+    db.create_user({
+        "telegram_id": telegram_id,
+        "nome": "Test",
+        "plano": "Free",
+        "limite_diario": limite,
+        "geracoes_hoje": geracoes,
+        "ultima_geracao": ultima,
+    })
+
+
+def test_reserve_commit_refund():
+    db = DBService()
+    limiter = LimiterService(db)
+    _make_user(db, 111, limite=1, geracoes=1, ultima="2000-01-01")
+
+    # day rollover resets the counter inside the same call
+    r = limiter.reserve(111)
+    assert r.ok
+    assert not limiter.reserve(111).ok
+
+    # a failed generation gives the slot back
+    assert limiter.refund(r)
+    assert not limiter.refund(r)
+    r2 = limiter.reserve(111)
+    assert r2.ok
+    limiter.commit(r2)
+    assert not limiter.refund(r2)
+    assert db.get_user_by_telegram(111).geracoes_hoje == 1
+
+    r3 = limiter.reserve(999)
+    assert not r3.ok
+    assert "/start" in r3.message
+
+
+def test_reserve_has_no_overshoot_under_concurrency():
+    from concurrent.futures import ThreadPoolExecutor
+
+    db = DBService()
+    limiter = LimiterService(db)
+    _make_user(db, 222, limite=5)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: limiter.reserve(222), range(100)))
+
+    assert sum(r.ok for r in results) == 5
+    assert db.get_user_by_telegram(222).geracoes_hoje == 5
@@ -0,0 +1,19 @@
+import asyncio
+
+from benchmarks.load_test import parse_latency, run_benchmark
+
+
+def test_latency_specs():
+    assert parse_latency("fixed:0.2")() == 0.2
+    assert 0.1 <= parse_latency("uniform:0.1,0.3")() <= 0.3
+
+
+def test_harness_drives_the_dispatcher(bot_env):
+    # bot_env restores the environment and the service container afterwards
+    result = asyncio.run(run_benchmark([4], updates=12, users=6, text_latency="fixed:0", image_latency="fixed:0"))
+    level = result["levels"][0]
+    assert level["updates"] == 12 and level["errors"] == 0
+    assert level["telegram_calls"] >= 12
+    assert level["latency"]["p99_ms"] is not None
+    # generated images were stored under tmp_path, not in the working tree
+    assert any((bot_env / "storage").rglob("*.png"))
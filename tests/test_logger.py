@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from app.services.db_service import DBService
+from app.services.logger_service import LoggerService
+
+
+class RecordingDB:
+    def __init__(self):
+        self.calls = []
+        self.usage = []
+
+    def insert_logs(self, logs):
+        self.calls.append(list(logs))
+        return logs
+
+    def add_usage(self, rows):
+        self.usage.extend(rows)
+
+
+def test_logs_are_flushed_in_batches():
+    db = RecordingDB()
+    logger = LoggerService(db, batch_size=10, flush_interval=5)
+    for i in range(25):
+        logger.log(i, "text", "p")
+
+    # two full batches go out without waiting for the interval
+    deadline = time.monotonic() + 2
+    while len(db.calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [len(c) for c in db.calls] == [10, 10]
+
+    # shutdown flushes the remainder
+    logger.close()
+    assert sum(len(c) for c in db.calls) == 25
+    assert logger.stats()["flushed"] == 25
+
+
+def test_interval_flush_and_drop_policy():
+    db = RecordingDB()
+    logger = LoggerService(db, batch_size=100, flush_interval=0.05, max_queue=3, drop_policy="newest")
+    for i in range(5):
+        logger.log(i, "text", "p")
+    assert logger.stats()["dropped"] == 2
+
+    deadline = time.monotonic() + 2
+    while not db.calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [e["telegram_id"] for e in db.calls[0]] == [0, 1, 2]
+    logger.close()
+
+
+def test_block_policy_never_waits_on_the_event_loop(monkeypatch):
+    monkeypatch.setenv("LOG_BLOCK_TIMEOUT", "5")
+    db = RecordingDB()
+    logger = LoggerService(db, batch_size=100, flush_interval=60, max_queue=2, drop_policy="block")
+    logger.log(0, "text", "p")
+    logger.log(1, "text", "p")
+
+    async def handler():
+        logger.log(2, "text", "p")
+
+    started = time.monotonic()
+    asyncio.run(handler())
+    # dropped right away instead of stalling the loop for LOG_BLOCK_TIMEOUT
+    assert time.monotonic() - started < 1
+    assert logger.stats()["dropped"] == 1
+    logger.close()
+    assert [e["telegram_id"] for e in db.calls[0]] == [0, 1]
+
+
+def test_failed_flush_is_not_counted_or_rolled_up(monkeypatch):
+    monkeypatch.setenv("USE_FALLBACK_DB", "true")
+    monkeypatch.setenv("DB_BACKEND", "memory")
+    monkeypatch.delenv("SHARED_BACKEND_ADDRESS", raising=False)
+    db = DBService()
+
+    def broken(logs):
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(db.backend, "insert_logs", broken)
+    logger = LoggerService(db, batch_size=100, flush_interval=60)
+    logger.log(1, "text", "p", plano="Free")
+    logger.close()
+    assert logger.stats()["flushed"] == 0
+    assert db.usage_between("2000-01-01", "2999-12-31") == []
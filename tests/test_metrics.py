@@ -0,0 +1,55 @@
+from app.utils.metrics import Registry, merge_expositions, timed
+
+
+def test_histogram_buckets_are_cumulative():
+    reg = Registry()
+    h = reg.histogram("op_seconds", "latency", ("op",), buckets=(0.1, 1.0))
+    h.observe(0.05, op="read")
+    h.observe(0.5, op="read")
+    h.observe(5, op="read")
+    text = reg.render()
+    assert '# TYPE op_seconds histogram' in text
+    assert 'op_seconds_bucket{op="read",le="0.1"} 1' in text
+    assert 'op_seconds_bucket{op="read",le="1"} 2' in text
+    assert 'op_seconds_bucket{op="read",le="+Inf"} 3' in text
+    assert 'op_seconds_count{op="read"} 3' in text
+
+
+def test_counters_gauges_and_timed():
+    reg = Registry()
+    c = reg.counter("rejections_total", "refused", ("reason",))
+    c.inc(reason="limit")
+    c.inc(reason="limit")
+    reg.gauge("queue_depth", "waiting", lambda: 7)
+    h = reg.histogram("call_seconds", "calls")
+
+    @timed(h)
+    def work():
+        return 42
+
+    assert work() == 42
+    text = reg.render()
+    assert 'rejections_total{reason="limit"} 2' in text
+    assert "queue_depth 7" in text
+    assert h.count() == 1
+
+
+def test_worker_expositions_merge_under_one_header():
+    texts = {}
+    for worker in ("0", "1"):
+        reg = Registry()
+        reg.counter("errors_total", "errors", ("where",)).inc(where="db")
+        reg.histogram("call_seconds", "calls", buckets=(1.0,)).observe(0.5)
+        reg.gauge("queue_depth", "waiting", lambda: 3)
+        texts[worker] = reg.render()
+
+    text = merge_expositions(texts)
+    assert text.count("# TYPE errors_total counter") == 1
+    assert 'errors_total{worker="0",where="db"} 1' in text
+    assert 'errors_total{worker="1",where="db"} 1' in text
+    assert 'call_seconds_bucket{worker="1",le="+Inf"} 1' in text
+    assert 'queue_depth{worker="0"} 3' in text
+    # samples of one metric stay together, right after their header
+    lines = text.splitlines()
+    start = lines.index("# TYPE queue_depth gauge")
+    assert lines[start + 1:start + 3] == ['queue_depth{worker="0"} 3', 'queue_depth{worker="1"} 3']
@@ -0,0 +1,77 @@
+import os
+import re
+import uuid
+
+import pytest
+
+from scripts.migrate import discover, explain_check, migrate, plan_nodes, uses_index
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def test_migrations_are_ordered_and_match_the_schema_snapshot(tmp_path):
+    migrations = discover()
+    versions = [m.version for m in migrations]
+    assert versions == sorted(versions) and versions[:2] == ["0001", "0002"]
+
+    # create_tables.sql must record exactly the migrations it contains
+    with open(os.path.join(ROOT, "sql", "create_tables.sql"), encoding="utf-8") as f:
+        snapshot = f.read()
+    recorded = re.findall(r"\('(\d{4})', '(\w+)'\)", snapshot)
+    assert recorded == [(m.version, m.name) for m in migrations]
+
+    (tmp_path / "1_bad.sql").write_text("select 1")
+    with pytest.raises(ValueError):
+        discover(str(tmp_path))
+
+
+def test_plan_walk_finds_index_nodes():
+    plan = {"Node Type": "Limit", "Plans": [
+        {"Node Type": "Index Scan", "Index Name": "logs_telegram_id_data_idx"},
+    ]}
+    assert plan_nodes(plan) == ["Limit", "Index Scan"]
+    assert uses_index(plan_nodes(plan))
+    assert not uses_index(["Aggregate", "Seq Scan"])
+
+
+@pytest.fixture
+def pg_conn():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    import psycopg2
+
+    schema = f"bot_migrate_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(TEST_DATABASE_URL)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"create schema {schema}")
+    conn = psycopg2.connect(TEST_DATABASE_URL, options=f"-csearch_path={schema}")
+    try:
+        yield conn
+    finally:
+        conn.close()
+        with admin.cursor() as cur:
+            cur.execute(f"drop schema {schema} cascade")
+        admin.close()
+
+
+def test_migrations_upgrade_an_old_schema(pg_conn):
+    migrations = discover()
+    migrate(pg_conn, migrations[:1])
+    with pg_conn, pg_conn.cursor() as cur:
+        # what re-running the old create_tables.sql used to leave behind
+        cur.execute("insert into planos (nome, limite, preco) values ('Free', 5, 0)")
+        cur.execute("insert into users (telegram_id, limite_diario, ultima_geracao)"
+                    " values (1, 5, '2026-01-01'), (2, 5, 'garbage')")
+
+    assert [m.version for m in migrate(pg_conn, migrations)] == [m.version for m in migrations[1:]]
+    assert migrate(pg_conn, migrations) == []
+    with pg_conn, pg_conn.cursor() as cur:
+        cur.execute("select count(*) from planos where nome = 'Free'")
+        assert cur.fetchone()[0] == 1
+        cur.execute("select telegram_id, ultima_geracao::text from users order by telegram_id")
+        assert cur.fetchall() == [(1, "2026-01-01"), (2, None)]
+        cur.execute("select status from reserve_generation(1, '2026-01-01')")
+        assert cur.fetchone()[0] == "ok"
+    assert all(ok for _, ok, _ in explain_check(pg_conn))
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+from app.services.outbound_service import HIGH, LOW, OutboundLimiter, send_priority
+
+
+def test_final_results_overtake_placeholders():
+    limiter = OutboundLimiter(global_rate=20, chat_rate=100)
+    limiter._global.tokens = 0  # start with an empty global bucket
+    order = []
+
+    async def make_request(bot, method):
+        order.append(method.text)
+        return True
+
+    async def send(chat_id, text, level):
+        with send_priority(level):
+            await limiter(make_request, None, SendMessage(chat_id=chat_id, text=text))
+
+    async def main():
+        placeholders = [asyncio.ensure_future(send(i, f"gerando {i}", LOW)) for i in range(1, 4)]
+        await asyncio.sleep(0)
+        await asyncio.gather(send(9, "resultado", HIGH), *placeholders)
+
+    asyncio.run(main())
+    assert order[0] == "resultado"
+    assert limiter.stats()["sent"] == 4
+
+
+def test_per_chat_bucket_paces_one_chat_only():
+    limiter = OutboundLimiter(global_rate=1000, chat_rate=10)
+    limiter.chat_burst = 1
+    done = {}
+
+    async def make_request(bot, method):
+        done.setdefault(method.chat_id, []).append(time.monotonic())
+        return True
+
+    async def main():
+        start = time.monotonic()
+        sends = [limiter(make_request, None, SendMessage(chat_id=1, text="x")) for _ in range(3)]
+        sends.append(limiter(make_request, None, SendMessage(chat_id=2, text="y")))
+        await asyncio.gather(*sends)
+        return start
+
+    start = asyncio.run(main())
+    assert done[2][0] - start < 0.05
+    assert done[1][-1] - start >= 0.15
+
+
+def test_retry_after_pauses_and_retries():
+    limiter = OutboundLimiter(global_rate=100, chat_rate=100)
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=0.1)
+        return True
+
+    async def main():
+        assert await limiter(make_request, None, SendMessage(chat_id=5, text="oi")) is True
+        # calls without a chat are not queued
+        assert await limiter(make_request, None, GetMe()) is True
+
+    asyncio.run(main())
+    assert calls[1] - calls[0] >= 0.1
+    assert limiter.stats()["retried"] == 1
+
+
+def test_close_cancels_the_pump():
+    limiter = OutboundLimiter(global_rate=100, chat_rate=100)
+
+    async def make_request(bot, method):
+        return True
+
+    async def main():
+        await limiter(make_request, None, SendMessage(chat_id=1, text="oi"))
+        pump = limiter._pump_task
+        assert not pump.done()
+        await limiter.close()
+        assert pump.cancelled()
+        return asyncio.all_tasks() - {asyncio.current_task()}
+
+    assert asyncio.run(main()) == set()
@@ -0,0 +1,84 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.db_service import BackendUnavailableError, DBService
+from app.services.memory_backend import MemoryBackend
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+SCHEMA_SQL = os.path.join(os.path.dirname(os.path.dirname(__file__)), "sql", "create_tables.sql")
+
+
+def test_unreachable_postgres_fails_loudly(monkeypatch):
+    monkeypatch.setenv("DB_BACKEND", "postgres")
+    monkeypatch.setenv("DATABASE_URL", "postgresql://bot@127.0.0.1:1/none?connect_timeout=1")
+    monkeypatch.setenv("USE_FALLBACK_DB", "true")
+    with pytest.raises(BackendUnavailableError):
+        DBService()
+
+
+def test_default_backend_still_falls_back_to_memory(monkeypatch):
+    monkeypatch.delenv("DB_BACKEND", raising=False)
+    monkeypatch.delenv("SHARED_BACKEND_ADDRESS", raising=False)
+    monkeypatch.setenv("USE_FALLBACK_DB", "true")
+    assert isinstance(DBService().backend, MemoryBackend)
+
+
+@pytest.fixture
+def pg_backend():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    import psycopg2
+    from app.services.postgres_backend import PostgresBackend
+
+    # a throwaway schema keeps the test away from real tables
+    schema = f"bot_test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(TEST_DATABASE_URL)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"create schema {schema}")
+        cur.execute(f"set search_path to {schema}")
+        with open(SCHEMA_SQL, encoding="utf-8") as f:
+            cur.execute(f.read())
+    backend = PostgresBackend(TEST_DATABASE_URL, minconn=1, maxconn=4, options=f"-csearch_path={schema}")
+    try:
+        yield backend
+    finally:
+        backend.close()
+        with admin.cursor() as cur:
+            cur.execute(f"drop schema {schema} cascade")
+        admin.close()
+
+
+def test_postgres_users_quota_and_logs(pg_backend):
+    row = pg_backend.insert_user({"telegram_id": 10, "nome": "a", "plano": "Free", "limite_diario": 3})
+    assert row["telegram_id"] == 10
+    assert pg_backend.get_user(10)["nome"] == "a"
+    assert pg_backend.update_user(10, {"nome": "b"})[0]["nome"] == "b"
+    with pytest.raises(ValueError):
+        pg_backend.update_user(10, {"nope": 1})
+
+    # concurrent reservations never exceed the limit
+    with ThreadPoolExecutor(8) as pool:
+        statuses = [r["status"] for r in pool.map(lambda _: pg_backend.reserve_generation(10, "2026-01-01"), range(10))]
+    assert statuses.count("ok") == 3
+    pg_backend.release_generation(10, "2026-01-01")
+    assert pg_backend.get_user(10)["geracoes_hoje"] == 2
+    assert pg_backend.reserve_generation(99, "2026-01-01")["status"] == "not_found"
+
+    rows = pg_backend.insert_logs([
+        {"telegram_id": 10, "tipo": "texto", "prompt": "p1", "resultado": "r1"},
+        {"telegram_id": 10, "tipo": "imagem", "prompt": "p2", "resultado": None},
+    ])
+    assert [r["prompt"] for r in rows] == ["p1", "p2"]
+    assert rows[0]["data"]
+    assert len(pg_backend.list_logs(10)) == 2
+    assert {p["nome"] for p in pg_backend.list_planos()} >= {"Free", "Pro"}
+
+    pg_backend.add_usage([{"dia": "2026-01-01", "tipo": "texto", "plano": "Free", "total": 2}])
+    pg_backend.add_usage([{"dia": "2026-01-01", "tipo": "texto", "plano": "Free", "total": 3}])
+    assert pg_backend.usage_between("2026-01-01", "2026-01-07") == [
+        {"dia": "2026-01-01", "tipo": "texto", "plano": "Free", "total": 5},
+    ]
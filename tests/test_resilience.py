@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from app.utils.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+def _caller(monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(f"TEST_{name}", str(value))
+    return ResilientCaller("TEST", pool_size=4)
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    cb = CircuitBreaker(window=4, error_rate=0.5, min_calls=4, cooldown=0.05)
+    for ok in (True, False, True, False):
+        assert cb.allow()
+        cb.record(ok)
+    assert cb.state == "open"
+    assert not cb.allow()
+
+    time.sleep(0.06)
+    assert cb.allow()
+    assert not cb.allow()  # only one trial while half-open
+    cb.record(True)
+    assert cb.state == "closed"
+
+
+def test_retryable_errors_are_retried(monkeypatch):
+    caller = _caller(monkeypatch, BACKOFF=0.01)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert caller.call(flaky) == "ok"
+    assert caller.stats()["retried"] == 1
+
+
+def test_other_errors_fail_without_retry(monkeypatch):
+    caller = _caller(monkeypatch, BACKOFF=0.01)
+    attempts = []
+
+    def bad():
+        attempts.append(1)
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        caller.call(bad)
+    assert len(attempts) == 1
+
+
+def test_deadline_and_open_circuit(monkeypatch):
+    caller = _caller(monkeypatch, DEADLINE=0.05, CB_MIN_CALLS=1, CB_WINDOW=1)
+    with pytest.raises(TimeoutError):
+        caller.call(lambda: time.sleep(0.3))
+    with pytest.raises(CircuitOpenError):
+        caller.call(lambda: "never runs")
+
+
+def test_hedge_wins_over_slow_primary(monkeypatch):
+    caller = _caller(monkeypatch, HEDGE=0.02)
+    calls = []
+
+    def sometimes_slow():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.3)
+            return "slow"
+        return "fast"
+
+    assert caller.call(sometimes_slow) == "fast"
+    stats = caller.stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
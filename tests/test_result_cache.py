@@ -0,0 +1,61 @@
+from app.services.gemini_service import GeminiService
+from app.services.result_cache import ResultCache
+
+
+def test_text_cache_normalizes_prompt(monkeypatch):
+    monkeypatch.setenv("GEN_CACHE", "true")
+    gemini = GeminiService(api_key="")
+    text, hit = gemini.generate_text_cached("Um  gato ")
+    assert not hit
+    again, hit = gemini.generate_text_cached("um gato")
+    assert hit and again == text
+    assert gemini.cache.stats()["text"]["hits"] == 1
+
+
+def test_image_disk_tier_survives_new_process(tmp_path):
+    first = ResultCache(disk_dir=str(tmp_path))
+    first.set("image", "cena fofa", b"png-bytes", "m")
+
+    second = ResultCache(disk_dir=str(tmp_path))
+    assert second.get("image", "cena fofa", "m") == b"png-bytes"
+    assert second.get("image", "cena fofa", "other-model") is None
+    stats = second.stats()
+    assert stats["disk_hits"] == 1 and stats["image"]["misses"] == 1
+
+
+def test_default_ttls_match_env_example(monkeypatch):
+    monkeypatch.delenv("GEN_CACHE_TEXT_TTL", raising=False)
+    monkeypatch.delenv("GEN_CACHE_IMAGE_TTL", raising=False)
+    assert ResultCache(disk_dir="").ttls == {"text": 3600, "image": 86400}
+
+
+def test_image_disk_tier_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEN_CACHE_DISK_MAX_BYTES", "3000")
+    cache = ResultCache(disk_dir=str(tmp_path))
+    for i in range(10):
+        cache.set("image", f"cena {i}", bytes(1000), "m")
+    cache.disk.evict(100)
+    files = [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert sum(p.stat().st_size for p in files) <= 3000
+    # least recently used go first; the newest image is still on disk
+    fresh = ResultCache(disk_dir=str(tmp_path))
+    assert fresh.get("image", "cena 9", "m") == bytes(1000)
+    assert fresh.get("image", "cena 0", "m") is None
+
+
+def test_expired_disk_entry_is_removed(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEN_CACHE_IMAGE_TTL", "60")
+    cache = ResultCache(disk_dir=str(tmp_path))
+    cache.set("image", "cena", b"png", "m")
+    monkeypatch.setattr("app.services.result_cache.time.time", lambda: 10**10)
+    assert ResultCache(disk_dir=str(tmp_path)).get("image", "cena", "m") is None
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_text_results_are_shared_through_the_disk_tier(tmp_path):
+    # two workers pointing at the same GEN_CACHE_DIR
+    first = ResultCache(disk_dir=str(tmp_path))
+    second = ResultCache(disk_dir=str(tmp_path))
+    first.set("text", "Um gato", "miau", "m")
+    assert second.get("text", "um gato", "m") == "miau"
+    assert second.stats()["disk_hits"] == 1
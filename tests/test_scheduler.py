@@ -0,0 +1,51 @@
+import asyncio
+
+from app.services.scheduler_service import GenerationScheduler, SchedulerBusyError
+
+
+def test_pro_jobs_jump_the_free_queue():
+    scheduler = GenerationScheduler(workers=1, max_per_user=5)
+    order = []
+    positions = []
+
+    def job(name):
+        async def run():
+            order.append(name)
+            await asyncio.sleep(0.01)
+            return name
+        return run
+
+    async def on_queued(pos):
+        positions.append(pos)
+
+    async def main():
+        blocker = asyncio.ensure_future(scheduler.submit(1, "Free", job("first")))
+        await asyncio.sleep(0)
+        free = [asyncio.ensure_future(scheduler.submit(10 + i, "Free", job(f"free{i}"), on_queued)) for i in range(3)]
+        await asyncio.sleep(0)
+        pro = asyncio.ensure_future(scheduler.submit(99, "Pro", job("pro"), on_queued))
+        await asyncio.gather(blocker, pro, *free)
+
+    asyncio.run(main())
+    assert order == ["first", "pro", "free0", "free1", "free2"]
+    assert positions[-1] == 1
+    stats = scheduler.stats()
+    assert stats["completed"] == 5 and stats["queue_depth"] == 0
+    assert stats["wait_seconds"]["Pro"]["max"] < stats["wait_seconds"]["Free"]["max"]
+
+
+def test_per_user_cap():
+    scheduler = GenerationScheduler(workers=2, max_per_user=1)
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(scheduler.submit(1, "Free", slow), scheduler.submit(1, "Free", slow),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert results[0] == "ok"
+    assert isinstance(results[1], SchedulerBusyError)
+    assert scheduler.can_submit(1)
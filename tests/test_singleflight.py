@@ -0,0 +1,40 @@
+import asyncio
+
+from app.utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    sf = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "img"
+
+    async def main():
+        return await asyncio.gather(*(sf.do("k", work) for _ in range(20)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["img"] * 20
+    assert sum(shared for _, shared in results) == 19
+    assert sf.stats()["in_flight"] == 0
+
+
+def test_errors_propagate_and_key_is_released():
+    sf = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream")
+
+    async def ok():
+        return 1
+
+    async def main():
+        results = await asyncio.gather(sf.do("k", boom), sf.do("k", boom), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        return await sf.do("k", ok)
+
+    assert asyncio.run(main()) == (1, False)
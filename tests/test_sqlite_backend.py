@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.db_service import BackendUnavailableError, DBService
+from app.services.sqlite_backend import SqliteBackend
+
+
+def test_sqlite_quota_is_atomic_and_survives_restart(tmp_path):
+    path = str(tmp_path / "bot.sqlite3")
+    backend = SqliteBackend(path)
+    backend.insert_user({"telegram_id": 1, "nome": "a", "plano": "Free", "limite_diario": 5})
+
+    with ThreadPoolExecutor(8) as pool:
+        statuses = [r["status"] for r in pool.map(lambda _: backend.reserve_generation(1, "2026-01-01"), range(20))]
+    assert statuses.count("ok") == 5 and statuses.count("limit") == 15
+    backend.release_generation(1, "2026-01-01")
+    backend.insert_logs([{"telegram_id": 1, "tipo": "text", "prompt": f"p{i}"} for i in range(3)])
+    backend.close()
+
+    reopened = SqliteBackend(path)
+    assert reopened.get_user(1)["geracoes_hoje"] == 4
+    assert [r["prompt"] for r in reopened.list_logs(1, limit=2)] == ["p2", "p1"]
+    assert [p["nome"] for p in reopened.list_planos()] == ["Free", "Pro"]
+    assert reopened._connect().execute("pragma journal_mode").fetchone()[0] == "wal"
+    reopened.close()
+
+
+def test_db_service_uses_sqlite_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "db.sqlite3"))
+    db = DBService()
+    assert db.client is None and isinstance(db.backend, SqliteBackend)
+    db.create_user({"telegram_id": 7, "nome": "x", "plano": "Pro", "limite_diario": 1})
+    # duplicate telegram_id is reported like the other backends do
+    assert db.create_user({"telegram_id": 7}) == {}
+    assert db.reserve_generation(7, "2026-01-01")["status"] == "ok"
+    assert db.reserve_generation(7, "2026-01-01")["status"] == "limit"
+    assert db.get_user_by_telegram(7).nome == "x"
+    db.close()
+
+
+def test_bad_sqlite_path_fails_loudly(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "missing-dir" / "bot.sqlite3"))
+    with pytest.raises(BackendUnavailableError):
+        DBService()
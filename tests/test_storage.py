@@ -0,0 +1,69 @@
+import asyncio
+
+import httpx
+
+from app.services.storage_service import StorageService
+
+
+def _storage(monkeypatch, tmp_path, handler):
+    monkeypatch.setenv("SUPABASE_URL", "https://proj.supabase.co")
+    monkeypatch.setenv("SUPABASE_KEY", "key")
+    monkeypatch.setenv("STORAGE_INDEX_PATH", str(tmp_path / "index.jsonl"))
+    return StorageService(db_service=None, transport=httpx.MockTransport(handler))
+
+
+def test_identical_bytes_are_uploaded_once(monkeypatch, tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"Key": request.url.path})
+
+    storage = _storage(monkeypatch, tmp_path, handler)
+
+    async def main():
+        urls = await asyncio.gather(*(storage.upload_content("generated", b"same") for _ in range(5)))
+        urls.append(await storage.upload_content("generated", b"same"))
+        other = await storage.upload_content("generated", b"other")
+        await storage.close()
+        return urls, other
+
+    urls, other = asyncio.run(main())
+    assert len(set(urls)) == 1
+    assert urls[0].startswith("https://proj.supabase.co/storage/v1/object/public/generated/images/")
+    assert other != urls[0]
+    assert len(requests) == 2
+    assert requests[0].headers["x-upsert"] == "false"
+
+    # the index survives a restart, so the next process skips the upload too
+    again = _storage(monkeypatch, tmp_path, handler)
+    assert asyncio.run(again.upload_content("generated", b"same")) == urls[0]
+    assert len(requests) == 2
+
+
+def test_conflict_means_already_stored(monkeypatch, tmp_path):
+    storage = _storage(monkeypatch, tmp_path, lambda r: httpx.Response(409, json={"error": "Duplicate"}))
+    url = asyncio.run(storage.upload_content("generated", b"x"))
+    assert url.endswith(".png")
+    assert storage.stats()["dedup_hits"] == 1
+
+
+def test_local_storage_shards_and_evicts_lru(tmp_path):
+    from app.services.local_storage import LocalStorage
+
+    local = LocalStorage(root=str(tmp_path), max_bytes=300, background=False)
+    paths = [local.put(f"images/{i}.png", b"x" * 100) for i in range(3)]
+    assert all(p.startswith(str(tmp_path)) and p.count("/") > str(tmp_path).count("/") + 2 for p in paths)
+
+    # touch the oldest so the second one becomes the LRU victim
+    assert local.get("images/0.png") == b"x" * 100
+    local.put("images/3.png", b"x" * 100)
+    assert local.evict() == 1
+    assert local.get("images/1.png") is None
+    assert local.get("images/0.png") is not None
+
+    stats = local.stats()
+    assert stats["bytes_used"] == 300 and stats["evicted_files"] == 1
+
+    # a restart rebuilds the accounting from disk
+    assert LocalStorage(root=str(tmp_path), max_bytes=300).stats()["files"] == 3
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+from app.services.executor_service import ExecutorService
+from app.utils.helpers import split_message
+from app.utils.streaming import StreamingReply
+
+
+def test_split_message_prefers_word_breaks():
+    text = ("palavra " * 1200).strip()
+    parts = split_message(text, limit=4096)
+    assert all(len(p) <= 4096 for p in parts)
+    assert " ".join(parts) == text
+    assert split_message("") == [""]
+
+
+class FakeMessage:
+    def __init__(self, sent, text=""):
+        self.sent = sent
+        self.text = text
+        self.edits = []
+
+    async def edit_text(self, text):
+        self.edits.append(text)
+
+    async def answer(self, text):
+        msg = FakeMessage(self.sent, text)
+        self.sent.append(msg)
+        return msg
+
+
+def test_streaming_reply_throttles_edits_and_rolls_over():
+    sent = []
+    placeholder = FakeMessage(sent, "Gerando texto...")
+    executor = ExecutorService(max_workers=2)
+
+    def chunks():
+        for _ in range(100):
+            yield "x" * 99 + " "
+
+    async def main():
+        reply = StreamingReply(placeholder, interval=3600)
+        async for chunk in executor.iterate(chunks):
+            await reply.feed(chunk)
+        return await reply.finish()
+
+    text = asyncio.run(main())
+    assert len(text) == 10000
+    # 10000 chars -> three messages; throttling leaves only the final edits
+    assert len(sent) == 2
+    final_parts = [placeholder.edits[-1]] + [m.edits[-1] for m in sent]
+    assert all(len(p) <= 4096 for p in final_parts)
+    assert "".join(p.replace(" ", "") for p in final_parts) == "x" * 9900
+    assert len(placeholder.edits) <= 2
+    executor.shutdown()
+
+
+def test_iterate_propagates_errors():
+    executor = ExecutorService(max_workers=1)
+
+    def broken():
+        yield "a"
+        raise ValueError("boom")
+
+    async def main():
+        got = []
+        try:
+            async for item in executor.iterate(broken):
+                got.append(item)
+        except ValueError:
+            return got
+        return None
+
+    assert asyncio.run(main()) == ["a"]
+    executor.shutdown()
+
+
+def test_iterate_deadline_stops_a_hung_stream():
+    executor = ExecutorService(max_workers=1)
+    release = threading.Event()
+    produced = []
+
+    def hung():
+        yield "a"
+        release.wait(5)
+        produced.append("b")
+        yield "b"
+        produced.append("c")
+        yield "c"
+
+    async def main():
+        got = []
+        try:
+            async for item in executor.iterate(hung, timeout=0.2):
+                got.append(item)
+        except TimeoutError:
+            return got
+        return None
+
+    assert asyncio.run(main()) == ["a"]
+    release.set()
+    executor.shutdown()
+    # the producer gives up at its next item instead of draining the stream
+    assert produced == ["b"]
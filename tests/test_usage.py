@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from app.commands.admin import format_stats, is_admin
+from app.services.logger_service import LoggerService
+from app.services.memory_backend import MemoryBackend
+from app.services.sqlite_backend import SqliteBackend
+
+
+def test_logger_rolls_batches_up_by_day_type_and_plan():
+    db = MemoryBackend()
+    logger = LoggerService(db, batch_size=100, flush_interval=5)
+    for plano in ("Free", "Free", "Pro"):
+        logger.log(1, "text", "p", plano=plano)
+    logger.log(2, "image", "p", plano="Free")
+    # refunded failures are logged but are not usage
+    logger.log(2, "image_error", "p", resultado="boom", plano="Free")
+    logger.close()
+
+    # the plan is not a logs column
+    assert all("plano" not in row for row in db.list_logs())
+    usage = {(r["tipo"], r["plano"]): r["total"] for r in db.usage_between("2000-01-01", "2999-12-31")}
+    assert usage == {("text", "Free"): 2, ("text", "Pro"): 1, ("image", "Free"): 1}
+
+
+def test_sqlite_rollup_increments_and_rebuilds(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "bot.sqlite3"))
+    backend.insert_user({"telegram_id": 1, "nome": "a", "plano": "Pro", "limite_diario": 5})
+    backend.insert_logs([
+        {"telegram_id": 1, "tipo": "text", "data": "2026-01-01T10:00:00"},
+        {"telegram_id": 1, "tipo": "text", "data": "2026-01-01T23:59:59"},
+        {"telegram_id": 1, "tipo": "image", "data": "2026-01-02T00:00:00"},
+        {"telegram_id": 1, "tipo": "text_error", "data": "2026-01-02T00:00:01"},
+    ])
+    backend.add_usage([{"dia": "2026-01-01", "tipo": "text", "plano": "Pro", "total": 1}])
+    backend.add_usage([{"dia": "2026-01-01", "tipo": "text", "plano": "Pro", "total": 5}])
+    assert backend.usage_between("2026-01-01", "2026-01-01")[0]["total"] == 6
+
+    # a rebuild replaces the counts of the range with what the logs say
+    assert backend.rollup_usage("2026-01-01", "2026-01-02") == 2
+    assert [(r["dia"], r["tipo"], r["total"]) for r in backend.usage_between("2026-01-01", "2026-01-31")] == [
+        ("2026-01-01", "text", 2), ("2026-01-02", "image", 1),
+    ]
+    backend.close()
+
+
+def test_stats_text_and_admin_gate(monkeypatch):
+    rows = [
+        {"dia": "2026-01-07", "tipo": "text", "plano": "Free", "total": 3},
+        {"dia": "2026-01-07", "tipo": "image", "plano": "Pro", "total": 1},
+        {"dia": "2026-01-05", "tipo": "text", "plano": "Free", "total": 10},
+    ]
+    text = format_stats(rows, "2026-01-07", users=42)
+    assert "Hoje (2026-01-07): 4 gerações" in text
+    assert "por plano: Free: 3 · Pro: 1" in text
+    assert "Últimos 7 dias: 14 gerações" in text
+    assert text.endswith("Usuários: 42")
+
+    monkeypatch.setenv("ADMIN_TELEGRAM_IDS", "10, 20")
+    message = lambda uid: SimpleNamespace(from_user=SimpleNamespace(id=uid))
+    assert is_admin(message(20))
+    assert not is_admin(message(30))
+    monkeypatch.setenv("ADMIN_TELEGRAM_IDS", "")
+    assert not is_admin(message(20))
@@ -0,0 +1,143 @@
+import time
+import queue
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.shared_backend import connect_backend, serve_backend
+from app import workers
+from app.workers import Supervisor, partition_key
+
+
+def test_updates_partition_by_user():
+    msg = {"update_id": 9, "message": {"chat": {"id": -100123}, "from": {"id": 7}}}
+    callback = {"update_id": 10, "callback_query": {"from": {"id": 7}, "message": {"chat": {"id": 42}}}}
+    inline = {"update_id": 11, "inline_query": {"from": {"id": 7}, "query": "x"}}
+    channel = {"update_id": 12, "channel_post": {"chat": {"id": -100999}, "text": "x"}}
+    # one user always lands on the same worker, whatever the chat
+    assert partition_key(msg) == partition_key(callback) == partition_key(inline) == 7
+    assert partition_key(channel) == -100999
+    assert partition_key({"update_id": 13}) == 13
+
+
+def _message(update_id, uid):
+    return {"update_id": update_id, "message": {"chat": {"id": uid}, "from": {"id": uid}, "text": "x"}}
+
+
+def test_dispatch_refuses_when_the_worker_queue_is_full(monkeypatch):
+    monkeypatch.setenv("WORKER_QUEUE_SIZE", "1")
+    sup = Supervisor(2)
+    assert sup.dispatch(_message(1, 2))
+    # worker 0 is full; worker 1 still takes its users
+    assert not sup.dispatch(_message(2, 4))
+    assert sup.dispatch(_message(3, 3))
+    assert sup.forwarded == [1, 1] and sup.rejected == 1
+
+
+def test_dead_and_stuck_workers_are_restarted(monkeypatch):
+    class FakeProc:
+        def __init__(self, alive):
+            self.alive = alive
+            self.killed = False
+
+        def is_alive(self):
+            return self.alive
+
+        def kill(self):
+            self.killed = True
+            self.alive = False
+
+        def join(self, timeout=None):
+            pass
+
+    sup = Supervisor(3)
+    restarted = []
+    monkeypatch.setattr(sup, "start_worker", restarted.append)
+    healthy, dead, stuck = FakeProc(True), FakeProc(False), FakeProc(True)
+    sup.procs = [healthy, dead, stuck]
+    now = time.time()
+    sup.heartbeats[0] = sup.heartbeats[1] = now
+    sup.heartbeats[2] = now - sup.heartbeat_timeout - 1
+
+    sup.check_workers()
+    assert restarted == [1, 2]
+    assert stuck.killed and not healthy.killed
+    assert sup.restarts == [0, 1, 1]
+
+
+def test_worker_takes_updates_only_when_a_slot_is_free(bot_env, monkeypatch):
+    import app.bot as botmod
+    from app import workers
+
+    monkeypatch.setenv("UPDATE_CONCURRENCY", "2")
+    monkeypatch.setenv("WORKER_HEARTBEAT_INTERVAL", "0.05")
+    # the worker would shut down the bot module's shared executor
+    monkeypatch.setattr(botmod, "shutdown_services", lambda: None)
+    updates = queue.Queue()
+    for i in range(5):
+        updates.put(_message(i, 1))
+    handled = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def handle(_botmod, update):
+            await release.wait()
+            handled.append(update["update_id"])
+
+        monkeypatch.setattr(workers, "_handle", handle)
+        loop_task = asyncio.ensure_future(workers._worker_loop(0, updates, [0.0]))
+        await asyncio.sleep(0.3)
+        # two in flight, the rest still queued where dispatch() can see them
+        assert updates.qsize() == 3 and handled == []
+        release.set()
+        updates.put(None)
+        await loop_task
+
+    asyncio.run(main())
+    assert sorted(handled) == [0, 1, 2, 3, 4]
+
+
+def test_shared_backend_quota_is_atomic_across_clients():
+    manager = serve_backend("127.0.0.1:0", b"test")
+    try:
+        address = "%s:%d" % manager.address
+        first = connect_backend(address, b"test")
+        first.insert_user({"telegram_id": 1, "nome": "a", "plano": "Free", "limite_diario": 5})
+
+        def reserve(_):
+            # each thread talks over its own connection, like worker processes
+            return connect_backend(address, b"test").reserve_generation(1, "2026-01-01")["status"]
+
+        with ThreadPoolExecutor(8) as pool:
+            statuses = list(pool.map(reserve, range(20)))
+        assert statuses.count("ok") == 5
+        assert first.get_user(1)["geracoes_hoje"] == 5
+    finally:
+        manager.shutdown()
+
+
+def test_supervisor_metrics_include_every_worker():
+    from app.utils.metrics import ERRORS
+
+    sup = Supervisor(2)
+    ERRORS.inc(where="worker_metrics_test")
+    for index in range(2):
+        workers._report_metrics(index, sup.reports)
+    deadline = time.monotonic() + 5
+    while len(sup.worker_metrics) < 2 and time.monotonic() < deadline:
+        sup.collect_metrics()
+        time.sleep(0.01)
+
+    text = sup.render_metrics()
+    assert "supervisor_workers_alive 0" in text
+    assert text.count("# TYPE errors_total counter") == 1
+    assert 'errors_total{worker="0",where="worker_metrics_test"}' in text
+    assert 'errors_total{worker="1",where="worker_metrics_test"}' in text
+
+
+def test_workers_share_one_generation_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.delenv("GEN_CACHE_DIR", raising=False)
+    monkeypatch.chdir(tmp_path)
+    assert Supervisor(2)._worker_env()["GEN_CACHE_DIR"] == str(tmp_path / ".gen_cache")
+    monkeypatch.setenv("GEN_CACHE_DIR", str(tmp_path / "shared"))
+    assert Supervisor(2)._worker_env()["GEN_CACHE_DIR"] == str(tmp_path / "shared")